@@ -39,8 +39,17 @@ The package is not yet complete. Currently the supported features are:
 - Easily visualize all geometries with the .view() method. Note: The coordinate converter has some quirks so might not show the shape correctly or at all. 
 - Easily make geometries from real shapefiles by passing any object that has the __geo_interface__ to the `geoj2geom(object)` function.
 - Point geometries can use the .distance() method to any other geometry.
+- The closest of many candidate geometries can be found with the `nearest(geom, candidates, k)` function, which also returns the closest points.
 - The intersect(), union(), difference(), symmetric_difference() methods can be used by Polygon and MultiPolygon geometries, but currently only with other Polygon or MultiPolygon geometries.
+- Many polygons can be removed from or overlapped with a Polygon or MultiPolygon in one go with its difference_all(others) and intersect_any(others) methods.
 - The buffer() method can be used by Polygons and MultiPolygons. 
+- All geometries can be cropped to a rectangle with the fast .clip_by_rect(xmin, ymin, xmax, ymax) method, for instance when cutting map tiles.
+- Whole collections of Polygons and MultiPolygons can be dissolved at once with `unary_union(geoms)`, which is much faster than folding them together with union().
+- Two layers of Polygon and MultiPolygon features can be overlaid with `overlay_layers(layer1, layer2, how)`, which returns each resulting face along with the positions of the features it came from.
+- Many geometries can be indexed with STRtree(geoms), which supports fast .query(bbox_or_geom) and .nearest(geom, k) lookups.
+- Very large Polygons and MultiPolygons can be overlaid in parallel tiles by passing processes=n to the intersect(), union(), difference(), and symmetric_difference() methods, or with `parallel_overlay(geom, other, cliptype)`.
+- Polygons and MultiPolygons that are tested against many points can be made faster with `prepare(geom)`, whose .contains(point) only checks the edges near each point.
+- Many polygons can be clipped against the same large Polygon or MultiPolygon with `prepare_mask(geom)`, whose .clip(subject, cliptype) gives the same result as subject.intersect(geom) or subject.difference(geom), but only hands the clipper the mask edges near each subject.
 
 Docs are not yet completed, but just follow the shapely usage and names and
 you should be alright. 
@@ -50,5 +59,9 @@ There's still a few things left to add, so it would be great if others could con
 """
 
 from geometry import *
+from strtree import STRtree
+from prepared import prepare, PreparedPolygon
+from clipmask import prepare_mask, PreparedClipMask
+from parallel import parallel_overlay
 from tester import *
 
@@ -0,0 +1,292 @@
+#Prepared clip masks for clipping many polygons against the same polygon
+
+#import stuff
+import clipper
+from clipper import Point
+from geometry import STRtree
+from geometry import _Parts, _Parts2Geom, _SplitByOverlap, _SplitApart, _CombinedBounds, _ScaleFor, _GetClipper, _ResultTree2Geom
+
+#how many consecutive ring edges each entry of the edge index covers
+CHUNKSIZE = 16
+#how many integer units the detour frame is kept outside the subject's envelope
+FRAMEMARGIN = 2
+
+#helper functions
+class _EdgeChunk(object):
+    """
+    A run of consecutive edges of one mask ring, with the float bbox they
+    span, as indexed by the mask's STRtree.
+    """
+    __slots__ = ("bounds", "ring", "start", "end")
+    def __init__(self, bounds, ring, start, end):
+        self.bounds = bounds
+        self.ring = ring
+        self.start = start
+        self.end = end
+def _Crossing(pt1, pt2, x, y):
+    """
+    Returns +1 or -1 if the edge from pt1 to pt2 crosses the horizontal ray
+    going right from x,y upwards or downwards, or 0 if it misses it. Uses
+    exact integer arithmetic and the usual half-open rule for vertices.
+    """
+    if pt1.y <= y < pt2.y: direction = 1
+    elif pt2.y <= y < pt1.y: direction = -1
+    else: return 0
+    #the ray is crossed if the edge is to the right of x at height y
+    side = (pt1.x - x) * (pt2.y - pt1.y) + (pt2.x - pt1.x) * (y - pt1.y)
+    if side * direction > 0: return direction
+    return 0
+def _Collinear(pt1, pt2, pt3):
+    return (pt1.y-pt2.y)*(pt2.x-pt3.x) == (pt1.x-pt2.x)*(pt2.y-pt3.y)
+def _ToFrame(point, envelope, frame):
+    """
+    Returns the point on the frame that a point outside the envelope can be
+    joined to by a straight line that never enters the envelope.
+    """
+    exmin,eymin,exmax,eymax = envelope
+    fxmin,fymin,fxmax,fymax = frame
+    if point.x > exmax: return Point(fxmax, min(max(point.y, fymin), fymax))
+    elif point.x < exmin: return Point(fxmin, min(max(point.y, fymin), fymax))
+    elif point.y > eymax: return Point(point.x, fymax)
+    else: return Point(point.x, fymin)
+def _Nudge(point, frame):
+    #moves a point on the frame one unit along the side it lies on
+    fxmin,fymin,fxmax,fymax = frame
+    if point.x in (fxmin, fxmax):
+        return Point(point.x, point.y+1 if point.y < fymax else point.y-1)
+    return Point(point.x+1 if point.x < fxmax else point.x-1, point.y)
+def _FramePosition(point, frame):
+    #the distance from the lower left corner going counterclockwise around the frame
+    fxmin,fymin,fxmax,fymax = frame
+    width,height = fxmax-fxmin,fymax-fymin
+    if point.y == fymin: return point.x - fxmin
+    elif point.x == fxmax: return width + point.y - fymin
+    elif point.y == fymax: return width + height + fxmax - point.x
+    else: return 2*width + height + fymax - point.y
+def _FrameRoute(point1, point2, frame):
+    """
+    Returns the frame corners passed when going from one point on the
+    frame to another the shorter way around it.
+    """
+    fxmin,fymin,fxmax,fymax = frame
+    width,height = fxmax-fxmin,fymax-fymin
+    perimeter = 2 * (width + height)
+    corners = [(0, Point(fxmin,fymin)), (width, Point(fxmax,fymin)),
+               (width+height, Point(fxmax,fymax)), (2*width+height, Point(fxmin,fymax))]
+    start,end = _FramePosition(point1, frame),_FramePosition(point2, frame)
+    forward = (end - start) % perimeter
+    if forward <= perimeter - forward:
+        passed = [((position - start) % perimeter, corner) for position,corner in corners]
+        return [corner for offset,corner in sorted(passed) if 0 < offset < forward]
+    backward = perimeter - forward
+    passed = [((start - position) % perimeter, corner) for position,corner in corners]
+    return [corner for offset,corner in sorted(passed) if 0 < offset < backward]
+def _Frame(frame, winding):
+    #a ring around the whole frame that winds once in the given direction
+    fxmin,fymin,fxmax,fymax = frame
+    ring = [Point(fxmin,fymin), Point(fxmax,fymin), Point(fxmax,fymax), Point(fxmin,fymax)]
+    if winding < 0: ring.reverse()
+    return ring
+
+class PreparedClipMask(object):
+    """
+    A read-only Polygon or MultiPolygon prepared for clipping many other
+    polygons against it. The mask's edges are indexed once, so that each
+    clip only hands the clipper the mask edges that pass through the
+    subject's envelope, joined up around the outside of the envelope,
+    instead of every edge of the mask.
+    """
+    def __init__(self, geom):
+        """
+
+        | __options__ | __description__
+        | --- | ---
+        | geom | the Polygon or MultiPolygon to clip with.
+        """
+        if geom.geom_type not in ("Polygon","MultiPolygon"):
+            raise TypeError("Only Polygon and MultiPolygon geometries can be prepared as clip masks")
+        self.geom = geom
+        self.bounds = geom.bounds
+        self._parts = _Parts(geom)
+        self._rings = []
+        self._lowest = dict()
+        chunks = []
+        for poly in self._parts:
+            for ring in [poly.exterior] + list(poly.interiors):
+                ringid = len(self._rings)
+                self._rings.append(ring)
+                flatcoords = ring._array
+                edgecount = len(flatcoords) // 2 - 1
+                for start in xrange(0, edgecount, CHUNKSIZE):
+                    end = min(start+CHUNKSIZE, edgecount)
+                    xs = flatcoords[start*2:end*2+2:2]
+                    ys = flatcoords[start*2+1:end*2+2:2]
+                    chunks.append(_EdgeChunk((min(xs),min(ys),max(xs),max(ys)), ringid, start, end))
+        self._index = STRtree(chunks)
+    ### Clipping
+    def clip(self, subject, cliptype="intersect", tolerance=None):
+        """
+        Returns the same result as subject.intersect(mask) or
+        subject.difference(mask), but without adding the whole mask to the
+        clipper each time. Returns None if nothing is left.
+
+        | __options__ | __description__
+        | --- | ---
+        | subject | the Polygon or MultiPolygon to clip.
+        | *cliptype | either "intersect" or "difference". Default is "intersect".
+        | *tolerance | the smallest coordinate difference the clipping must resolve, as for intersect().
+        """
+        if cliptype == "intersect": clipcode = clipper.ClipType.Intersection
+        elif cliptype == "difference": clipcode = clipper.ClipType.Difference
+        else: raise ValueError("Clip masks can only intersect or difference, not %r" % cliptype)
+        #same part filtering and scale as _Clip, so the results match it exactly
+        if clipcode == clipper.ClipType.Intersection:
+            subjparts,_ = _SplitByOverlap(_Parts(subject), self._parts)
+            resultparts = []
+        else:
+            subjparts,resultparts = _SplitApart(_Parts(subject), self._parts)
+        clipparts,_ = _SplitByOverlap(self._parts, subjparts)
+        if not subjparts:
+            return _Parts2Geom(resultparts)
+        scale = _ScaleFor(_CombinedBounds(subjparts + clipparts), tolerance)
+        main = _GetClipper()
+        try:
+            for part in subjparts:
+                part._addtoclipper(main, clipper.PolyType.Subject, scale)
+            for ring in self._MaskRings(_CombinedBounds(subjparts), scale):
+                main.AddPolygon(ring, clipper.PolyType.Clip)
+            resulttree = clipper.PolyTree()
+            succeeded = main.Execute2(clipcode, resulttree, clipper.PolyFillType.Positive, clipper.PolyFillType.Positive)
+        finally:
+            main.Clear()
+        if not succeeded: return None
+        geom = _ResultTree2Geom(resulttree, scale)
+        if not resultparts: return geom
+        if geom is not None: resultparts = _Parts(geom) + resultparts
+        return _Parts2Geom(resultparts)
+    def clip_many(self, subjects, cliptype="intersect", tolerance=None):
+        """
+        Same as clip(), but clips a sequence of subjects and returns a list
+        of the results in the same order.
+        """
+        return [self.clip(subject, cliptype, tolerance) for subject in subjects]
+    ### Internal use only
+    def _MaskRings(self, bounds, scale):
+        """
+        Returns integer rings that have the same winding as the mask at every
+        point of the envelope. The edges through the envelope are kept as they
+        are, while everything further away is replaced by detours along a
+        frame just outside the envelope.
+        """
+        xmin,ymin,xmax,ymax = bounds
+        envelope = (int(round(xmin*scale))-1, int(round(ymin*scale))-1,
+                    int(round(xmax*scale))+1, int(round(ymax*scale))+1)
+        frame = (envelope[0]-FRAMEMARGIN, envelope[1]-FRAMEMARGIN,
+                 envelope[2]+FRAMEMARGIN, envelope[3]+FRAMEMARGIN)
+        #the mask's winding is checked against the rings' at a point inside the envelope
+        refx,refy = (envelope[0]+envelope[2]) // 2, (envelope[1]+envelope[3]) // 2
+        #find the edges through the envelope and the edges crossing the reference ray
+        grow = 3.0 / scale
+        keptedges = dict()
+        winding = 0
+        exmin,eymin,exmax,eymax = envelope
+        for chunk in self._index.query((xmin-grow, ymin-grow, xmax+grow, ymax+grow)):
+            points = self._rings[chunk.ring]._scaledcoords(scale)
+            kept = keptedges.setdefault(chunk.ring, set())
+            for i in xrange(chunk.start, chunk.end):
+                pt1,pt2 = points[i],points[i+1]
+                if min(pt1.x,pt2.x) <= exmax and max(pt1.x,pt2.x) >= exmin \
+                   and min(pt1.y,pt2.y) <= eymax and max(pt1.y,pt2.y) >= eymin:
+                    kept.add(i)
+        refbox = ((refx-1)/scale, (refy-1)/scale, self.bounds[2]+grow, (refy+1)/scale)
+        for chunk in self._index.query(refbox):
+            points = self._rings[chunk.ring]._scaledcoords(scale)
+            for i in xrange(chunk.start, chunk.end):
+                winding += _Crossing(points[i], points[i+1], refx, refy)
+        #join the kept edges of each ring into one ring
+        rings = []
+        for ringid,kept in sorted(keptedges.items()):
+            if not kept: continue
+            points = self._rings[ringid]._scaledcoords(scale)
+            ring = self._ReduceRing(points, kept, self._LowestVertex(ringid, scale), envelope, frame)
+            rings.append(ring)
+            for i in xrange(len(ring)):
+                winding -= _Crossing(ring[i-1], ring[i], refx, refy)
+        #whatever winding the detours lost is made up by whole frames
+        for _ in xrange(abs(winding)):
+            rings.append(_Frame(frame, winding))
+        return rings
+    def _LowestVertex(self, ringid, scale):
+        #the clipper walks a ring for its local minima starting from its lowest vertex
+        cached = self._lowest.get(ringid)
+        if cached is None or cached[0] != scale:
+            ys = [point.y for point in self._rings[ringid]._scaledcoords(scale)]
+            cached = self._lowest[ringid] = (scale, ys.index(min(ys)))
+        return cached[1]
+    def _ReduceRing(self, points, kept, lowest, envelope, frame):
+        edgecount = len(points) - 1
+        if len(kept) == edgecount: return points
+        #the clipper merges collinear edges, so those next to kept ones are kept too
+        for i in list(kept):
+            prev,after = i,(i+1) % edgecount
+            while after not in kept and _Collinear(points[prev], points[after], points[after+1]):
+                kept.add(after)
+                prev,after = after,(after+1) % edgecount
+            before,after = (i-1) % edgecount,i
+            while before not in kept and _Collinear(points[before], points[after], points[after+1]):
+                kept.add(before)
+                before,after = (before-1) % edgecount,before
+        if len(kept) == edgecount: return points
+        #walk the runs of kept edges in ring order, detouring along the frame between them
+        starts = sorted(i for i in kept if (i-1) % edgecount not in kept)
+        runs = []
+        for start in starts:
+            end = start
+            while (end+1) % edgecount in kept: end = (end+1) % edgecount
+            runs.append((start, end))
+        ring,sinkat = [],None
+        for runnum,(start,end) in enumerate(runs):
+            vertices = range(start, end+2) if start <= end else range(start, edgecount) + range(end+2)
+            nextstart = runs[(runnum+1) % len(runs)][0]
+            gap = (nextstart - end - 1) % edgecount
+            #the kept edges still meet the same neighbours, and up to two dropped
+            #edges before the next run are simply kept as they are
+            if gap >= 2: vertices.append(end+2)
+            ring.extend(points[i % edgecount] for i in vertices)
+            if gap <= 2: continue
+            #otherwise detour along the frame between the neighbours
+            afterlast,beforefirst = (end+2) % edgecount,(nextstart-1) % edgecount
+            last,first = points[afterlast],points[beforefirst]
+            exitpoint = _ToFrame(last, envelope, frame)
+            if _Collinear(points[end+1], last, exitpoint): exitpoint = _Nudge(exitpoint, frame)
+            entrypoint = _ToFrame(first, envelope, frame)
+            if _Collinear(entrypoint, first, points[nextstart]): entrypoint = _Nudge(entrypoint, frame)
+            ring.append(exitpoint)
+            if 0 < (lowest - afterlast) % edgecount < (beforefirst - afterlast) % edgecount:
+                #the detour in place of the lowest vertex passes the lower left corner
+                corner = Point(frame[0], frame[1])
+                ring.extend(_FrameRoute(exitpoint, corner, frame))
+                sinkat = len(ring)
+                ring.append(corner)
+                ring.extend(_FrameRoute(corner, entrypoint, frame))
+            else:
+                ring.extend(_FrameRoute(exitpoint, entrypoint, frame))
+            ring.extend([entrypoint, first])
+        #and dips below everything else there, so the clipper starts walking
+        #for local minima in the same gap as it does on the mask ring, and so
+        #meets the kept ones in the same order
+        if sinkat is not None:
+            sinky = min(point.y for point in ring) - 1
+            ring[sinkat+1:sinkat+1] = [Point(frame[0], sinky), Point(frame[0]-1, sinky)]
+        return ring
+
+def prepare_mask(geom):
+    """
+    Prepares a Polygon or MultiPolygon for clipping many other polygons
+    against it, returning a PreparedClipMask with a clip(subject, cliptype) method.
+
+    | __options__ | __description__
+    | --- | ---
+    | geom | the Polygon or MultiPolygon to clip with.
+    """
+    return PreparedClipMask(geom)
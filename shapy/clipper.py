@@ -31,12 +31,10 @@
 #                                                                              #
 #===============================================================================
 
-import math
+import math, heapq, operator
 from collections import namedtuple
-from decimal import Decimal, getcontext
 
-getcontext().prec = 8
-horizontal = Decimal('-Infinity')
+horizontal = float('-inf')
 
 class ClipType: (Intersection, Union, Difference, Xor) = range(4)
 class PolyType:    (Subject, Clip) = range(2)
@@ -51,21 +49,12 @@ Point = namedtuple('Point', 'x y')
 DoublePoint = namedtuple('DoublePoint', 'x y')
 
 class LocalMinima(object):
-    leftBound = rightBound = nextLm = None
+    __slots__ = ('y','leftBound','rightBound','nextLm')
     def __init__(self, y, leftBound, rightBound):
         self.y = y
         self.leftBound = leftBound
         self.rightBound = rightBound
-
-class Scanbeam(object):
-    __slots__ = ('y','nextSb')
-    def __init__(self, y, nextSb = None):
-        self.y = y
-        self.nextSb = nextSb
-    def __repr__(self):
-        s = 'None'
-        if self.nextSb is not None: s = '<obj>'
-        return "(y:%i, nextSb:%s)" % (self.y, s)
+        self.nextLm = None
 
 class IntersectNode(object):
     __slots__ = ('e1','e2','pt','nextIn')
@@ -97,13 +86,12 @@ class JoinRec(object):
     __slots__ = ('pt1a','pt1b','poly1Idx','pt2a', 'pt2b','poly2Idx')
 
 class HorzJoin(object):
-    edge = None
-    savedIdx = 0
-    prevHj = None
-    nextHj = None
+    __slots__ = ('edge','savedIdx','prevHj','nextHj')
     def __init__(self, edge, idx):
         self.edge = edge
         self.savedIdx = idx
+        self.prevHj = None
+        self.nextHj = None
 
 #===============================================================================
 # Unit global functions ...
@@ -111,12 +99,10 @@ class HorzJoin(object):
 
 PRECISION = 1000000000
 
-def FloatPoints2IntPoints(points):
-    precision = PRECISION
-    return [Point(int(point.x*precision),int(point.y*precision)) for point in points]
+def FloatPoints2IntPoints(points, precision = PRECISION):
+    return [Point(int(round(point.x*precision)),int(round(point.y*precision))) for point in points]
 
-def IntPoints2FloatPoints(points):
-    precision = PRECISION
+def IntPoints2FloatPoints(points, precision = PRECISION):
     return [Point(point.x/float(precision),point.y/float(precision)) for point in points]
 
 def IntsToPoints(ints):
@@ -148,6 +134,9 @@ class PolyNode(object):
         self.Parent = None
         self.Index = 0
         self.ChildCount = 0
+        # measured while the contour is built, same as Area() and _GetBounds()
+        self.Area = 0.0
+        self.Bounds = None
     
     def IsHole(self):
         result = True
@@ -215,12 +204,15 @@ def PolyTreeToPolygons(polyTree):
 #===============================================================================
 
 class Edge(object):
+    __slots__ = ('xBot','yBot','xCurr','yCurr','xTop','yTop','dx','deltaX','deltaY',
+                 'PolyType','side','windDelta','windCnt','windCnt2','outIdx',
+                 'nextE','prevE','nextInLML','prevInAEL','nextInAEL','prevInSEL','nextInSEL')
 
     def __init__(self):
         self.xBot, self.yBot, self.xCurr, self.yCurr, = 0, 0, 0, 0
         self.xTop, self.yTop = 0, 0
-        self.dx, self.deltaX , self.deltaY = Decimal(0), Decimal(0), Decimal(0)
-        self.polyType = PolyType.Subject 
+        self.dx, self.deltaX , self.deltaY = 0.0, 0, 0
+        self.PolyType = PolyType.Subject 
         self.side = EdgeSide.Left
         self.windDelta, self.windCnt, self.windCnt2 = 0, 0, 0 
         self.outIdx = -1
@@ -248,10 +240,10 @@ def _SlopesEqual2(e1, e2):
     return e1.deltaY * e2.deltaX == e1.deltaX * e2.deltaY
 
 def _SetDx(e):
-    e.deltaX = Decimal(e.xTop - e.xBot)
-    e.deltaY = Decimal(e.yTop - e.yBot)
+    e.deltaX = e.xTop - e.xBot
+    e.deltaY = e.yTop - e.yBot
     if e.deltaY == 0: e.dx = horizontal
-    else: e.dx = e.deltaX/e.deltaY
+    else: e.dx = e.deltaX/float(e.deltaY)
 
 def _SwapSides(e1, e2):
     side    = e1.side
@@ -295,6 +287,27 @@ class ClipperBase(object):
         self._EdgeList      = []       # 2D array
         self._LocalMinList  = None     # single-linked list of LocalMinima
         self._CurrentLocMin = None
+        # edges and local minima let go of by Clear, reused by later polygons
+        self._EdgePool      = []
+        self._LocMinPool    = []
+
+    def _NewEdge(self):
+        if not self._EdgePool: return Edge()
+        e = self._EdgePool.pop()
+        e.side = EdgeSide.Left
+        e.windCnt, e.windCnt2 = 0, 0
+        e.nextInLML = None
+        e.prevInAEL, e.nextInAEL, e.prevInSEL, e.nextInSEL = None, None, None, None
+        return e
+
+    def _NewLocalMinima(self, y, leftBound, rightBound):
+        if not self._LocMinPool: return LocalMinima(y, leftBound, rightBound)
+        lm = self._LocMinPool.pop()
+        lm.y = y
+        lm.leftBound = leftBound
+        lm.rightBound = rightBound
+        lm.nextLm = None
+        return lm
         
     def _InsertLocalMinima(self, lm):
         if self._LocalMinList is None:
@@ -323,11 +336,11 @@ class ClipperBase(object):
 
         if e.dx == horizontal:
             if (e.xBot != e.prevE.xBot): _SwapX(e)
-            lm = LocalMinima(e.prevE.yBot, e.prevE, e)
+            lm = self._NewLocalMinima(e.prevE.yBot, e.prevE, e)
         elif (e.dx < e.prevE.dx):
-            lm = LocalMinima(e.prevE.yBot, e.prevE, e)
+            lm = self._NewLocalMinima(e.prevE.yBot, e.prevE, e)
         else:
-            lm = LocalMinima(e.prevE.yBot, e, e.prevE)
+            lm = self._NewLocalMinima(e.prevE.yBot, e, e.prevE)
         lm.leftBound.side = EdgeSide.Left
         lm.rightBound.side = EdgeSide.Right
         self._InsertLocalMinima(lm)
@@ -389,7 +402,7 @@ class ClipperBase(object):
         if ln < 3: return False
         edges = []
         for i in range(ln):
-            edges.append(Edge())
+            edges.append(self._NewEdge())
         edges[0].xCurr = pg[0].x
         edges[0].yCurr = pg[0].y
         _InitEdge(edges[ln-1], edges[0], edges[ln-2], pg[ln-1], polyType)
@@ -413,6 +426,7 @@ class ClipperBase(object):
             e = self._AddBoundsToLML(e)
             if e == eHighest: break
         self._EdgeList.append(edges)
+        return True
 
     def AddPolygons(self, polygons, polyType):
         result = False
@@ -421,6 +435,12 @@ class ClipperBase(object):
         return result
 
     def Clear(self):
+        for edges in self._EdgeList:
+            self._EdgePool.extend(edges)
+        lm = self._LocalMinList
+        while lm is not None:
+            self._LocMinPool.append(lm)
+            lm = lm.nextLm
         self._EdgeList = []
         self._LocalMinList    = None
         self._CurrentLocMin = None
@@ -442,24 +462,24 @@ def _IntersectPoint(edge1, edge2):
         if edge2.dx == horizontal:
             y = edge2.yBot
         else:
-            b2 = edge2.yBot - Decimal(edge2.xBot)/edge2.dx
-            y = round(Decimal(x)/edge2.dx + b2)
+            b2 = edge2.yBot - edge2.xBot/edge2.dx
+            y = int(round(x/edge2.dx + b2))
     elif edge2.dx == 0:
         x = edge2.xBot
         if edge1.dx == horizontal:
             y = edge1.yBot
         else:
-            b1 = edge1.yBot - Decimal(edge1.xBot)/edge1.dx
-            y = round(Decimal(x)/edge1.dx + b1)
+            b1 = edge1.yBot - edge1.xBot/edge1.dx
+            y = int(round(x/edge1.dx + b1))
     else:
         b1 = edge1.xBot - edge1.yBot * edge1.dx
         b2 = edge2.xBot - edge2.yBot * edge2.dx
-        m    = Decimal(b2-b1)/(edge1.dx - edge2.dx)
-        y    = round(m)
+        m    = (b2-b1)/(edge1.dx - edge2.dx)
+        y    = int(round(m))
         if math.fabs(edge1.dx) < math.fabs(edge2.dx):
-            x = round(edge1.dx * m + b1)
+            x = int(round(edge1.dx * m + b1))
         else:
-            x = round(edge2.dx * m + b2)
+            x = int(round(edge2.dx * m + b2))
     if (y < edge1.yTop) or (y < edge2.yTop):
         if (edge1.yTop > edge2.yTop):
             return Point(edge1.xTop,edge1.yTop), _TopX(edge2, edge1.yTop) < edge1.xTop
@@ -471,7 +491,31 @@ def _IntersectPoint(edge1, edge2):
 def _TopX(e, currentY):
     if currentY == e.yTop: return e.xTop
     elif e.xTop == e.xBot: return e.xBot
-    else: return e.xBot + round(e.dx * Decimal(currentY - e.yBot))
+    else: return e.xBot + int(round(e.dx * (currentY - e.yBot)))
+
+def _SortByXCurr(edges, inversions):
+    # merge sorts the edges by xCurr, and while merging appends each pair of
+    # edges that was out of order to inversions as (left edge, right edge)
+    count = len(edges)
+    if count < 2: return edges
+    half = count // 2
+    left = _SortByXCurr(edges[:half], inversions)
+    right = _SortByXCurr(edges[half:], inversions)
+    merged = []
+    i, j = 0, 0
+    while i < len(left) and j < len(right):
+        if left[i].xCurr <= right[j].xCurr:
+            merged.append(left[i])
+            i += 1
+        else:
+            # every edge still left of e is further right than it at the top
+            e = right[j]
+            for eLeft in left[i:]: inversions.append((eLeft, e))
+            merged.append(e)
+            j += 1
+    merged.extend(left[i:])
+    merged.extend(right[j:])
+    return merged
 
 def _E2InsertsBeforeE1(e1,e2):
     if (e2.xCurr == e1.xCurr): 
@@ -510,7 +554,7 @@ def _ProtectRight(val):
 
 def _GetDx(pt1, pt2):
     if (pt1.y == pt2.y): return horizontal
-    else: return Decimal(pt2.x - pt1.x)/(pt2.y - pt1.y)
+    else: return (pt2.x - pt1.x)/float(pt2.y - pt1.y)
 
 def _Param1RightOfParam2(outRec1, outRec2):
     while outRec1 is not None:
@@ -623,6 +667,8 @@ def _FixupOutPolygon(outRec):
             lastOK = None
             pp.prevOp.nextOp = pp.nextOp
             pp.nextOp.prevOp = pp.prevOp
+            # so that indexes of the output points can tell it is gone
+            pp.idx = -1
             pp = pp.prevOp
         elif pp == lastOK: break
         else:
@@ -717,6 +763,7 @@ def _PointInPolygon(pt, outPt):
             (outPt2.prevOp.pt.y - outPt2.pt.y) + outPt2.pt.x)): result = not result
         outPt2 = outPt2.nextOp
         if outPt2 == outPt: break
+    return result
 
 def _Poly2ContainsPoly1(outPt1, outPt2):
     pt = outPt1
@@ -748,7 +795,8 @@ class Clipper(ClipperBase):
         
         self._PolyOutList = []        
         self._ClipType         = ClipType.Intersection
-        self._Scanbeam         = None
+        self._Scanbeam         = []
+        self._ScanbeamSet      = set()
         self._ActiveEdges      = None
         self._SortedEdges      = None
         self._IntersectNodes   = None
@@ -758,36 +806,65 @@ class Clipper(ClipperBase):
         self._UsingPolyTree    = False
         self._JoinList         = None
         self._HorzJoins        = None
+        # indexes for joining common edges, only kept while joining
+        self._OutPtIndex       = None
+        self._JoinIndex        = None
+        self._FirstLeftIndex   = None
+        # output records and points of earlier executions, reused by later ones
+        self._OutRecPool       = []
+        self._OutPtPool        = []
         
     def _Reset(self):
         ClipperBase._Reset(self)
-        self._Scanbeam = None
-        self._PolyOutList = []
+        # an earlier execution that failed may have left edges behind
+        self._ActiveEdges = None
+        self._SortedEdges = None
+        self._IntersectNodes = None
+        self._Scanbeam = []
+        self._ScanbeamSet = set()
+        self._RecyclePolyOutList()
         lm = self._LocalMinList
         while lm is not None:
             self._InsertScanbeam(lm.y)
             lm = lm.nextLm
 
     def Clear(self):
-        self._PolyOutList = []
+        self._RecyclePolyOutList()
         ClipperBase.Clear(self)
 
+    def _RecyclePolyOutList(self):
+        outPtPool = self._OutPtPool
+        for outRec in self._PolyOutList:
+            if outRec is None: continue
+            # pooled points get their idx set to None, so that each ring is
+            # only walked once even if it was shared
+            op = outRec.pts
+            while op is not None and op.idx is not None:
+                op.idx = None
+                outPtPool.append(op)
+                op = op.nextOp
+            self._OutRecPool.append(outRec)
+        self._PolyOutList = []
+
+    def _NewOutPt(self, idx, pt):
+        if not self._OutPtPool: return OutPt(idx, pt)
+        op = self._OutPtPool.pop()
+        op.idx = idx
+        op.pt = pt
+        op.prevOp = None
+        op.nextOp = None
+        return op
+
     def _InsertScanbeam(self, y):
-        if self._Scanbeam is None:
-            self._Scanbeam = Scanbeam(y)
-        elif y > self._Scanbeam.y:
-            self._Scanbeam = Scanbeam(y, self._Scanbeam)
-        else:
-            sb = self._Scanbeam
-            while sb.nextSb is not None and y <= sb.nextSb.y:
-                sb = sb.nextSb
-            if y == sb.y: return
-            newSb = Scanbeam(y, sb.nextSb)
-            sb.nextSb = newSb
+        # scanbeams are kept in a binary heap of negated y values so the
+        # topmost is popped first, with a set to skip duplicate y values
+        if y in self._ScanbeamSet: return
+        self._ScanbeamSet.add(y)
+        heapq.heappush(self._Scanbeam, -y)
 
     def _PopScanbeam(self):
-        result = self._Scanbeam.y
-        self._Scanbeam = self._Scanbeam.nextSb
+        result = -heapq.heappop(self._Scanbeam)
+        self._ScanbeamSet.discard(result)
         return result
 
     def _SetWindingCount(self, edge):
@@ -871,7 +948,7 @@ class Clipper(ClipperBase):
             if edge.PolyType == PolyType.Subject:
                 if pft2 == PolyFillType.EvenOdd or pft2 == PolyFillType.NonZero:
                     return edge.windCnt2 == 0
-                elif edge.PolyType == PolyFillType.Positive:
+                elif pft2 == PolyFillType.Positive:
                     return edge.windCnt2 <= 0
                 else:
                     return edge.windCnt2 >= 0
@@ -1126,13 +1203,20 @@ class Clipper(ClipperBase):
             self._JoinList = []
         self._JoinList.append(jr)
         
-    def _FixupJoinRecs(self, jr, outPt, startIdx):
-        for i in range(startIdx, len(self._JoinList)):
+    def _FixupJoinRecs(self, jr, outRec, startIdx):
+        # only the later joins that refer to the split polygon are looked at,
+        # and moved over to the new polygon if their point is now in it
+        joinIndex = self._JoinIndex
+        moved = joinIndex.setdefault(jr.poly2Idx, [])
+        for i in joinIndex.get(jr.poly1Idx, ()):
+            if i < startIdx: continue
             jr2 = self._JoinList[i]
-            if jr2.poly1Idx == jr.poly1Idx and _PointIsVertex(jr2.pt1a, outPt):
+            if jr2.poly1Idx == jr.poly1Idx and self._IsRingVertex(jr2.pt1a, outRec):
                 jr2.poly1Idx = jr.poly2Idx
-            if jr2.poly2Idx == jr.poly1Idx and _PointIsVertex(jr2.pt2a, outPt):
+                moved.append(i)
+            if jr2.poly2Idx == jr.poly1Idx and self._IsRingVertex(jr2.pt2a, outRec):
                 jr2.poly2Idx = jr.poly2Idx
+                moved.append(i)
                 
     def _AddHorzJoin(self, e, idx):
         hj = HorzJoin(e, idx)
@@ -1146,21 +1230,6 @@ class Clipper(ClipperBase):
             self._HorzJoins.prevHj.nextHj = hj
             self._HorzJoins.prevHj = hj
 
-    def _InsertIntersectNode(self, e1, e2, pt):
-        newNode = IntersectNode(e1, e2, pt)
-        if self._IntersectNodes is None:
-            self._IntersectNodes = newNode
-        elif newNode.pt.y > self._IntersectNodes.pt.y:
-            newNode.nextIn = self._IntersectNodes
-            self._IntersectNodes = newNode
-        else:
-            node = self._IntersectNodes
-            while node.nextIn is not None and \
-                newNode.pt.y < node.nextIn.pt.y:
-                node = node.nextIn
-            newNode.nextIn = node.nextIn
-            node.nextIn = newNode
-
     def _ProcessIntersections(self, botY, topY):
         try:
             self._BuildIntersectList(botY, topY)
@@ -1176,34 +1245,30 @@ class Clipper(ClipperBase):
     def _BuildIntersectList(self, botY, topY):
         e = self._ActiveEdges
         if e is None: return
-        self._SortedEdges = e
+        edges = []
         while e is not None:
-            e.prevInSEL = e.prevInAEL
-            e.nextInSEL = e.nextInAEL
             e.xCurr = _TopX(e, topY)
+            edges.append(e)
             e = e.nextInAEL
-        while True:
-            isModified = False
-            e = self._SortedEdges
-            while e.nextInSEL is not None:
-                eNext = e.nextInSEL
-                if e.xCurr <= eNext.xCurr:
-                    e = eNext
-                    continue
-                pt, intersected = _IntersectPoint(e, eNext)
-                if not intersected and e.xCurr > eNext.xCurr +1: 
-                    raise Exception("Intersect Error")  
-                if pt.y > botY:
-                    pt = Point(_TopX(e, botY), botY)
-                self._InsertIntersectNode(e, eNext, pt)
-                self._SwapPositionsInSEL(e, eNext)
-                isModified = True
-            if e.prevInSEL is not None:
-                e.prevInSEL.nextInSEL = None
-            else:
-                break
-            if not isModified: break
-        self._SortedEdges = None
+        # each pair of edges whose order at topY is the reverse of their order
+        # in the AEL must intersect within the scanbeam
+        inversions = []
+        _SortByXCurr(edges, inversions)
+        if not inversions: return
+        nodes = []
+        for e, eNext in inversions:
+            pt, intersected = _IntersectPoint(e, eNext)
+            if not intersected and e.xCurr > eNext.xCurr +1: 
+                raise Exception("Intersect Error")  
+            if pt.y > botY:
+                pt = Point(_TopX(e, botY), botY)
+            nodes.append(IntersectNode(e, eNext, pt))
+        # link the nodes from the bottom of the scanbeam up, and leave it to
+        # _FixupIntersectionOrder to make sure only adjacent edges get swapped
+        nodes.sort(key=lambda node: node.pt.y, reverse=True)
+        for node, nextNode in zip(nodes, nodes[1:]):
+            node.nextIn = nextNode
+        self._IntersectNodes = nodes[0]
         return
 
     def _ProcessIntersectList(self):
@@ -1423,7 +1488,11 @@ class Clipper(ClipperBase):
             self._AppendPolygon(e2, e1)
 
     def _CreateOutRec(self):
-        outRec = OutRec(len(self._PolyOutList))
+        if self._OutRecPool:
+            outRec = self._OutRecPool.pop()
+            OutRec.__init__(outRec, len(self._PolyOutList))
+        else:
+            outRec = OutRec(len(self._PolyOutList))
         self._PolyOutList.append(outRec)
         return outRec
     
@@ -1432,7 +1501,7 @@ class Clipper(ClipperBase):
         if e.outIdx < 0:
             outRec = self._CreateOutRec();
             e.outIdx = outRec.idx
-            op = OutPt(outRec.idx, pt)
+            op = self._NewOutPt(outRec.idx, pt)
             op.nextOp = op
             op.prevOp = op
             outRec.pts = op
@@ -1442,7 +1511,7 @@ class Clipper(ClipperBase):
             op = outRec.pts
             if (toFront and _PointsEqual(pt, op.pt)) or \
                 (not toFront and _PointsEqual(pt, op.prevOp.pt)): return
-            op2 = OutPt(outRec.idx, pt)
+            op2 = self._NewOutPt(outRec.idx, pt)
             op2.nextOp = op
             op2.prevOp = op.prevOp
             op.prevOp.nextOp = op2
@@ -1622,17 +1691,16 @@ class Clipper(ClipperBase):
         outRec1 = self._PolyOutList[jr.poly1Idx]
         outRec2 = self._PolyOutList[jr.poly2Idx]
         if outRec1 is None or outRec2 is None: return p1, p2, False        
-        pp1a = outRec1.pts; pp2a = outRec2.pts
+        if outRec1.pts is None or outRec2.pts is None: return p1, p2, False
         pt1 = jr.pt2a; pt2 = jr.pt2b
         pt3 = jr.pt1a; pt4 = jr.pt1b
-        pp1a, pt1, pt2, result = _FindSegment(pp1a, pt1, pt2)
+        pp1a, pt1, pt2, result = self._FindJoinSegment(outRec1, pt1, pt2)
         if not result: return p1, p2, False
         if (outRec1 == outRec2):
-            pp2a = pp1a.nextOp
-            pp2a, pt3, pt4, result = _FindSegment(pp2a, pt3, pt4) 
+            pp2a, pt3, pt4, result = self._FindJoinSegment(outRec2, pt3, pt4, pp1a, pp1a.nextOp)
             if not result or pp2a == pp1a: return p1, p2, False
         else:
-            pp2a, pt3, pt4, result = _FindSegment(pp2a, pt3, pt4)
+            pp2a, pt3, pt4, result = self._FindJoinSegment(outRec2, pt3, pt4)
             if not result: return p1, p2, False
         pt1, pt2, result = _GetOverlapSegment(pt1, pt2, pt3, pt4) 
         if not result: return p1, p2, False
@@ -1661,6 +1729,7 @@ class Clipper(ClipperBase):
         elif _Pt3IsBetweenPt1AndPt2(pp2a.pt, p3.pt, pt2):
             p4 = _InsertPolyPtBetween(pp2a, p3, pt2)
         else: p4 = _InsertPolyPtBetween(p3, prevOp, pt2)
+        for op in (p1, p2, p3, p4): self._IndexOutPt(op)
     
         if p1.nextOp == p2 and p3.prevOp == p4:
             p1.nextOp = p3
@@ -1677,14 +1746,47 @@ class Clipper(ClipperBase):
         return p1, p2, False
 
     def _FixupFirstLefts1(self, oldOutRec, newOutRec):
-        for outRec in self._PolyOutList:
+        for outRec in list(self._FirstLeftIndex.get(oldOutRec, ())):
             if outRec.pts is not None and outRec.FirstLeft == oldOutRec:
                 if _Poly2ContainsPoly1(outRec.pts, newOutRec.pts):
-                    outRec.FirstLeft = newOutRec
+                    self._SetFirstLeft(outRec, newOutRec)
 
     def _FixupFirstLefts2(self, oldOutRec, newOutRec):
-        for outRec in self._PolyOutList:
-            if outRec.FirstLeft == oldOutRec: outRec.FirstLeft = newOutRec
+        for outRec in list(self._FirstLeftIndex.get(oldOutRec, ())):
+            if outRec.FirstLeft == oldOutRec: self._SetFirstLeft(outRec, newOutRec)
+
+    def _SetFirstLeft(self, outRec, firstLeft):
+        # while joining with a PolyTree, the out-records are also indexed by
+        # their FirstLeft so the fixups above need not scan them all
+        index = self._FirstLeftIndex
+        if index is not None:
+            if outRec.FirstLeft is not None: index[outRec.FirstLeft].remove(outRec)
+            if firstLeft is not None: index.setdefault(firstLeft, []).append(outRec)
+        outRec.FirstLeft = firstLeft
+
+    def _IndexOutPt(self, op):
+        ops = self._OutPtIndex.setdefault(op.pt, [])
+        if op not in ops: ops.append(op)
+
+    def _IsRingVertex(self, pt, outRec):
+        for op in self._OutPtIndex.get(pt, ()):
+            if op.idx >= 0 and self._GetOutRec(op.idx) is outRec: return True
+        return False
+
+    def _FindJoinSegment(self, outRec, pt1, pt2, excludeOp = None, startOp = None):
+        # an output edge that overlaps the join segment nearly always ends at
+        # one of the segment's ends, so look there in the index first, and
+        # only walk the whole polygon like _FindSegment if that fails
+        for pt in (pt1, pt2):
+            for op in self._OutPtIndex.get(pt, ()):
+                for outPt in (op, op.nextOp):
+                    if outPt is excludeOp or outPt.idx < 0 or \
+                        self._GetOutRec(outPt.idx) is not outRec: continue
+                    if _SlopesEqual(pt1, pt2, outPt.pt, outPt.prevOp.pt) and _SlopesEqual(pt1, pt2, outPt.pt):
+                        pt1a, pt2a, overlap = _GetOverlapSegment(pt1, pt2, outPt.pt, outPt.prevOp.pt)
+                        if overlap: return outPt, pt1a, pt2a, True
+        if startOp is None: startOp = outRec.pts
+        return _FindSegment(startOp, pt1, pt2)
 
     def _GetOutRec(self, idx):
         outrec = self._PolyOutList[idx]
@@ -1693,6 +1795,34 @@ class Clipper(ClipperBase):
         return outrec
 
     def _JoinCommonEdges(self):
+        # index the output points by position, the joins by the polygons
+        # they refer to, and for a PolyTree the out-records by FirstLeft
+        self._OutPtIndex = dict()
+        self._JoinIndex = dict()
+        for outRec in self._PolyOutList:
+            if outRec.pts is None: continue
+            op = outRec.pts
+            while True:
+                self._OutPtIndex.setdefault(op.pt, []).append(op)
+                op = op.nextOp
+                if op == outRec.pts: break
+        for i, jr in enumerate(self._JoinList):
+            self._JoinIndex.setdefault(jr.poly1Idx, []).append(i)
+            if jr.poly2Idx != jr.poly1Idx:
+                self._JoinIndex.setdefault(jr.poly2Idx, []).append(i)
+        if self._UsingPolyTree:
+            self._FirstLeftIndex = dict()
+            for outRec in self._PolyOutList:
+                if outRec.FirstLeft is not None:
+                    self._FirstLeftIndex.setdefault(outRec.FirstLeft, []).append(outRec)
+        try:
+            self._JoinCommonEdgesIndexed()
+        finally:
+            self._OutPtIndex = None
+            self._JoinIndex = None
+            self._FirstLeftIndex = None
+
+    def _JoinCommonEdgesIndexed(self):
         for i in range(len(self._JoinList)):
             jr = self._JoinList[i]
             outRec1 = self._GetOutRec(jr.poly1Idx)
@@ -1712,13 +1842,14 @@ class Clipper(ClipperBase):
                 outRec1.bottomPt = None
                 outRec2 = self._CreateOutRec()
                 outRec2.pts = p2
+                _UpdateOutPtIdxs(outRec2)
                 jr.poly2Idx = outRec2.idx
 
                 if _Poly2ContainsPoly1(outRec2.pts, outRec1.pts):
                     outRec2.isHole = not outRec1.isHole
-                    outRec2.FirstLeft = outRec1
+                    self._SetFirstLeft(outRec2, outRec1)
                     
-                    self._FixupJoinRecs(jr, p2, i + 1)
+                    self._FixupJoinRecs(jr, outRec2, i + 1)
                     
                     if self._UsingPolyTree: self._FixupFirstLefts2(outRec2, outRec1)
                     
@@ -1731,10 +1862,10 @@ class Clipper(ClipperBase):
                 elif _Poly2ContainsPoly1(outRec1.pts, outRec2.pts):
                     outRec2.isHole = outRec1.isHole
                     outRec1.isHole = not outRec2.isHole
-                    outRec2.FirstLeft = outRec1.FirstLeft
-                    outRec1.FirstLeft = outRec2
+                    self._SetFirstLeft(outRec2, outRec1.FirstLeft)
+                    self._SetFirstLeft(outRec1, outRec2)
                     
-                    self._FixupJoinRecs(jr, p2, i + 1)
+                    self._FixupJoinRecs(jr, outRec2, i + 1)
                     
                     if self._UsingPolyTree: self._FixupFirstLefts2(outRec1, outRec2)
                     
@@ -1745,9 +1876,9 @@ class Clipper(ClipperBase):
                         _ReversePolyPtLinks(outRec1.pts)
                 else:                  
                     outRec2.isHole = outRec1.isHole
-                    outRec2.FirstLeft = outRec1.FirstLeft
+                    self._SetFirstLeft(outRec2, outRec1.FirstLeft)
                     
-                    self._FixupJoinRecs(jr, p2, i + 1)
+                    self._FixupJoinRecs(jr, outRec2, i + 1)
                     if self._UsingPolyTree: self._FixupFirstLefts1(outRec1, outRec2)
                     
                     _FixupOutPolygon(outRec1)
@@ -1760,61 +1891,77 @@ class Clipper(ClipperBase):
                 
                 outRec1.isHole = holeStateRec.isHole
                 if holeStateRec == outRec2:
-                    outRec1.FirstLeft = outRec2.FirstLeft
-                outRec2.FirstLeft = outRec1
+                    self._SetFirstLeft(outRec1, outRec2.FirstLeft)
+                self._SetFirstLeft(outRec2, outRec1)
                 
                 if self._UsingPolyTree: self._FixupFirstLefts2(outRec2, outRec1)
         return
     
     def _DoSimplePolygons(self):
-        i = 0;
+        # splits each ring wherever it touches itself at a repeated vertex, in
+        # a single walk that looks up the vertices seen so far in a dict. the
+        # loop between two visits of a vertex is cut off as a ring of its own,
+        # and since the rings only touch and never cross, the signs of their
+        # areas tell if one is a hole in the other, so no point in polygon
+        # tests are needed
+        i = 0
         while i < len(self._PolyOutList):
             outrec = self._PolyOutList[i]
-            i +=1
-            op = outrec.pts
-            if (op is None): continue
+            i += 1
+            if outrec.pts is None: continue
+            area = self._Area(outrec.pts)
+            seen = dict()
+            op2 = outrec.pts
             while True:
-                op2 = op.nextOp
-                while (op2 != outrec.pts): 
-                    if (_PointsEqual(op.pt, op2.pt) and op2.nextOp != op and op2.prevOp != op): 
-                        #split the polygon into two ...
-                        op3 = op.prevOp
-                        op4 = op2.prevOp
-                        op.prevOp = op4
-                        op4.nextOp = op
-                        op2.prevOp = op3
-                        op3.nextOp = op2
-                        
-                        outrec.pts = op
-                        outrec2 = self._CreateOutRec();
-                        outrec2.pts = op2;
-                        _UpdateOutPtIdxs(outrec2)
-                        if (_Poly2ContainsPoly1(outrec2.pts, outrec.pts)):
-                            #OutRec2 is contained by OutRec1 ...
-                            outrec2.isHole = not outrec.isHole
-                            outrec2.FirstLeft = outrec
-                      
-                        elif (_Poly2ContainsPoly1(outrec.pts, outrec2.pts)):
-                            #OutRec1 is contained by OutRec2 ...
-                            outrec2.isHole = outrec.isHole
-                            outrec.isHole = not outrec2.isHole
-                            outrec2.FirstLeft = outrec.FirstLeft
-                            outrec.FirstLeft = outrec2
-                        else:
-                            #the 2 polygons are separate ...
-                            outrec2.isHole = outrec.isHole;
-                            outrec2.FirstLeft = outrec.FirstLeft;
-                        op2 = op; # ie get ready for the next iteration
-                    op2 = op2.nextOp
-                op = op.nextOp
-                if op == outrec.pts: break
+                op = seen.get(op2.pt)
+                if op is not None and op2.nextOp != op and op2.prevOp != op:
+                    #split the polygon into two ...
+                    op3 = op.prevOp
+                    op4 = op2.prevOp
+                    op.prevOp = op4
+                    op4.nextOp = op
+                    op2.prevOp = op3
+                    op3.nextOp = op2
+                    # the walk started at or before op, so outrec.pts can
+                    # only be in the loop if it is op itself
+                    if outrec.pts == op: outrec.pts = op2
+                    loop = self._CreateOutRec()
+                    loop.pts = op
+                    _UpdateOutPtIdxs(loop)
+                    # the loop's vertices are no longer in this ring
+                    p = op
+                    while True:
+                        if seen.get(p.pt) is p: del seen[p.pt]
+                        p = p.nextOp
+                        if p == op: break
+                    loopArea = self._Area(op)
+                    area -= loopArea
+                    if (loopArea > 0) == (area > 0):
+                        #the 2 polygons are separate ...
+                        loop.isHole = outrec.isHole
+                        loop.FirstLeft = outrec.FirstLeft
+                    elif abs(loopArea) < abs(area):
+                        #the loop is contained by the rest of the ring ...
+                        loop.isHole = not outrec.isHole
+                        loop.FirstLeft = outrec
+                    else:
+                        #the rest of the ring is contained by the loop ...
+                        loop.isHole = outrec.isHole
+                        outrec.isHole = not loop.isHole
+                        loop.FirstLeft = outrec.FirstLeft
+                        outrec.FirstLeft = loop
+                    seen[op2.pt] = op2
+                else:
+                    seen.setdefault(op2.pt, op2)
+                op2 = op2.nextOp
+                if op2 == outrec.pts: break
         return
-                
+
     def _ExecuteInternal(self):
         try: 
             try:
                 self._Reset()
-                if self._Scanbeam is None: return True
+                if not self._Scanbeam: return True
                 botY = self._PopScanbeam()
                 while True:
                     self._InsertLocalMinimaIntoAEL(botY)
@@ -1824,7 +1971,7 @@ class Clipper(ClipperBase):
                     if not self._ProcessIntersections(botY, topY): return False
                     self._ProcessEdgesAtTopOfScanbeam(topY)
                     botY = topY
-                    if self._Scanbeam is None and self._CurrentLocMin is None: break
+                    if not self._Scanbeam and self._CurrentLocMin is None: break
                     
                 for outRec in self._PolyOutList:
                     if outRec.pts is None: continue                
@@ -1909,11 +2056,20 @@ class Clipper(ClipperBase):
             polyNode = PolyNode()
             polyTree._AllNodes.append(polyNode)
             outRec.PolyNode = polyNode
+            contour = polyNode.Contour
             op = outRec.pts
             while True:
-                polyNode.Contour.append(op.pt)
+                contour.append(op.pt)
                 op = op.prevOp
                 if op == outRec.pts: break
+            # measure the integer contour once, so results need not be
+            # measured again after converting them back to floats
+            xs = [pt.x for pt in contour]
+            ys = [pt.y for pt in contour]
+            polyNode.Bounds = Rect(min(xs), min(ys), max(xs), max(ys))
+            # same as Area(), with the terms that cancel out left out
+            area = sum(map(operator.mul, xs, ys[1:] + ys[:1])) - sum(map(operator.mul, xs[1:] + xs[:1], ys))
+            polyNode.Area = float(area) / 2
         # build the tree ...
         for outRec in self._PolyOutList:
             if outRec.PolyNode is None: continue
@@ -1983,24 +2139,43 @@ def _GetUnitNormal(pt1, pt2):
     dy = float(dy) * f
     return FloatPoint(dy, -dx)
 
+_CircleTemplates = dict()
+
+def _ArcSteps(radius, limit):
+    # the number of chords around a whole circle for none of them to stray
+    # more than limit from it, kept between 8 and 220 chords and rounded up
+    # to a multiple of four so that circles reach out to their bounds
+    radius = abs(radius)
+    if limit <= 0: return 220
+    elif limit >= radius: return 8
+    steps = int(math.ceil(math.pi / math.acos(1 - limit / float(radius))))
+    steps = (steps + 3) // 4 * 4
+    return min(max(steps, 8), 220)
+
+def _CircleTemplate(steps):
+    # the (cos,sin) points of a unit circle with the given number of chords,
+    # going counterclockwise from angle 0, only ever computed once per count
+    template = _CircleTemplates.get(steps)
+    if template is None:
+        angle = 2 * math.pi / steps
+        template = [(math.cos(i * angle), math.sin(i * angle)) for i in range(steps)]
+        _CircleTemplates[steps] = template
+    return template
+
 def _BuildArc(pt, a1, a2, r, limit):
-    arcFrac = abs(a2 - a1) / (2 * math.pi);
-    steps = int(arcFrac * math.pi / math.acos(1 - limit / abs(r)))
-    if steps < 2: steps = 2
-    elif steps > 222.0 * arcFrac:
-        steps = int(222.0 * arcFrac)
+    # the arc runs from a1 to a2 through the points of the cached unit circle
+    # that lie between them, so only its two ends need to be computed
+    steps = _ArcSteps(r, limit)
+    template = _CircleTemplate(steps)
+    angle = 2 * math.pi / steps
+    if a2 >= a1: between = range(int(math.floor(a1 / angle)) + 1, int(math.ceil(a2 / angle)))
+    else: between = range(int(math.ceil(a1 / angle)) - 1, int(math.floor(a2 / angle)), -1)
     
-    result = []
-    y = math.sin(a1)
-    x = math.cos(a1)
-    s = math.sin((a2-a1)/steps)
-    c = math.cos((a2-a1)/steps)
-    for _ in range(steps+1):
+    result = [FloatPoint(pt.x + round(math.cos(a1) * r), pt.y + round(math.sin(a1) * r))]
+    for i in between:
+        x, y = template[i % steps]
         result.append(FloatPoint(pt.x + round(x * r), pt.y + round(y * r)))
-        x2 = x
-        x = x * c - s * y    # cross product & dot product here ...
-        y = x2 * s + y * c   # avoids repeat calls to the much slower sin() & cos()
-        
+    result.append(FloatPoint(pt.x + round(math.cos(a2) * r), pt.y + round(math.sin(a2) * r)))
     return result
 
 def _GetBounds(pts):
@@ -2041,7 +2216,7 @@ def _StripDupPts(poly):
         i -= 1
     return poly
 
-def _OffsetInternal(polys, isPolygon, delta, jointype = JoinType.Square, endtype = EndType.Square, limit = 0.0): 
+def _OffsetInternal(polys, isPolygon, delta, jointype = JoinType.Square, endtype = EndType.Square, limit = 0.0, scale = PRECISION): 
     
     def _DoSquare(pt):
         pt1 = Point(round(pt.x + Normals[k].x * delta), round(pt.y + Normals[k].y * delta))
@@ -2103,15 +2278,22 @@ def _OffsetInternal(polys, isPolygon, delta, jointype = JoinType.Square, endtype
         else: _DoRound(pts[j], limit)
         return j
 
+    # offset in scaled integer units, so the rounded offset points
+    # only snap to the same grid that the clipping is done on
+    polys = [FloatPoints2IntPoints(poly, scale) for poly in polys]
+    # points that snapped together would give zero length normals
+    polys = [[pt for i, pt in enumerate(poly) if i == 0 or not _PointsEqual(poly[i-1], pt)] for poly in polys]
     if delta == 0: return polys
     rmin = 0.5    
     if (jointype == JoinType.Miter):  
         if (limit > 2): 
             rmin = 2.0 / (limit * limit)
-        limit = 0.25; #just in case endtype == EndType.Round
+        limit = abs(delta) * scale * 0.001; #just in case endtype == EndType.Round
     else:
-        if (limit <= 0): limit = 0.25
-        elif (limit > abs(delta)): limit = abs(delta)
+        if (limit <= 0): limit = 0.25 * scale
+        else: limit = limit * scale
+    delta = delta * scale
+    if jointype != JoinType.Miter and limit > abs(delta): limit = abs(delta)
             
     res = []
     ppts = polys[:]    
@@ -2199,7 +2381,7 @@ def _OffsetInternal(polys, isPolygon, delta, jointype = JoinType.Square, endtype
             res.append(result)        
 
 
-    res = [FloatPoints2IntPoints(eachpoly) for eachpoly in res]
+    res = [FloatPoints2IntPoints(eachpoly, 1) for eachpoly in res]
     c = Clipper()
     c.AddPolygons(res, PolyType.Subject)
     resulttree = PolyTree()
@@ -2214,14 +2396,22 @@ def _OffsetInternal(polys, isPolygon, delta, jointype = JoinType.Square, endtype
         outer.append(Point(bounds.left-10, bounds.top-10))
         c.AddPolygon(outer, PolyType.Subject)
         c.Execute2(ClipType.Union, resulttree, PolyFillType.Negative, PolyFillType.Negative)
-        if len(res) > 0: res.pop(0)
-        for poly in res:
-            poly = poly[::-1]
+        # the frame is the only outer, so the holes in it are the result,
+        # and the orientations are reversed as in the original ReverseSolution
+        frames = resulttree.Childs
+        resulttree.Childs = []
+        resulttree.ChildCount = 0
+        for frame in frames:
+            for node in frame.Childs: resulttree._AddChild(node)
+        resulttree._AllNodes = [node for node in resulttree._AllNodes if node not in frames]
+        for node in resulttree._AllNodes:
+            node.Contour.reverse()
+            node.Area = -node.Area
     return resulttree
 
-def OffsetPolygons(polys, delta, jointype = JoinType.Square, limit = 0.0, autoFix = True):
+def OffsetPolygons(polys, delta, jointype = JoinType.Square, limit = 0.0, autoFix = True, scale = PRECISION):
     if not autoFix: 
-        return _OffsetInternal(polys, True, delta, jointype, EndType.Butt, limit)        
+        return _OffsetInternal(polys, True, delta, jointype, EndType.Butt, limit, scale)        
     pts = polys[:]
     botPoly = None
     botPt = None
@@ -2239,20 +2429,16 @@ def OffsetPolygons(polys, delta, jointype = JoinType.Square, limit = 0.0, autoFi
     if Area(botPoly) < 0.0:
         for i in range(len(pts)):
             pts[i] = pts[i][::-1]                
-    return _OffsetInternal(pts, True, delta, jointype, EndType.Butt, limit)
+    return _OffsetInternal(pts, True, delta, jointype, EndType.Butt, limit, scale)
 
-def OffsetPolyLines(polys, delta, jointype = JoinType.Square, endtype = EndType.Square, limit = 0.0):
+def OffsetPolyLines(polys, delta, jointype = JoinType.Square, endtype = EndType.Square, limit = 0.0, scale = PRECISION):
     polys2 = polys[:]
-    for p in polys2:
-        if p == []: continue            
-        for i in range(1, len(p)):
-            if _PointsEqual(p[i-1], p[i]): p.pop(i)
     if endtype == EndType.Closed:
         for i in range(len(polys2)):
             polys2.append(polys2[i][::-1])
-        return _OffsetInternal(polys2, True, delta, jointype, EndType.Butt, limit) 
+        return _OffsetInternal(polys2, True, delta, jointype, EndType.Butt, limit, scale) 
     else:    
-        return _OffsetInternal(polys2, False, delta, jointype, endtype, limit) 
+        return _OffsetInternal(polys2, False, delta, jointype, endtype, limit, scale) 
 
 def OffsetPoint(point, delta, jointype = JoinType.Round, limit = 0.0):
     # Mashup of other functions in the script
@@ -1,12 +1,19 @@
 #The geometry instances for shapy
 
 #import stuff
-import itertools, math
+import itertools, math, heapq, threading
+from array import array
 import clipper,measure,pydraw
-from pydraw.geomhelper import _Line, _Bezier, _Arc, _Point
+from strtree import STRtree, _BoxDist, _STRPack
 
 #global settings
 PRECISION = 1000000000
+#clipping scales coordinates to integers no larger than this, so that the
+#products of their differences still fit in a machine word
+MAXINT = 2**30
+#clipping engines are kept between operations so their pooled edges and
+#output points can be reused, one engine per thread
+_engines = threading.local()
 
 #helper functions
 def _pairwise(iterable):
@@ -18,14 +25,140 @@ def _flatten(coords):
     Flattens the coordinate pairs from Pyshp so they can be used by clipper
     """
     return list(itertools.chain.from_iterable(coords))
-def _Floats2Ints(coords):
-    precision = PRECISION
-    return map(int,[xory*precision for xory in coords])
-def _Ints2Floats(coords):
+def _Floats2Ints(coords, scale=PRECISION):
+    return [int(round(xory*scale)) for xory in coords]
+def _Ints2Floats(coords, scale=PRECISION):
     #returns as pairs
-    precision = PRECISION
-    return [(point.x/float(precision),point.y/float(precision)) for point in coords]
-def _PrepCoords(coords, convertfloats=True):
+    scale = float(scale)
+    return [(point.x/scale,point.y/scale) for point in coords]
+def _ScaleFor(bounds, tolerance=None):
+    """
+    Returns the power of ten to scale coordinates by before clipping them.
+    If a tolerance is given the scale is just fine enough to resolve it.
+    Otherwise it is the finest scale that keeps all coordinates within the
+    bounds below MAXINT, but never finer than PRECISION.
+    """
+    if tolerance:
+        return 10.0 ** int(math.ceil(-math.log10(tolerance)))
+    extent = max(abs(xory) for xory in bounds)
+    if extent == 0: return PRECISION
+    return min(10.0 ** int(math.floor(math.log10(MAXINT / float(extent)))), PRECISION)
+def _ArcTolerance(radius, resolution):
+    """
+    Turns the 0 to 1 resolution option of the buffer methods into the
+    largest distance that the chords of round arcs may stray from the arc,
+    going from about 3% of the radius for 0 down to 0.03% for 1.0. Being
+    relative to the radius, circles get the same number of vertices
+    whatever the map units.
+    """
+    return abs(radius) * 10 ** (-1.5 - 2 * resolution)
+def _PointClusters(points, distance):
+    """
+    Groups xy points into clusters, where each point is within the distance
+    of at least one other point in its cluster. The points are put in grid
+    cells small enough that all points of a cell belong together, so only
+    the cells near each other have to be compared point by point.
+    Returns a list of clusters, each a list of point indexes.
+    """
+    cellsize = distance / math.sqrt(2)
+    cells = dict()
+    for index,(x,y) in enumerate(points):
+        cells.setdefault((int(math.floor(x/cellsize)), int(math.floor(y/cellsize))), []).append(index)
+    #join up the cells that have any points within the distance of each other
+    parent = dict((cell,cell) for cell in cells)
+    def root(cell):
+        while parent[cell] != cell:
+            parent[cell] = parent[parent[cell]]
+            cell = parent[cell]
+        return cell
+    #only half of the neighbouring cells, as each pair is compared just once
+    offsets = [(xoff,yoff) for xoff in range(0,3) for yoff in range(-2,3) if xoff > 0 or yoff > 0]
+    maxdist = distance * distance
+    for (col,row),indexes in cells.iteritems():
+        for xoff,yoff in offsets:
+            other = (col+xoff,row+yoff)
+            if other not in cells or root(other) == root((col,row)): continue
+            near = any((x-otherx)**2 + (y-othery)**2 <= maxdist
+                       for x,y in (points[index] for index in indexes)
+                       for otherx,othery in (points[otherindex] for otherindex in cells[other]))
+            if near: parent[root(other)] = root((col,row))
+    clusters = dict()
+    for cell,indexes in cells.iteritems():
+        clusters.setdefault(root(cell), []).extend(indexes)
+    return clusters.values()
+def _BufferLines(arrays, bounds, buffersize, jointype, endtype, resolution):
+    """
+    Offsets the lines given as flat coordinate arrays by half the buffersize
+    on both sides, and dissolves all their outlines in a single union.
+    Returns a Polygon, a MultiPolygon, or None if the buffersize is not positive.
+    """
+    jointypes = dict([("bevel",clipper.JoinType.Square),
+                      ("square",clipper.JoinType.Square),
+                      ("round",clipper.JoinType.Round),
+                      ("miter",clipper.JoinType.Miter)])
+    endtypes = dict([("project",clipper.EndType.Square),
+                     ("square",clipper.EndType.Square),
+                     ("round",clipper.EndType.Round),
+                     ("flat",clipper.EndType.Butt),
+                     ("butt",clipper.EndType.Butt)])
+    jointype = jointypes[jointype]
+    endtype = endtypes[endtype]
+    distance = buffersize / 2.0
+    if distance <= 0: return None
+    lines = [_PrepArray(flatcoords, convertfloats=False) for flatcoords in arrays]
+    #scale to fit the envelope once grown by the buffer
+    xmin,ymin,xmax,ymax = bounds
+    scale = _ScaleFor([xmin-distance,ymin-distance,xmax+distance,ymax+distance])
+    #round joins and caps are kept within the resolution's tolerance of the
+    #true arc, except that for miter joins the limit is the miter limit
+    limit = 0.0
+    if jointype != clipper.JoinType.Miter:
+        limit = _ArcTolerance(distance, resolution)
+    resulttree = clipper.OffsetPolyLines(lines, distance, jointype=jointype, endtype=endtype, limit=limit, scale=scale)
+    return _ResultTree2Geom(resulttree, scale)
+def _BufferPolygons(polys, bounds, buffersize, jointype, resolution):
+    """
+    Offsets the rings of all the polygons in one pass of the clipper offset
+    engine, whose single union also dissolves any overlaps between them.
+    Returns a Polygon, a MultiPolygon, or None if nothing is left.
+    """
+    jointypes = dict([("bevel",clipper.JoinType.Square),
+                      ("round",clipper.JoinType.Round),
+                      ("miter",clipper.JoinType.Miter)])
+    jointype = jointypes[jointype]
+    #prep coords, with all exteriors wound one way and all holes the other
+    #so that the offset outlines of different polygons add up
+    allpolys = []
+    for poly in polys:
+        for ring in [poly.exterior] + list(poly.interiors):
+            points = _PrepArray(ring._array, convertfloats=False)
+            if (_ArrayArea(ring._array) < 0) == (ring is poly.exterior):
+                points.reverse()
+            allpolys.append(points)
+    #scale to fit the envelope once grown by the buffer
+    xmin,ymin,xmax,ymax = bounds
+    grow = abs(buffersize)
+    scale = _ScaleFor([xmin-grow,ymin-grow,xmax+grow,ymax+grow])
+    #round joins are kept within the resolution's tolerance of the true arc
+    limit = 0.0
+    if jointype == clipper.JoinType.Round: limit = _ArcTolerance(buffersize, resolution)
+    #execute buffer
+    resulttree = clipper.OffsetPolygons(allpolys, buffersize, jointype=jointype, limit=limit, scale=scale)
+    #finally create and return geom
+    return _ResultTree2Geom(resulttree, scale)
+def _CopyGeoJSON(geojson):
+    """
+    Returns a copy of a cached geojson dictionary, with new lists all the way
+    down to the coordinate tuples, so that callers can't change the cache.
+    """
+    def copy(coords):
+        if isinstance(coords, list): return [copy(item) for item in coords]
+        return coords
+    return {"type":geojson["type"], "coordinates":copy(geojson["coordinates"])}
+def _CombinedBounds(geoms):
+    xmins,ymins,xmaxs,ymaxs = zip(*[geom.bounds for geom in geoms])
+    return [min(xmins),min(ymins),max(xmaxs),max(ymaxs)]
+def _PrepCoords(coords, convertfloats=True, scale=PRECISION):
     """
     This function prepares a shape for advanced processing.
     It takes a single list of coordinate tuples and returns the
@@ -35,43 +168,304 @@ def _PrepCoords(coords, convertfloats=True):
     The only time converfloats should be False is when the coordinates will be
     sent directly to the clipper.py modules' _Bounds, _Area, or _Offset methods.
     """
+    return _PrepArray(_flatten(coords), convertfloats, scale)
+def _PrepArray(flatcoords, convertfloats=True, scale=PRECISION):
+    """
+    Same as _PrepCoords, but takes the flat x,y,x,y... coordinate array
+    that the geometries store their vertices in. 
+    """
     if convertfloats:
-        return clipper.IntsToPoints(_Floats2Ints(_flatten(coords)))
+        return clipper.IntsToPoints(_Floats2Ints(flatcoords, scale))
     else:
-        return clipper.IntsToPoints(_flatten(coords))
-def _ResultTree2Geom(resulttree):
+        return clipper.IntsToPoints(flatcoords)
+def _Coords2Array(coords):
+    """
+    Packs a list of xy coordinate tuples into a single flat array of doubles,
+    interleaved as x,y,x,y... This is the only copy of the vertices that
+    a geometry keeps, everything else is derived from it when needed.
+    If the coordinates are already a CoordinateSequence its buffer is shared
+    instead of copied. 
+    """
+    if isinstance(coords, CoordinateSequence):
+        return coords._array
+    return array("d", _flatten(coords))
+def _ReverseArray(flatcoords):
+    """
+    Returns a new flat coordinate array with the xy pairs in reverse order.
+    """
+    reverse = array("d", flatcoords)
+    reverse[0::2] = flatcoords[-2::-2]
+    reverse[1::2] = flatcoords[::-2]
+    return reverse
+def _ArrayBounds(flatcoords):
+    xs = flatcoords[0::2]
+    ys = flatcoords[1::2]
+    return (min(xs), min(ys), max(xs), max(ys))
+def _ArrayArea(flatcoords):
+    #same formula as clipper.Area so that the sign/orientation agrees
+    xs = flatcoords[0::2]
+    ys = flatcoords[1::2]
+    highI = len(xs) - 1
+    A = (xs[highI] + xs[0]) * (ys[0] - ys[highI])
+    for i in xrange(highI):
+        A += (xs[i] + xs[i+1]) * (ys[i+1] - ys[i])
+    return A / 2.0
+def _ArrayLength(flatcoords):
+    hypot = math.hypot
+    length = 0
+    for index in xrange(2, len(flatcoords), 2):
+        xdiff = flatcoords[index] - flatcoords[index-2]
+        ydiff = flatcoords[index+1] - flatcoords[index-1]
+        length += hypot(xdiff, ydiff)
+    return length
+def _Crossing(start, end, axis, bound):
+    #measured from the lower end, so that the pieces on both sides agree
+    if end < start: start,end = end,start
+    t = (bound - start[axis]) / float(end[axis] - start[axis])
+    if axis == 0: return (bound, start[1] + t * (end[1] - start[1]))
+    return (start[0] + t * (end[0] - start[0]), bound)
+def _CutRings(rings, axis, bound, sign):
+    """
+    Cuts the closed rings of one or more non-overlapping polygons along a
+    horizontal or vertical line, keeping the side where the coordinate minus
+    the bound has the given sign. Rings on the kept side are returned whole, while the
+    pieces of cut rings are joined up along the border: the border passes
+    in and out of the polygons at the sorted crossings, so each crossing
+    where a piece leaves the kept side joins the one next to it.
+    Returns the new list of closed rings, or None if the crossings don't
+    pair up, which only happens for invalid polygons.
+    """
+    result,pieces = [],[]
+    for ring in rings:
+        points = ring[:-1]
+        count = len(points)
+        inside = [(point[axis] - bound) * sign > 0 for point in points]
+        if all(inside): result.append(ring)
+        if all(inside) or not any(inside): continue
+        #walk each inside stretch from where it enters to where it leaves
+        first = [i for i in xrange(count) if inside[i] and not inside[i-1]][0]
+        for offset in xrange(count):
+            i = (first + offset) % count
+            if not inside[i]: continue
+            if not inside[i-1]:
+                piece = [_Crossing(points[i-1], points[i], axis, bound)]
+                pieces.append(piece)
+            piece.append(points[i])
+            after = points[(i+1) % count]
+            if not inside[(i+1) % count]:
+                piece.append(_Crossing(points[i], after, axis, bound))
+    if not pieces: return result
+    #pair up the sorted crossings, each joining the end of one piece to the start of another
+    other = 1 - axis
+    crossings = [(piece[0][other],1,index) for index,piece in enumerate(pieces)]
+    crossings.extend((piece[-1][other],0,index) for index,piece in enumerate(pieces))
+    crossings.sort()
+    nextpiece = dict()
+    for (_,kind1,index1),(_,kind2,index2) in zip(crossings[0::2], crossings[1::2]):
+        if kind1 == kind2: return None
+        if kind1 == 0: nextpiece[index1] = index2
+        else: nextpiece[index2] = index1
+    visited = set()
+    for index in xrange(len(pieces)):
+        if index in visited: continue
+        ring = []
+        while index not in visited:
+            visited.add(index)
+            ring.extend(pieces[index])
+            index = nextpiece[index]
+        ring.append(ring[0])
+        result.append(ring)
+    return result
+def _Rings2Polygons(rings):
+    """
+    Sorts closed rings of xy tuples into exteriors and holes by their
+    orientation, puts each hole in the smallest of the exteriors that
+    contain it, and returns the resulting polygons.
+    """
+    exteriors,holes = [],[]
+    for ring in rings:
+        flatcoords = array("d", [xory for point in ring for xory in point])
+        area = _ArrayArea(flatcoords)
+        #exteriors go clockwise and holes counterclockwise, as in LinearRing
+        if area > 0: exteriors.append(LinearRing(CoordinateSequence(flatcoords)))
+        elif area < 0: holes.append(LinearRing(CoordinateSequence(flatcoords), counterclockwise=True))
+    interiors = [[] for _ in exteriors]
+    if len(exteriors) == 1:
+        interiors[0] = holes
+    elif exteriors and holes:
+        tree = STRtree(exteriors)
+        for hole in holes:
+            xmin,ymin,xmax,ymax = hole.bounds
+            candidates = [i for i in tree.query_indexes(hole.bounds)
+                          if exteriors[i].bounds[0] <= xmin and exteriors[i].bounds[1] <= ymin
+                          and xmax <= exteriors[i].bounds[2] and ymax <= exteriors[i].bounds[3]]
+            if len(candidates) > 1:
+                point = hole.coords[0]
+                candidates = [i for i in candidates if clipper._PointInRing(point, list(exteriors[i].coords))] or candidates
+            if candidates:
+                owner = min(candidates, key=lambda i: exteriors[i].area)
+                interiors[owner].append(hole)
+    return [Polygon(exterior.coords, [hole.coords for hole in ownholes])
+            for exterior,ownholes in zip(exteriors, interiors)]
+def _ClipLineByRect(flatcoords, xmin, ymin, xmax, ymax):
+    """
+    Clips a line to a rectangle with the Liang-Barsky algorithm, one segment
+    at a time, and returns a list of the pieces that are inside as lists of
+    xy tuples.
+    """
+    pieces = []
+    piece = None
+    for index in xrange(2, len(flatcoords), 2):
+        x1,y1,x2,y2 = flatcoords[index-2:index+2]
+        xdiff,ydiff = x2-x1,y2-y1
+        tstart,tend = 0.0,1.0
+        for p,q in ((-xdiff,x1-xmin),(xdiff,xmax-x1),(-ydiff,y1-ymin),(ydiff,ymax-y1)):
+            if p == 0:
+                #parallel to this side, so either all outside or no limit
+                if q < 0: break
+            elif p < 0: tstart = max(tstart, q / float(p))
+            else: tend = min(tend, q / float(p))
+            if tstart > tend: break
+        else:
+            start = (x1 + tstart*xdiff, y1 + tstart*ydiff) if tstart > 0 else (x1,y1)
+            end = (x1 + tend*xdiff, y1 + tend*ydiff) if tend < 1 else (x2,y2)
+            if piece is not None and tstart == 0:
+                #continues the previous piece
+                piece.append(end)
+            elif start != end:
+                piece = [start,end]
+                pieces.append(piece)
+            if tend < 1: piece = None
+            continue
+        piece = None
+    return pieces
+def _BoxWithin(box, xmin, ymin, xmax, ymax):
+    boxxmin,boxymin,boxxmax,boxymax = box
+    return xmin <= boxxmin and boxxmax <= xmax and ymin <= boxymin and boxymax <= ymax
+def _Node2Ring(node, scale, counterclockwise=False):
+    """
+    Makes a LinearRing straight from a clipper result node. The area, bounds
+    and orientation were already measured on the integer contour while the
+    clipper built it, so they are only rescaled instead of measured again,
+    and the contour is kept as the ring's scaled coords for the next clip.
+    """
+    contour = node.Contour
+    area = node.Area
+    if (area > 0) == counterclockwise:
+        contour = contour[::-1]
+        area = -area
+    contour = contour + contour[:1]
+    floatscale = float(scale)
+    flatcoords = array("d", [xory/floatscale for xory in _flatten(contour)])
+    left,top,right,bottom = node.Bounds
+    ring = LinearRing.__new__(LinearRing)
+    ring._array = flatcoords
+    ring._scaled = (scale, contour)
+    ring.area = area / (floatscale * floatscale)
+    ring._bounds = (left/floatscale, top/floatscale, right/floatscale, bottom/floatscale)
+    ring._length = None
+    return ring
+def _Rings2Polygon(exterior, interiors):
+    """
+    Makes a Polygon from LinearRings that are already oriented as exterior
+    and holes.
+    """
+    poly = Polygon.__new__(Polygon)
+    poly.exterior = exterior
+    poly.interiors = interiors
+    poly._area = None
+    poly._length = None
+    poly._geojson = None
+    return poly
+def _ResultTree2Geom(resulttree, scale=PRECISION):
     """
     This function takes a resulttree as returned by the _Clip function
     and converts it to a ready-to-use geometry instance. If the resulttree
     is empty then the None value will be returned, meaning there were no
     results. Resulttrees are only used when the result is from clipping
-    polygons with polygons. 
-    """
-    def node2geom(node):
-        childcount = node.ChildCount
-        if childcount > 0:
-            resultlist = []
-            #collect results as a list of exterior-interiors tuples
-            for nodechild in node.Childs:
-                exterior = _Ints2Floats(nodechild.Contour)
-                nodeholes = nodechild.Childs
-                interiors = []
-                for hole in nodeholes:
-                    interiors.append( _Ints2Floats(hole.Contour) )
-                    #check if any subpolygons inside the hole and add to results
-                    subpolys = node2geom(hole)
-                    if subpolys:
-                        resultlist.extend( subpolys )
-                resultlist.append( (exterior, interiors) )
-            return resultlist
-    resultlist = node2geom(resulttree)
-    if resultlist:
-        if len(resultlist) == 1:
-            exterior,interiors = resultlist[0]
-            geom = Polygon(exterior, interiors)
-        elif len(resultlist) > 1:
-            geom = MultiPolygon(resultlist)
-        return geom
+    polygons with polygons. The rings are built directly from the integer
+    result nodes, see _Node2Ring.
+    """
+    polys = []
+    def addpolys(node):
+        for nodechild in node.Childs:
+            exterior = _Node2Ring(nodechild, scale)
+            interiors = []
+            for hole in nodechild.Childs:
+                interiors.append(_Node2Ring(hole, scale, counterclockwise=True))
+                #check if any subpolygons inside the hole and add to results
+                addpolys(hole)
+            polys.append(_Rings2Polygon(exterior, interiors))
+    addpolys(resulttree)
+    return _Parts2Geom(polys)
+def _Parts(geom):
+    """
+    Returns a list of the single polygons of a Polygon or MultiPolygon.
+    """
+    if geom.geom_type == "MultiPolygon": return list(geom.geoms)
+    return [geom]
+def _Parts2Geom(polys):
+    """
+    Returns a list of polygons as a single geometry, or None if empty.
+    """
+    if not polys: return None
+    elif len(polys) == 1: return polys[0]
+    return MultiPolygon(polys)
+def _BoxesOverlap(box1, box2):
+    xmin1,ymin1,xmax1,ymax1 = box1
+    xmin2,ymin2,xmax2,ymax2 = box2
+    return xmin1 <= xmax2 and xmin2 <= xmax1 and ymin1 <= ymax2 and ymin2 <= ymax1
+def _SplitByOverlap(parts, otherparts):
+    """
+    Splits the parts into those whose bbox overlaps or touches the bbox of any
+    of the otherparts, and those that are well apart from all of them.
+    """
+    overlapping,apart = [],[]
+    if not otherparts: return overlapping,list(parts)
+    #with many otherparts it pays to index them first
+    if len(otherparts) > 10:
+        tree = STRtree(otherparts)
+        overlaps = lambda box: tree.query_indexes(box)
+    else:
+        otherboxes = [other.bounds for other in otherparts]
+        overlaps = lambda box: any(_BoxesOverlap(box, otherbox) for otherbox in otherboxes)
+    for part in parts:
+        if overlaps(part.bounds): overlapping.append(part)
+        else: apart.append(part)
+    return overlapping,apart
+def _SplitApart(parts, otherparts):
+    """
+    Same as _SplitByOverlap, but a part is only apart if its bbox is also
+    apart from all the other parts of its own geom. Parts that overlap each
+    other still have to be dissolved by the clipper even when the other geom
+    is far away.
+    """
+    overlapping,apart = _SplitByOverlap(parts, otherparts)
+    if len(parts) < 2 or not apart: return overlapping,apart
+    if len(parts) > 10:
+        tree = STRtree(parts)
+        #a part's own box is always one of the hits
+        touchesown = lambda i,part: len(tree.query_indexes(part.bounds)) > 1
+    else:
+        boxes = [part.bounds for part in parts]
+        touchesown = lambda i,part: any(_BoxesOverlap(boxes[i], box) for j,box in enumerate(boxes) if j != i)
+    position = dict((id(part),i) for i,part in enumerate(parts))
+    stillapart = []
+    for part in apart:
+        if touchesown(position[id(part)], part): overlapping.append(part)
+        else: stillapart.append(part)
+    return overlapping,stillapart
+def _GetClipper():
+    """
+    Returns this thread's reusable clipper engine, or a new one if it is
+    already busy executing.
+    """
+    main = getattr(_engines, "clipper", None)
+    if main is None:
+        main = _engines.clipper = clipper.Clipper()
+    elif main._ExecuteLocked:
+        main = clipper.Clipper()
+    return main
 def _TypeCombi(geom1, geom2):
     """
     Returns a string of the unique type combination of two geometries.
@@ -98,7 +492,7 @@ def _TypeCombi(geom1, geom2):
             typecombi = "polypoly"
     return typecombi
             
-def _Clip(subjectgeom, clipgeom, cliptype,
+def _Clip(subjectgeom, clipgeom, cliptype, tolerance=None, scale=None, processes=None,
          txt2cliptype=dict([
             ("intersect",0),
             ("union",1),
@@ -112,7 +506,14 @@ def _Clip(subjectgeom, clipgeom, cliptype,
     - subjectpolys is the main geom to be compared with another one
     - clippolys is the geom to be compared with
     - cliptype can be "intersect","union","difference", or "exclusive_or"
+    - tolerance is the smallest coordinate difference the clipping must resolve
+    - scale is the integer scale to clip at, otherwise found from the envelope
+    - processes is the number of worker processes to clip tiles of the geoms in
     """
+    if processes is not None:
+        #big overlays are cut into tiles that are clipped in parallel
+        from parallel import parallel_overlay
+        return parallel_overlay(subjectgeom, clipgeom, cliptype, processes, tolerance=tolerance)
     cliptype = txt2cliptype[cliptype]
     typecombi = _TypeCombi(subjectgeom, clipgeom)
     if typecombi == "pointline":
@@ -132,17 +533,142 @@ def _Clip(subjectgeom, clipgeom, cliptype,
         #intersection returns intsec point
         pass
     elif typecombi == "polypoly":
+        # only parts whose boxes overlap a part of the other geom can interact,
+        # the rest are either dropped or passed straight through to the result
+        # unless they overlap a part of their own geom and need dissolving
+        if cliptype == clipper.ClipType.Intersection:
+            subjparts,_ = _SplitByOverlap(_Parts(subjectgeom), _Parts(clipgeom))
+            clipparts,_ = _SplitByOverlap(_Parts(clipgeom), subjparts)
+            resultparts = []
+        elif cliptype == clipper.ClipType.Difference:
+            subjparts,subjapart = _SplitApart(_Parts(subjectgeom), _Parts(clipgeom))
+            clipparts,_ = _SplitByOverlap(_Parts(clipgeom), subjparts)
+            resultparts = subjapart
+        else:
+            subjparts,subjapart = _SplitApart(_Parts(subjectgeom), _Parts(clipgeom))
+            clipparts,clipapart = _SplitApart(_Parts(clipgeom), subjparts)
+            resultparts = subjapart + clipapart
+        if not subjparts and not clipparts:
+            return _Parts2Geom(resultparts)
+        # scale to integers that keep the clipper on machine word arithmetic
+        if scale is None:
+            scale = _ScaleFor(_CombinedBounds(subjparts + clipparts), tolerance)
         # prepare clipper and add geoms
-        main = clipper.Clipper()
-        subjectgeom._addtoclipper(main, clipper.PolyType.Subject)
-        clipgeom._addtoclipper(main, clipper.PolyType.Clip)
-        # run clip operation
-        resulttree = clipper.PolyTree()
-        main.Execute2(cliptype, resulttree, clipper.PolyFillType.Positive, clipper.PolyFillType.Positive) #main._ClipType
+        main = _GetClipper()
+        try:
+            for part in subjparts:
+                part._addtoclipper(main, clipper.PolyType.Subject, scale)
+            for part in clipparts:
+                part._addtoclipper(main, clipper.PolyType.Clip, scale)
+            # run clip operation
+            resulttree = clipper.PolyTree()
+            succeeded = main.Execute2(cliptype, resulttree, clipper.PolyFillType.Positive, clipper.PolyFillType.Positive) #main._ClipType
+        finally:
+            # hand the edges and output points back to the engine's pools
+            main.Clear()
+        if not succeeded: return None
         # make geom from resulttree
         topnode = resulttree
-        geom = _ResultTree2Geom(topnode)
-        return geom
+        geom = _ResultTree2Geom(topnode, scale)
+        if not resultparts: return geom
+        if geom is not None: resultparts = _Parts(geom) + resultparts
+        return _Parts2Geom(resultparts)
+def _ClipMany(subjectgeom, clipgeoms, cliptype, tolerance=None):
+    """
+    Clips the subject against the union of many Polygons and MultiPolygons
+    in a single sweep, by adding the parts of all of them to the clipper as
+    clip polygons at once. Parts whose bbox is apart from the subject's are
+    left out before anything is added.
+    """
+    clipparts = [part for geom in clipgeoms for part in _Parts(geom)]
+    clipparts,_ = _SplitByOverlap(clipparts, _Parts(subjectgeom))
+    if not clipparts:
+        if cliptype != "difference": return None
+        # nothing to remove, but subject parts that overlap eachother are
+        # still dissolved, same as difference() would
+        subjparts,_ = _SplitApart(_Parts(subjectgeom), [])
+        if not subjparts: return subjectgeom
+        parts = _Parts(subjectgeom)
+        scale = _ScaleFor(subjectgeom.bounds, tolerance)
+        return _Parts2Geom(_UnionTree(parts, 0, len(parts), scale)[0])
+    return _Clip(subjectgeom, _Parts2Geom(clipparts), cliptype, tolerance)
+def _Overlay(subjectgeom, clipgeom, operations, tolerance=None, scale=None,
+             txt2cliptype=dict([
+                ("intersect",clipper.ClipType.Intersection),
+                ("union",clipper.ClipType.Union),
+                ("difference",clipper.ClipType.Difference),
+                ("reverse_difference",clipper.ClipType.Difference),
+                ("exclusive_or",clipper.ClipType.Xor)
+                ])):
+    """
+    Same as _Clip for two Polygons or MultiPolygons, but returns a dictionary
+    with the result of each of several cliptypes. This is a batching wrapper,
+    not a single sweep: each cliptype is still executed on its own, with the
+    same parts and scale as _Clip would use for it, so that each result is
+    identical to the one from the separate method. The parts are only split,
+    scaled and added to the clipper once for all the cliptypes that share
+    them, such as union and exclusive_or.
+
+    - operations is a sequence of "intersect","union","difference",
+    "reverse_difference" (the clipgeom minus the subjectgeom) or "exclusive_or"
+    """
+    for operation in operations:
+        if operation not in txt2cliptype:
+            raise ValueError("Unknown overlay operation: %s" %operation)
+    # split the parts the same way as _Clip, where parts that interact with
+    # nothing go straight to the results they belong in
+    subjparts,clipparts = _Parts(subjectgeom),_Parts(clipgeom)
+    loads = []
+    for operation in operations:
+        if operation == "reverse_difference":
+            first,second = clipparts,subjparts
+        else:
+            first,second = subjparts,clipparts
+        if operation == "intersect":
+            firstparts,_ = _SplitByOverlap(first, second)
+            secondparts,_ = _SplitByOverlap(second, firstparts)
+            apartparts = []
+        elif operation in ("difference","reverse_difference"):
+            firstparts,apartparts = _SplitApart(first, second)
+            secondparts,_ = _SplitByOverlap(second, firstparts)
+        else:
+            firstparts,firstapart = _SplitApart(first, second)
+            secondparts,secondapart = _SplitApart(second, firstparts)
+            apartparts = firstapart + secondapart
+        loads.append((operation, firstparts, secondparts, apartparts))
+    # group the operations that add the same parts to the clipper
+    groups = dict()
+    for operation,firstparts,secondparts,apartparts in loads:
+        key = (tuple(map(id, firstparts)), tuple(map(id, secondparts)))
+        groups.setdefault(key, (firstparts,secondparts,[]))[2].append((operation,apartparts))
+    results = dict()
+    for firstparts,secondparts,grouped in groups.values():
+        if not firstparts and not secondparts:
+            for operation,apartparts in grouped:
+                results[operation] = _Parts2Geom(apartparts)
+            continue
+        groupscale = scale
+        if groupscale is None:
+            groupscale = _ScaleFor(_CombinedBounds(firstparts + secondparts), tolerance)
+        main = _GetClipper()
+        try:
+            for part in firstparts:
+                part._addtoclipper(main, clipper.PolyType.Subject, groupscale)
+            for part in secondparts:
+                part._addtoclipper(main, clipper.PolyType.Clip, groupscale)
+            for operation,apartparts in grouped:
+                resulttree = clipper.PolyTree()
+                if not main.Execute2(txt2cliptype[operation], resulttree, clipper.PolyFillType.Positive, clipper.PolyFillType.Positive):
+                    results[operation] = None
+                    continue
+                geom = _ResultTree2Geom(resulttree, groupscale)
+                if apartparts:
+                    resultparts = _Parts(geom) if geom is not None else []
+                    geom = _Parts2Geom(resultparts + apartparts)
+                results[operation] = geom
+        finally:
+            main.Clear()
+    return results
 ##def _Dist(geom1, geom2, getclosestpoints=False, relativedist=False):
 ##    """
 ##    Used for measuring distances between geoms. 
@@ -262,9 +788,221 @@ def geoj2geom(shapeobj):
         geom = MultiPolygon(multipolylist)
     return geom
 
+def nearest(geom, candidates, k=1, max_distance=None):
+    """
+    Finds the k candidate geometries nearest to the main geometry. Rather than
+    measuring the exact distance to every candidate, the candidates are visited
+    best-first in order of the distance to their bounding boxes, which is a
+    lower bound for their real distance, so the search stops as soon as no
+    remaining candidate can beat the k closest found so far.
+
+    Returns a list of (candidate, result) tuples sorted from closest to
+    farthest, where result is the dictionary returned by the distance method,
+    always including the keywords "mindist", "closestpoint_self" and
+    "closestpoint_other".
+
+    | __options__ | __description__ 
+    | --- | --- 
+    | geom | the geometry to measure from, which must support the distance method (currently Point, MultiPoint, and LineString).
+    | candidates | a sequence of geometries to search.
+    | *k | how many of the nearest candidates to return. Default is 1.
+    | *max_distance | an optional maximum search distance, candidates farther away than this are never returned. Default is None, for no limit.
+    """
+    if k < 1: return []
+    geombox = geom.bounds
+    #queue up all candidates by their box distance, which is cheap since bounds are cached
+    queue = [(_BoxDist(geombox, candidate.bounds), index, candidate) for index,candidate in enumerate(candidates)]
+    heapq.heapify(queue)
+    #the best results so far are kept in a heap of negative distances, so the
+    #worst of them is always on top and is the one to beat
+    best = []
+    while queue:
+        boxdist,index,candidate = heapq.heappop(queue)
+        if max_distance is not None and boxdist > max_distance: break
+        if len(best) == k and boxdist >= -best[0][0]: break
+        result = geom.distance(candidate, getclosestpoints=True)
+        dist = result["mindist"]
+        if max_distance is not None and dist > max_distance: continue
+        if len(best) < k:
+            heapq.heappush(best, (-dist, -index, candidate, result))
+        elif dist < -best[0][0]:
+            heapq.heapreplace(best, (-dist, -index, candidate, result))
+    best.sort(reverse=True)
+    return [(candidate, _ClosestPoints(geom, candidate, result)) for negdist,negindex,candidate,result in best]
+
+def unary_union(geoms, tolerance=None):
+    """
+    Dissolves a sequence of Polygon and MultiPolygon geometries into a single
+    geometry, much faster than folding them together one union at a time.
+    The polygons are first sorted so that nearby ones end up next to each
+    other, and are then merged pairwise in a balanced tree, so that each
+    clipping operation only sees two results of similar size. Groups whose
+    bounding boxes don't overlap can't have anything to dissolve, so they
+    are simply combined without clipping. All the unions are clipped at
+    the same integer scale, chosen once from the envelope of all the input.
+
+    Returns a Polygon, a MultiPolygon, or None if there was nothing to dissolve.
+
+    | __options__ | __description__ 
+    | --- | --- 
+    | geoms | a sequence of Polygon and MultiPolygon geometries, or a single MultiPolygon.
+    | *tolerance | the smallest coordinate difference that the result must keep apart. Default is None, for the finest scale that the envelope allows.
+    """
+    if hasattr(geoms, "geom_type"): geoms = [geoms]
+    #explode into single polygons
+    polys = []
+    for geom in geoms:
+        if geom.geom_type == "Polygon": polys.append(geom)
+        elif geom.geom_type == "MultiPolygon": polys.extend(geom.geoms)
+        else: raise TypeError("Only Polygon and MultiPolygon geometries can be unioned")
+    if not polys: return None
+    #sort them in tiles of nearby polygons
+    boxes = array("d")
+    for poly in polys:
+        boxes.extend(poly.bounds)
+    order = _STRPack(boxes, range(len(polys)), 4)
+    polys = [polys[i] for i in order]
+    scale = _ScaleFor(_CombinedBounds(polys), tolerance)
+    polys = _UnionTree(polys, 0, len(polys), scale)[0]
+    return _Parts2Geom(polys)
+
+def cascaded_union(geoms):
+    """
+    Same as unary_union(), kept for those used to the older shapely name.
+    """
+    return unary_union(geoms)
+
+def _UnionTree(polys, start, end, scale):
+    """
+    Unions the polygons from start to end by splitting them in half, and
+    returns the list of resulting polygons along with their combined bbox.
+    """
+    if end - start == 1:
+        poly = polys[start]
+        return [poly],poly.bounds
+    middle = (start + end) // 2
+    polys1,bounds1 = _UnionTree(polys, start, middle, scale)
+    polys2,bounds2 = _UnionTree(polys, middle, end, scale)
+    xmin1,ymin1,xmax1,ymax1 = bounds1
+    xmin2,ymin2,xmax2,ymax2 = bounds2
+    bounds = [min(xmin1,xmin2), min(ymin1,ymin2), max(xmax1,xmax2), max(ymax1,ymax2)]
+    if xmax1 < xmin2 or xmax2 < xmin1 or ymax1 < ymin2 or ymax2 < ymin1:
+        #boxes are apart, so nothing to dissolve
+        return polys1 + polys2,bounds
+    result = _Clip(MultiPolygon(polys1), MultiPolygon(polys2), "union", scale=scale)
+    if result is None: return [],bounds
+    return _Parts(result),bounds
+
+def overlay_layers(layer1, layer2, how="union", tolerance=None):
+    """
+    Overlays two layers of Polygon and MultiPolygon features, and returns the
+    faces that they split eachother into, along with the features each face
+    came from. The features within each layer should not overlap eachother,
+    such as the units of an administrative map.
+
+    Returns a list of (geom,index1,index2) tuples, one for each combination
+    of features, where index1 and index2 are the positions of the features
+    in layer1 and layer2 that cover the face, or None for a face outside of
+    that layer.
+
+    The faces covered by both layers are clipped one pair of features at a
+    time, but only for the pairs whose bounding boxes overlap, as found with
+    an STRtree. The faces covered by only one layer are clipped one feature
+    at a time, as the feature minus all the candidate features of the other
+    layer at once. All of them are clipped at the same integer scale.
+
+    | __options__ | __description__ 
+    | --- | --- 
+    | layer1 | a sequence of Polygon and MultiPolygon features.
+    | layer2 | a sequence of Polygon and MultiPolygon features.
+    | *how | which faces to return, either "intersection" for those covered by both layers, "identity" for those covered by layer1, or "union" for all of them. Default is "union".
+    | *tolerance | the smallest coordinate difference that the result must keep apart. Default is None, for the finest scale that the envelope of both layers allows.
+    """
+    if how not in ("intersection","identity","union"):
+        raise ValueError("how must be either intersection, identity, or union")
+    layer1,layer2 = list(layer1),list(layer2)
+    if not layer1 and not layer2: return []
+    scale = _ScaleFor(_CombinedBounds(layer1 + layer2), tolerance)
+    faces = []
+    #faces covered by both layers
+    tree2 = STRtree(layer2)
+    for i,feature in enumerate(layer1):
+        for j in sorted(tree2.query_indexes(feature.bounds)):
+            face = _Clip(feature, layer2[j], "intersect", scale=scale)
+            if face is not None: faces.append((face,i,j))
+    #faces covered by only one of the layers
+    if how == "union": layers = [(layer1,tree2,False), (layer2,STRtree(layer1),True)]
+    elif how == "identity": layers = [(layer1,tree2,False)]
+    else: layers = []
+    for layer,othertree,reverse in layers:
+        for i,feature in enumerate(layer):
+            others = [part for j in othertree.query_indexes(feature.bounds) for part in _Parts(othertree.geoms[j])]
+            if others: face = _Clip(feature, _Parts2Geom(others), "difference", scale=scale)
+            else: face = feature
+            if face is None: continue
+            if reverse: faces.append((face,None,i))
+            else: faces.append((face,i,None))
+    return sorted(faces, key=lambda face: face[1:])
+
+def _ClosestPoints(geom, candidate, result):
+    """
+    Fills in the closest points that the measure functions leave out, such as
+    for points, which are their own closest point, or for points lying inside
+    a polygon, which are their own closest point on that polygon too.
+    """
+    if geom.geom_type == "Point":
+        result.setdefault("closestpoint_self", geom.coords[0])
+        if candidate.geom_type == "Point":
+            result.setdefault("closestpoint_other", candidate.coords[0])
+        elif result["mindist"] == 0:
+            result.setdefault("closestpoint_other", geom.coords[0])
+    result.setdefault("closestpoint_self", None)
+    result.setdefault("closestpoint_other", None)
+    return result
+
 #define geometry classes
-class Point:
+#NOTE: geometries are treated as immutable once created, which is what
+#allows their derived properties to be computed once and then cached.
+class CoordinateSequence(object):
+    """
+    A read-only list-like view of the xy coordinate tuples of a geometry.
+    Reads straight from the geometry's flat coordinate array, so no copy
+    of the vertices is made until they are actually asked for. 
+    """
+    __slots__ = ("_array",)
+    def __init__(self, flatcoords):
+        self._array = flatcoords
+    def __len__(self):
+        return len(self._array) // 2
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("coordinate index out of range")
+        flatcoords = self._array
+        return (flatcoords[index*2], flatcoords[index*2+1])
+    def __iter__(self):
+        flatcoords = self._array
+        xs = itertools.islice(flatcoords, 0, None, 2)
+        ys = itertools.islice(flatcoords, 1, None, 2)
+        return itertools.izip(xs, ys)
+    def __reversed__(self):
+        return iter(self[::-1])
+    def __eq__(self, other):
+        return list(self) == list(other)
+    def __ne__(self, other):
+        return not self == other
+    def __repr__(self):
+        return repr(list(self))
+
+class Point(object):
     #NOT FINISHED, LACKING SET THEORY METHODS
+    __slots__ = ("_array", "_scaled", "_bounds", "_geojson")
+    geom_type = "Point"
+    area = 0.0
+    length = 0.0
     def __init__(self, x, y):
         """
 
@@ -273,33 +1011,67 @@ class Point:
         | x/y | the x and y coordinates of the point. 
         """
         #NOTE: coords is an xy-tuple nested inside a list
-        self.geom_type = "Point"
-        #prep coords for clip analysis
-        coords = [(x,y)]
-        preppedcoords = _PrepCoords(coords)
+        flatcoords = array("d", (x,y))
         #then set properties
-        self.coords = coords
-        self._coords = preppedcoords
-        self.area = 0.0
-        self.length = 0.0
-        self.bounds = [x,y,x,y]
-        self.x = x
-        self.y = y
+        self._array = flatcoords
+        self._scaled = None
+        self._bounds = (flatcoords[0],flatcoords[1],flatcoords[0],flatcoords[1])
+        self._geojson = None
     ### Properties
     @property
+    def bounds(self):
+        return list(self._bounds)
+    @property
+    def coords(self):
+        return CoordinateSequence(self._array)
+    @property
+    def x(self):
+        return self._array[0]
+    @property
+    def y(self):
+        return self._array[1]
+    def _scaledcoords(self, scale):
+        #the integer-scaled clipper points are only made once a clip needs them,
+        #and kept for as long as the clips use the same scale
+        if self._scaled is None or self._scaled[0] != scale:
+            self._scaled = (scale, _PrepArray(self._array, scale=scale))
+        return self._scaled[1]
+    @property
     def __geo_interface__(self):
-        geojson = dict()
-        coords = self.coords
-        #set dict items
-        geojson["type"] = self.geom_type
-        geojson["coordinates"] = coords[0]
-        return geojson
+        if self._geojson is None:
+            geojson = dict()
+            coords = self.coords
+            #set dict items
+            geojson["type"] = self.geom_type
+            geojson["coordinates"] = coords[0]
+            self._geojson = geojson
+        return _CopyGeoJSON(self._geojson)
     ### Constructive methods
-    def buffer(self, buffersize, jointype="round", resolution=0.75):
-        # for points use the _DoRound(pt, limit) function from inside _OffsetInternal
+    def clip_by_rect(self, xmin, ymin, xmax, ymax):
+        """
+        Returns the point if it lies inside or on the edge of the rectangle,
+        otherwise None.
+        """
+        if _BoxWithin(self.bounds, xmin, ymin, xmax, ymax): return self
+    def buffer(self, buffersize, jointype="round", resolution=0.75, tolerance=None):
+        """
+        Returns a circle around the point as a Polygon, or None if the
+        buffersize is not above zero. The circle is scaled and moved from a
+        cached unit circle with just enough chords to keep to the tolerance.
+
+        | __options__ | __description__ 
+        | --- | --- 
+        | buffersize | the radius of the circle
+        | *jointype | only "round" is supported for points.
+        | *resolution | the degree of detail, with 0 meaning very coarse and 1.0 meaning very detailed. Default is 0.75. 
+        | *tolerance | the largest distance the circle's chords may stray from the true circle, which overrides the resolution. Default is None.
+        """
         if jointype == "round":
-            _point = _Point(self.x, self.y)
-            buffercoords = _point.getbuffer(buffersize, resolution=resolution)
+            if buffersize <= 0: return None
+            if tolerance is None: tolerance = _ArcTolerance(buffersize, resolution)
+            steps = clipper._ArcSteps(buffersize, tolerance)
+            x,y = self.x,self.y
+            buffercoords = [(x + buffersize*unitx, y + buffersize*unity) for unitx,unity in clipper._CircleTemplate(steps)]
             geom = Polygon(exterior=buffercoords)
         return geom
     ### Comparison methods
@@ -372,8 +1144,12 @@ class Point:
         img.drawgeojson(self, fillcolor=fillcolor, outlinecolor=outlinecolor)
         img.view()
 
-class MultiPoint:
+class MultiPoint(object):
     #NOT FINISHED
+    __slots__ = ("geoms", "_bounds", "_geojson")
+    geom_type = "MultiPoint"
+    area = 0.0
+    length = 0.0
     def __init__(self, points):
         """
 
@@ -381,42 +1157,86 @@ class MultiPoint:
         | --- | ---
         | points | a list of xy points.
         """
-        self.geom_type = "MultiPoint"
         #prep coords for clip analysis
         self.geoms = [Point(*point) for point in points]
-        self.area = 0.0
-        self.length = 0.0
+        self._bounds = None
+        self._geojson = None
     ### Properties
     @property
     def __geo_interface__(self):
-        geojson = dict()
-        coords = [geom.coords[0] for geom in self.geoms]
-        #set dict items
-        geojson["type"] = self.geom_type
-        geojson["coordinates"] = coords
-        return geojson
+        if self._geojson is None:
+            geojson = dict()
+            coords = [geom.coords[0] for geom in self.geoms]
+            #set dict items
+            geojson["type"] = self.geom_type
+            geojson["coordinates"] = coords
+            self._geojson = geojson
+        return _CopyGeoJSON(self._geojson)
     @property
     def bounds(self):
-        _x,_y = self.geoms[0].coords[0]
-        xmin,ymin,xmax,ymax = _x,_y,_x,_y
-        for geom in self.geoms:
-            _x,_y = geom.coords[0]
-            if _x < xmin: xmin = _x
-            if _y < ymin: ymin = _y
-            if _x > xmax: xmax = _x
-            if _y > ymax: ymax = _y
-        return [xmin,ymin,xmax,ymax]
+        if self._bounds is None:
+            _x,_y = self.geoms[0].coords[0]
+            xmin,ymin,xmax,ymax = _x,_y,_x,_y
+            for geom in self.geoms:
+                _x,_y = geom.coords[0]
+                if _x < xmin: xmin = _x
+                if _y < ymin: ymin = _y
+                if _x > xmax: xmax = _x
+                if _y > ymax: ymax = _y
+            self._bounds = (xmin,ymin,xmax,ymax)
+        return list(self._bounds)
     ### Constructive methods
-    def buffer(self, buffersize, jointype="round", resolution=0.75, dissolve=True):
-        # for points use the _DoRound(pt, limit) function from inside _OffsetInternal
-        if len(self.geoms) > 1:
-            newgeoms = (geom.buffer(buffersize, jointype=jointype, resolution=resolution) for geom in self.geoms)
-            multipolycoords = [(eachmulti.exterior.coords,[]) for eachmulti in newgeoms]
-            result = MultiPolygon(multipolycoords)
-        else: result = self.geoms[0].buffer(buffersize, resolution=resolution)
-        if dissolve:
-            result = result.union(result)
-        return result
+    def clip_by_rect(self, xmin, ymin, xmax, ymax):
+        """
+        Returns the points that lie inside or on the edge of the rectangle, as
+        a Point, a MultiPoint, or None if there were none.
+        """
+        points = [geom.coords[0] for geom in self.geoms if _BoxWithin(geom.bounds, xmin, ymin, xmax, ymax)]
+        if not points: return None
+        elif len(points) == 1: return Point(*points[0])
+        return MultiPoint(points)
+    def buffer(self, buffersize, jointype="round", resolution=0.75, dissolve=True, tolerance=None, processes=None):
+        """
+        Returns the circles around all the points, as a Polygon or a
+        MultiPolygon. When dissolving, the points are first grouped into
+        clusters whose circles could overlap, using a grid of the buffer
+        distance. Circles of isolated points are returned as they are, and
+        only the circles of each cluster are dissolved with each other.
+
+        | __options__ | __description__ 
+        | --- | --- 
+        | buffersize | the radius of the circles
+        | *jointype | only "round" is supported for points.
+        | *resolution | the degree of detail, with 0 meaning very coarse and 1.0 meaning very detailed. Default is 0.75. 
+        | *dissolve | a boolean for whether to dissolve/merge any overlapping circles. Default is True. 
+        | *tolerance | the largest distance the circles' chords may stray from the true circles, which overrides the resolution. Default is None.
+        | *processes | the number of worker processes to dissolve the clusters in, see parallel_overlay(). Default is None, for dissolving them in this process.
+        """
+        if buffersize <= 0: return None
+        if tolerance is None: tolerance = _ArcTolerance(buffersize, resolution)
+        if len(self.geoms) == 1 or not dissolve:
+            newgeoms = [geom.buffer(buffersize, jointype=jointype, tolerance=tolerance) for geom in self.geoms]
+            return _Parts2Geom(newgeoms)
+        #circles can only overlap if their points are within twice the buffersize
+        points = [(geom.x,geom.y) for geom in self.geoms]
+        clusters = _PointClusters(points, buffersize*2)
+        newgeoms = []
+        tasks = []
+        for cluster in clusters:
+            if len(cluster) == 1:
+                x,y = points[cluster[0]]
+                newgeoms.append(Point(x,y).buffer(buffersize, jointype=jointype, tolerance=tolerance))
+            elif processes is None:
+                circles = [Point(*points[index]).buffer(buffersize, jointype=jointype, tolerance=tolerance) for index in cluster]
+                newgeoms.extend(_Parts(unary_union(circles)))
+            else:
+                flatcoords = [xory for index in cluster for xory in points[index]]
+                tasks.append((flatcoords, buffersize, tolerance))
+        if tasks:
+            from parallel import _Map, _UnionCircles, _Unpack
+            for packed in _Map(_UnionCircles, tasks, processes):
+                newgeoms.extend(_Unpack(packed))
+        return _Parts2Geom(newgeoms)
     ### Comparison methods
     def distance(self, other, getclosestpoints=False):
         """
@@ -495,8 +1315,11 @@ class MultiPoint:
         img.drawgeojson(self, fillcolor=fillcolor, outlinecolor=outlinecolor)
         img.view()
         
-class LineString:
+class LineString(object):
     #NOT FINISHED, LACKING SET THEORY METHODS
+    __slots__ = ("_array", "_scaled", "_bounds", "_length", "_geojson")
+    geom_type = "LineString"
+    area = 0.0
     def __init__(self, coordinates):
         """
 
@@ -504,192 +1327,70 @@ class LineString:
         | --- | ---
         | coordinates | a coordinate list of each xy pair in a linestring. 
         """
-        self.geom_type = "LineString"
-        #prep coords for clip analysis
-        preppedcoords = _PrepCoords(coordinates)
-        floatcoords = _PrepCoords(coordinates, convertfloats=False)
+        flatcoords = _Coords2Array(coordinates)
         #get bounds
-        rectobj = clipper._GetBounds([floatcoords]) #must wrap in list bc _GetBounds takes a list of polygons
-        _bounds = [rectobj.left, rectobj.top, rectobj.right, rectobj.bottom]
+        _bounds = _ArrayBounds(flatcoords)
         #then set properties
-        self.coords = coordinates
-        self._coords = preppedcoords
-        self.area = 0.0
-        self.bounds = _bounds
+        self._array = flatcoords
+        self._scaled = None
+        self._bounds = _bounds
+        self._length = None
+        self._geojson = None
     ### Properties
     @property
+    def bounds(self):
+        return list(self._bounds)
+    @property
+    def coords(self):
+        return CoordinateSequence(self._array)
+    @property
     def __geo_interface__(self):
-        geojson = dict()
-        coords = self.coords
-        #set dict items
-        geojson["type"] = self.geom_type
-        geojson["coordinates"] = coords
-        return geojson
+        if self._geojson is None:
+            geojson = dict()
+            coords = list(self.coords)
+            #set dict items
+            geojson["type"] = self.geom_type
+            geojson["coordinates"] = coords
+            self._geojson = geojson
+        return _CopyGeoJSON(self._geojson)
     @property
     def length(self):
-        hypot = math.hypot
-        length = 0
-        for index in xrange(len(self.coords)-1):
-            x1,y1 = self.coords[index]
-            x2,y2 = self.coords[index+1]
-            xdiff = x2-x1
-            ydiff = y2-y1
-            #dotprod = x1*y2 + x2*y1
-            #_linelength = dotprod
-            _linelength = hypot(xdiff,ydiff)
-            length += _linelength
-        return length
+        if self._length is None:
+            self._length = _ArrayLength(self._array)
+        return self._length
+    def _scaledcoords(self, scale):
+        #the integer-scaled clipper points are only made once a clip needs them,
+        #and kept for as long as the clips use the same scale
+        if self._scaled is None or self._scaled[0] != scale:
+            self._scaled = (scale, _PrepArray(self._array, scale=scale))
+        return self._scaled[1]
     ### Constructive methods
+    def clip_by_rect(self, xmin, ymin, xmax, ymax):
+        """
+        Returns the parts of the line inside the rectangle, as a LineString,
+        a MultiLineString, or None if the line is outside it. Uses the
+        Liang-Barsky algorithm rather than the general polygon clipper.
+        """
+        if _BoxWithin(self.bounds, xmin, ymin, xmax, ymax): return self
+        if not _BoxesOverlap(self.bounds, (xmin,ymin,xmax,ymax)): return None
+        pieces = _ClipLineByRect(self._array, xmin, ymin, xmax, ymax)
+        if not pieces: return None
+        elif len(pieces) == 1: return LineString(pieces[0])
+        return MultiLineString(pieces)
     def buffer(self, buffersize, jointype="miter", endtype="project", resolution=0.75, dissolve=True):
         """
-        Note: Currently only "miter" is supported. Endtype does not yet have any effect.
-        """
-        def threewise(iterable):
-            a,_ = itertools.tee(iterable)
-            b,c = itertools.tee(_)
-            next(b, None)
-            next(c, None)
-            next(c, None)
-            return itertools.izip(a,b,c)
-        linepolygon_left = []
-        linepolygon_right = []
-        buffersize = buffersize/2.0
-        if len(self.coords) > 2:
-            #the first line
-            (x1,y1),(x2,y2),(x3,y3) = self.coords[:3]
-            line1 = _Line(x1,y1,x2,y2)
-            line2 = _Line(x2,y2,x3,y3)
-            leftline,rightline = line1.getbuffersides(linebuffer=buffersize)
-            leftlinestart = leftline.tolist()[0]
-            rightlinestart = rightline.tolist()[0]
-            linepolygon_left.append(leftlinestart)
-            linepolygon_right.append(rightlinestart)
-            #then all mid areas
-            if jointype == "miter":
-                #sharp join style
-                for start,mid,end in threewise(self.coords):
-                    (x1,y1),(x2,y2),(x3,y3) = start,mid,end
-                    line1 = _Line(x1,y1,x2,y2)
-                    line2 = _Line(x2,y2,x3,y3)
-                    line1_left,line1_right = line1.getbuffersides(linebuffer=buffersize)
-                    line2_left,line2_right = line2.getbuffersides(linebuffer=buffersize)
-                    midleft = line1_left.intersect(line2_left, infinite=True)
-                    midright = line1_right.intersect(line2_right, infinite=True)
-                    if not midleft or not midright:
-                        #PROB FLOAT ERROR,SO NO INTERSECTION FOUND
-                        #CURRENTLY JUST SKIP DRAWING,BUT NEED BETTER HANDLING
-                        print("WARNING, midpoint intersection not found")
-                        return
-                    #add coords
-                    linepolygon_left.append(midleft)
-                    linepolygon_right.append(midright)
-##            elif jointype == "round":
-##                #round
-##                #DOESNT WORK YET...
-##                for start,mid,end in threewise(self.coords):
-##                    (x1,y1),(x2,y2),(x3,y3) = start,mid,end
-##                    line1 = _Line(x1,y1,x2,y2)
-##                    line2 = _Line(x2,y2,x3,y3)
-##                    line1_left,line1_right = line1.getbuffersides(linebuffer=buffersize)
-##                    line2_left,line2_right = line2.getbuffersides(linebuffer=buffersize)
-##                    midleft = line1_left.intersect(line2_left, infinite=True)
-##                    midright = line1_right.intersect(line2_right, infinite=True)
-####                    if not midleft or not midright:
-####                        #PROB FLOAT ERROR,SO NO INTERSECTION FOUND
-####                        #CURRENTLY JUST SKIP DRAWING,BUT NEED BETTER HANDLING
-####                        print("WARNING, midpoint intersection not found")
-####                        return
-####                    #ARC approach
-####                    midx,midy = x2,y2
-####                    line1_rev = _Line(x2,y2,x1,y1) #reverse it so same origin point
-####                    #get inner and outer angles
-####                    innerangle = (line1_rev.getangle()+line2.getangle())/2.0
-####                    if innerangle > 180:
-####                        oppositeangle = innerangle-180
-####                    elif innerangle < 180: oppositeangle = innerangle+180
-####                    #then determine which side gets the curve
-####                    bwangle = line1.anglediff(line2)
-####                    if bwangle < 0:
-####                        rightcurve = _Arc(midx,midy,buffersize,facing=oppositeangle,opening=bwangle)
-####                        leftcurve = [midleft]
-####                    else:
-####                        rightcurve = [midright]
-####                        leftcurve = _Arc(midx,midy,buffersize,facing=oppositeangle,opening=bwangle)
-####                    #
-####                    #NEW BEZIER APPROACH
-####                    midx,midy = x2,y2
-####                    line1_rev = _Line(x2,y2,x1,y1) #reverse it so same origin point
-####                    #get inner and outer angles
-####                    innerangle = (line1_rev.getangle()+line2.getangle())/2.0
-####                    if innerangle > 180:
-####                        oppositeangle = innerangle-180
-####                    elif innerangle < 180: oppositeangle = innerangle+180
-####                    oppositeangle_rad = math.radians(oppositeangle)
-####                    #then find controlpoint in direction angle
-####                    if oppositeangle < 90:
-####                        outercurvecontrol = (midx+buffersize*math.cos(oppositeangle_rad),midy-buffersize*math.sin(oppositeangle_rad))
-####                    elif oppositeangle < 180:
-####                        outercurvecontrol = (midx-buffersize*math.cos(oppositeangle_rad),midy+buffersize*math.sin(oppositeangle_rad))
-####                    elif oppositeangle < 270:
-####                        outercurvecontrol = (midx-buffersize*math.cos(oppositeangle_rad),midy-buffersize*math.sin(oppositeangle_rad))
-####                    else:
-####                        outercurvecontrol = (midx+buffersize*math.cos(oppositeangle_rad),midy+buffersize*math.sin(oppositeangle_rad))
-####                    #then determine which side gets the curve
-####                    bwangle = line1.anglediff(line2)
-####                    if bwangle < 0:
-####                        rightcurve = _Bezier([line1_right.tolist()[1],outercurvecontrol,line2_right.tolist()[0]], intervals=int(round(resolution*buffersize*3))).coords
-####                        leftcurve = [midleft]
-####                    else:
-####                        rightcurve = [midright]
-####                        leftcurve = _Bezier([line1_left.tolist()[1],outercurvecontrol,line2_left.tolist()[0]], intervals=int(round(resolution*buffersize*3))).coords
-##                    #
-##                    #BEZIER approach
-##                    leftcurve = _Bezier([line1_left.tolist()[1],midleft,line2_left.tolist()[0]], intervals=int(round(resolution*buffersize*3))).coords
-##                    rightcurve = _Bezier([line1_right.tolist()[1],midright,line2_right.tolist()[0]], intervals=int(round(resolution*buffersize*3))).coords
-##                    #add coords
-##                    linepolygon_left.extend(leftcurve)
-##                    linepolygon_right.extend(rightcurve)
-##            elif jointype == "bevel":
-##                #flattened
-##                for start,mid,end in threewise(self.coords):
-##                    (x1,y1),(x2,y2),(x3,y3) = start,mid,end
-##                    line1 = _Line(x1,y1,x2,y2)
-##                    line2 = _Line(x2,y2,x3,y3)
-##                    line1_left,line1_right = line1.getbuffersides(linebuffer=buffersize)
-##                    line2_left,line2_right = line2.getbuffersides(linebuffer=buffersize)
-##                    midleft = line1_left.tolist()[1]
-##                    midright = line1_right.tolist()[1]
-##                    if not midleft or not midright:
-##                        #PROB FLOAT ERROR,SO NO INTERSECTION FOUND
-##                        #CURRENTLY JUST SKIP DRAWING,BUT NEED BETTER HANDLING
-##                        print("WARNING, midpoint intersection not found")
-##                        return
-##                    #add coords
-##                    linepolygon_left.extend([line1_left.tolist()[1],line2_left.tolist()[0]])
-##                    linepolygon_right.extend([line1_right.tolist()[1],line2_right.tolist()[0]])
-                    
-            #finally add last line coords
-            (x1,y1),(x2,y2) = self.coords[-2:]
-            lastline = _Line(x1,y1,x2,y2)
-            leftline,rightline = lastline.getbuffersides(linebuffer=buffersize)
-            leftlinestop = leftline.tolist()[1]
-            rightlinestop = rightline.tolist()[1]
-            linepolygon_left.append(leftlinestop)
-            linepolygon_right.append(rightlinestop)
-        else:
-            #only a single line segment, so no joins necessary
-            (x1,y1),(x2,y2) = self.coords[:2]
-            line1 = _Line(x1,y1,x2,y2)
-            leftline,rightline = line1.getbuffersides(linebuffer=buffersize)
-            linepolygon_left = leftline.tolist()
-            linepolygon_right = rightline.tolist()
-        linepolygon = []
-        linepolygon.extend(linepolygon_left)
-        linepolygon.extend(list(reversed(linepolygon_right)))
-        geom = Polygon(exterior=linepolygon)
-        if dissolve:
-            geom = geom.union(geom)
-        return geom
+        Returns the corridor polygon around the line, made in one pass of the
+        clipper offset engine.
+
+        | __options__ | __description__ 
+        | --- | --- 
+        | buffersize | the total width of the corridor, ie twice the distance from the line.
+        | *jointype | how to join the line segments, either "miter", "round", or "bevel"/"square". Default is "miter".
+        | *endtype | how to cap the line ends, either "project"/"square", "round", or "flat"/"butt". Default is "project".
+        | *resolution | the degree of detail of round joins and caps, with 0 meaning very coarse and 1.0 meaning very detailed. Default is 0.75. 
+        | *dissolve | has no effect for a single line, which is always dissolved. 
+        """
+        return _BufferLines([self._array], self.bounds, buffersize, jointype, endtype, resolution)
     ### Comparison methods
     def distance(self, other, getclosestpoints=False):
         """
@@ -712,7 +1413,7 @@ class LineString:
         elif othertype == "LineString":
             minresult = measure.dist_lines2lines(self.coords, other.coords, getclosestpoints=getclosestpoints)
         elif othertype == "MultiLineString":
-            multilist = [geom.coords[0] for geom in other.geoms]
+            multilist = [geom.coords for geom in other.geoms]
             minresult = measure.dist_lines2multilines(self.coords, multilist, getclosestpoints=getclosestpoints)
         elif othertype == "Polygon":
             polyandholes = [ other.exterior.coords ]
@@ -725,6 +1426,7 @@ class LineString:
                 if geom.interiors: polyandholes.extend([hole.coords for hole in geom.interiors])
                 allpolys.append(polyandholes)
             minresult = measure.dist_lines2multipoly(self.coords, allpolys, getclosestpoints=getclosestpoints)
+        return minresult
     ### Other
     def view(self, imagesize=None, crs=None, tickunit="default", fillcolor=(111,111,111), outlinecolor=(0,0,0)):
         """
@@ -763,8 +1465,11 @@ class LineString:
         img.drawgeojson(self, fillcolor=fillcolor, outlinecolor=outlinecolor)
         img.view()
 
-class MultiLineString:
+class MultiLineString(object):
     #NOT FINISHED, LACKING SET THEORY METHODS
+    __slots__ = ("geoms", "_length", "_bounds", "_geojson")
+    geom_type = "MultiLineString"
+    area = 0.0
     def __init__(self, lines):
         """
 
@@ -772,55 +1477,80 @@ class MultiLineString:
         | --- | ---
         | lines | a list of line coordinate lists, one for each linestring. 
         """
-        self.geom_type = "MultiLineString"
         geoms = []
         for line in lines:
             geoms.append( LineString(line) )
         self.geoms = geoms
+        self._length = None
+        self._bounds = None
+        self._geojson = None
     ### Properties
     @property
     def __geo_interface__(self):
-        geojson = dict()
-        coords = []
-        for geom in self.geoms:
-            eachmulticoords = geom.coords
-            coords.append(eachmulticoords)
-        #set dict items
-        geojson["type"] = self.geom_type
-        geojson["coordinates"] = coords
-        return geojson
-    @property
-    def area(self):
-        sumarea = 0
-        for geom in self.geoms:
-            sumarea += geom.area
-        return sumarea
+        if self._geojson is None:
+            geojson = dict()
+            coords = []
+            for geom in self.geoms:
+                eachmulticoords = list(geom.coords)
+                coords.append(eachmulticoords)
+            #set dict items
+            geojson["type"] = self.geom_type
+            geojson["coordinates"] = coords
+            self._geojson = geojson
+        return _CopyGeoJSON(self._geojson)
     @property
     def length(self):
-        length = 0
-        for geom in self.geoms:
-            length += geom.length
-        return length
+        if self._length is None:
+            length = 0
+            for geom in self.geoms:
+                length += geom.length
+            self._length = length
+        return self._length
     @property
     def bounds(self):
-        xmin,ymin,xmax,ymax = self.geoms[0].bounds
-        for geom in self.geoms:
-            _xmin,_ymin,_xmax,_ymax = geom.bounds
-            if _xmin < xmin: xmin = _xmin
-            if _ymin < ymin: ymin = _ymin
-            if _xmax > xmax: xmax = _xmax
-            if _ymax > ymax: ymax = _ymax
-        return [xmin,ymin,xmax,ymax]
+        if self._bounds is None:
+            xmin,ymin,xmax,ymax = self.geoms[0].bounds
+            for geom in self.geoms:
+                _xmin,_ymin,_xmax,_ymax = geom.bounds
+                if _xmin < xmin: xmin = _xmin
+                if _ymin < ymin: ymin = _ymin
+                if _xmax > xmax: xmax = _xmax
+                if _ymax > ymax: ymax = _ymax
+            self._bounds = (xmin,ymin,xmax,ymax)
+        return list(self._bounds)
     ### Constructive methods
+    def clip_by_rect(self, xmin, ymin, xmax, ymax):
+        """
+        Returns the parts of the lines inside the rectangle, as a LineString,
+        a MultiLineString, or None if all lines are outside it.
+        """
+        if _BoxWithin(self.bounds, xmin, ymin, xmax, ymax): return self
+        pieces = []
+        for geom in self.geoms:
+            pieces.extend(_ClipLineByRect(geom._array, xmin, ymin, xmax, ymax))
+        if not pieces: return None
+        elif len(pieces) == 1: return LineString(pieces[0])
+        return MultiLineString(pieces)
     def buffer(self, buffersize, jointype="miter", endtype="project", resolution=0.75, dissolve=True):
-        if len(self.geoms) > 1:
-            newgeoms = (geom.buffer(buffersize, jointype=jointype, resolution=resolution, dissolve=dissolve) for geom in self.geoms)
-            multipolycoords = [(eachmulti.exterior.coords,[hole.coords for hole in eachmulti.interiors]) for eachmulti in newgeoms]
-            result = MultiPolygon(multipolycoords)
-        else: result = self.geoms[0].buffer(buffersize, jointype=jointype, resolution=resolution, dissolve=dissolve)
+        """
+        Returns the corridor polygons around the lines. All the lines are
+        offset and dissolved together in one pass of the clipper offset engine.
+
+        | __options__ | __description__ 
+        | --- | --- 
+        | buffersize | the total width of the corridors, ie twice the distance from the lines.
+        | *jointype | how to join the line segments, either "miter", "round", or "bevel"/"square". Default is "miter".
+        | *endtype | how to cap the line ends, either "project"/"square", "round", or "flat"/"butt". Default is "project".
+        | *resolution | the degree of detail of round joins and caps, with 0 meaning very coarse and 1.0 meaning very detailed. Default is 0.75. 
+        | *dissolve | a boolean for whether to dissolve/merge the corridors of different lines where they overlap. Default is True. 
+        """
         if dissolve:
-            result = result.union(result)
-        return result
+            return _BufferLines([geom._array for geom in self.geoms], self.bounds, buffersize, jointype, endtype, resolution)
+        polys = []
+        for geom in self.geoms:
+            result = geom.buffer(buffersize, jointype=jointype, endtype=endtype, resolution=resolution)
+            if result: polys.extend(_Parts(result))
+        return _Parts2Geom(polys)
     ### Other
     def view(self, imagesize=None, crs=None, tickunit="default", fillcolor=(111,111,111), outlinecolor=(0,0,0)):
         """
@@ -859,7 +1589,9 @@ class MultiLineString:
         img.drawgeojson(self, fillcolor=fillcolor, outlinecolor=outlinecolor)
         img.view()
         
-class LinearRing:
+class LinearRing(object):
+    __slots__ = ("_array", "_scaled", "area", "_bounds", "_length")
+    geom_type = "LinearRing"
     def __init__(self, coordinates, counterclockwise=False):
         """
         Not really of interest, mostly just a helper for polygons.
@@ -868,51 +1600,51 @@ class LinearRing:
         By default coords are forced to go in a clockwise direction
         If counterclockwise is set to True, then it will be forced counterclockwise, which is used for holes, ie interior rings
         """
-        self.geom_type = "LinearRing"
+        flatcoords = _Coords2Array(coordinates)
         #check that ring is closed
-        if coordinates[0] != coordinates[-1]:
-            coordinates.append(coordinates[0])
-        #prep coords for clip analysis
-        preppedcoords = _PrepCoords(coordinates)
+        if flatcoords[0:2] != flatcoords[-2:]:
+            flatcoords = flatcoords + flatcoords[0:2]
         #get area bc needed to get direction/orientation anyway
-        floatcoords = _PrepCoords(coordinates, convertfloats=False)
-        _area = clipper.Area(floatcoords)
+        _area = _ArrayArea(flatcoords)
         is_clockwise = _area > 0.0
         #get bounds
-        rectobj = clipper._GetBounds([floatcoords]) #must wrap in list bc _GetBounds takes a list of polygons
-        _bounds = [rectobj.left, rectobj.top, rectobj.right, rectobj.bottom]
+        _bounds = _ArrayBounds(flatcoords)
         #then test correct orientation for exterior/interior
         if counterclockwise:
             if is_clockwise:
-                coordinates = list(reversed(coordinates))
-                preppedcoords = list(reversed(preppedcoords))
+                flatcoords = _ReverseArray(flatcoords)
                 _area *= -1
         else:
             if not is_clockwise:
-                coordinates = list(reversed(coordinates))
-                preppedcoords = list(reversed(preppedcoords))
+                flatcoords = _ReverseArray(flatcoords)
                 _area *= -1
         #then set properties
-        self.coords = coordinates
-        self._coords = preppedcoords
+        self._array = flatcoords
+        self._scaled = None
         self.area = _area
-        self.bounds = _bounds
+        self._bounds = _bounds
+        self._length = None
+    @property
+    def bounds(self):
+        return list(self._bounds)
+    @property
+    def coords(self):
+        return CoordinateSequence(self._array)
     @property
     def length(self):
-        hypot = math.hypot
-        length = 0
-        for index in xrange(len(self.coords)-1):
-            x1,y1 = self.coords[index]
-            x2,y2 = self.coords[index+1]
-            xdiff = x2-x1
-            ydiff = y2-y1
-            #dotprod = x1*y2 + x2*y1
-            #_linelength = dotprod
-            _linelength = hypot(xdiff,ydiff)
-            length += _linelength
-        return length
+        if self._length is None:
+            self._length = _ArrayLength(self._array)
+        return self._length
+    def _scaledcoords(self, scale):
+        #the integer-scaled clipper points are only made once a clip needs them,
+        #and kept for as long as the clips use the same scale
+        if self._scaled is None or self._scaled[0] != scale:
+            self._scaled = (scale, _PrepArray(self._array, scale=scale))
+        return self._scaled[1]
 
-class Polygon:
+class Polygon(object):
+    __slots__ = ("exterior", "interiors", "_area", "_length", "_geojson")
+    geom_type = "Polygon"
     def __init__(self, exterior, interiors=[]):
         """
 
@@ -921,33 +1653,41 @@ class Polygon:
         | exterior | a single list of the polygon's outer coordinates
         | *interiors | an optional list of several hole coordinate lists (one for each hole)
         """
-        self.geom_type = "Polygon"
         self.exterior = LinearRing(exterior)
         self.interiors = [LinearRing(hole, counterclockwise=True) for hole in interiors]
+        self._area = None
+        self._length = None
+        self._geojson = None
     ### Properties
     @property
     def __geo_interface__(self):
-        geojson = dict()
-        coords = [self.exterior.coords]
-        _holes = [hole.coords for hole in self.interiors]
-        if _holes:
-            coords.extend(_holes)
-        #set dict items
-        geojson["type"] = self.geom_type
-        geojson["coordinates"] = coords
-        return geojson
+        if self._geojson is None:
+            geojson = dict()
+            coords = [list(self.exterior.coords)]
+            _holes = [list(hole.coords) for hole in self.interiors]
+            if _holes:
+                coords.extend(_holes)
+            #set dict items
+            geojson["type"] = self.geom_type
+            geojson["coordinates"] = coords
+            self._geojson = geojson
+        return _CopyGeoJSON(self._geojson)
     @property
     def area(self):
-        sumarea = self.exterior.area
-        for hole in self.interiors:
-            sumarea += hole.area #hole areas are negative so will decrease the total area
-        return sumarea
+        if self._area is None:
+            sumarea = self.exterior.area
+            for hole in self.interiors:
+                sumarea += hole.area #hole areas are negative so will decrease the total area
+            self._area = sumarea
+        return self._area
     @property
     def length(self):
-        length = self.exterior.length
-        for hole in self.interiors:
-            length += hole.length #hole areas give more edges to the polygon so should increase the total length
-        return length
+        if self._length is None:
+            length = self.exterior.length
+            for hole in self.interiors:
+                length += hole.length #hole areas give more edges to the polygon so should increase the total length
+            self._length = length
+        return self._length
     @property
     def bounds(self):
         return self.exterior.bounds
@@ -966,46 +1706,64 @@ class Polygon:
         #same as contains, but reverse the two polygons
         pass
     ### Constructive methods
+    def clip_by_rect(self, xmin, ymin, xmax, ymax):
+        """
+        Crops the polygon to a rectangle, returning a Polygon, a MultiPolygon
+        where the polygon leaves and re-enters the rectangle, or None if the
+        polygon is outside it. The rings are cut along each rectangle side in
+        turn, and the pieces joined up along it, which is much faster than
+        intersecting with a rectangle polygon, making it well suited for
+        tiling and cropping to a view extent.
+        """
+        if _BoxWithin(self.bounds, xmin, ymin, xmax, ymax): return self
+        if not _BoxesOverlap(self.bounds, (xmin,ymin,xmax,ymax)): return None
+        _xmin,_ymin,_xmax,_ymax = self.bounds
+        rings = [list(self.exterior.coords)] + [list(hole.coords) for hole in self.interiors]
+        #each side is the axis it bounds, the bound, and which side of it is inside,
+        #skipping those that don't cut through the polygon
+        for axis,bound,sign,cuts in ((0,xmin,1,xmin > _xmin), (0,xmax,-1,xmax < _xmax),
+                                     (1,ymin,1,ymin > _ymin), (1,ymax,-1,ymax < _ymax)):
+            if not cuts: continue
+            rings = _CutRings(rings, axis, bound, sign)
+            if rings is None:
+                #the crossings didn't pair up, so intersect the slow way
+                box = Polygon([(xmin,ymin),(xmin,ymax),(xmax,ymax),(xmax,ymin)])
+                return self.intersect(box)
+        #nothing is left if the rectangle was entirely inside a hole
+        return _Parts2Geom(_Rings2Polygons(rings))
     def buffer(self, buffersize, jointype="miter", resolution=0.75):
-        jointypes = dict([("bevel",clipper.JoinType.Square),
-                          ("round",clipper.JoinType.Round),
-                          ("miter",clipper.JoinType.Miter)])
-        jointype = jointypes[jointype]
-        #prep coords
-        allpolys = [_PrepCoords(self.exterior.coords, convertfloats=False)]
-        _holes = [_PrepCoords(hole.coords, convertfloats=False) for hole in self.interiors]
-        if _holes:
-            allpolys.extend(_holes)
-        #execute buffer
-        resulttree = clipper.OffsetPolygons(allpolys, buffersize, jointype=jointype)
-        #finally create and return geom
-        geom = _ResultTree2Geom(resulttree)
-        return geom
+        return _BufferPolygons([self], self.bounds, buffersize, jointype, resolution)
     def clean(self):
         pass
     def simplify(self):
         pass
     ### Set theory methods
-    def intersect(self, other):
+    def intersect(self, other, tolerance=None, processes=None):
         subjpolys = self
         clippolys = other
-        result = _Clip(subjpolys, clippolys, "intersect")
+        result = _Clip(subjpolys, clippolys, "intersect", tolerance, processes=processes)
         return result
-    def union(self, other):
+    def union(self, other, tolerance=None, processes=None):
         subjpolys = self
         clippolys = other
-        result = _Clip(subjpolys, clippolys, "union")
+        result = _Clip(subjpolys, clippolys, "union", tolerance, processes=processes)
         return result
-    def difference(self, other):
+    def difference(self, other, tolerance=None, processes=None):
         subjpolys = self
         clippolys = other
-        result = _Clip(subjpolys, clippolys, "difference")
+        result = _Clip(subjpolys, clippolys, "difference", tolerance, processes=processes)
         return result
-    def symmetric_difference(self, other):
+    def symmetric_difference(self, other, tolerance=None, processes=None):
         subjpolys = self
         clippolys = other
-        result = _Clip(subjpolys, clippolys, "exclusive_or")
+        result = _Clip(subjpolys, clippolys, "exclusive_or", tolerance, processes=processes)
         return result
+    def overlay(self, other, operations=("intersect","difference","reverse_difference"), tolerance=None):
+        return _Overlay(self, other, operations, tolerance)
+    def difference_all(self, others, tolerance=None):
+        return _ClipMany(self, others, "difference", tolerance)
+    def intersect_any(self, others, tolerance=None):
+        return _ClipMany(self, others, "intersect", tolerance)
     ### Other
     def view(self, imagesize=None, crs=None, tickunit="default", fillcolor=(111,111,111), outlinecolor=(0,0,0)):
         """
@@ -1044,77 +1802,101 @@ class Polygon:
         img.drawgeojson(self, fillcolor=fillcolor, outlinecolor=outlinecolor)
         img.view()
     ### Internal use only
-    def _addtoclipper(self, clipperobj, addtype):
-        preppedcoords = [self.exterior._coords]
-        preppedcoords.extend([hole._coords for hole in self.interiors])
+    def _addtoclipper(self, clipperobj, addtype, scale):
+        preppedcoords = [self.exterior._scaledcoords(scale)]
+        preppedcoords.extend([hole._scaledcoords(scale) for hole in self.interiors])
         for outer_or_hole in preppedcoords:
             clipperobj.AddPolygon(outer_or_hole, addtype)
 
-class MultiPolygon:
+class MultiPolygon(object):
+    __slots__ = ("geoms", "_area", "_length", "_bounds", "_geojson")
+    geom_type = "MultiPolygon"
     def __init__(self, polygons):
         """
 
         | __options__ | __description__ 
         | --- | --- 
-        | polygons | a sequence of polygon type lists, each with one exterior list followed by one list of multiple hole-lists
+        | polygons | a sequence of polygon type lists, each with one exterior list followed by one list of multiple hole-lists, or of already made Polygon geometries
           example: MultiPolygon([ (exterior1, [hole1_1,hole1_2]), (exterior2, [hole2_1,hole2_2]) ])
         """
-        self.geom_type = "MultiPolygon"
         geoms = []
         for polygon in polygons:
+            if isinstance(polygon, Polygon):
+                geoms.append( polygon )
+                continue
             exterior, holes = polygon
             geoms.append( Polygon(exterior, holes) )
         self.geoms = geoms
+        self._area = None
+        self._length = None
+        self._bounds = None
+        self._geojson = None
     ### Properties
     @property
     def __geo_interface__(self):
         """
         Returns the geojson dictionary representation of the geometry.
         """
-        geojson = dict()
-        coords = []
-        for geom in self.geoms:
-            eachmulticoords = [geom.exterior.coords]
-            _holes = [hole.coords for hole in geom.interiors]
-            if _holes:
-                eachmulticoords.extend(_holes)
-            coords.append(eachmulticoords)
-        #set dict items
-        geojson["type"] = self.geom_type
-        geojson["coordinates"] = coords
-        return geojson
+        if self._geojson is None:
+            geojson = dict()
+            coords = []
+            for geom in self.geoms:
+                eachmulticoords = [list(geom.exterior.coords)]
+                _holes = [list(hole.coords) for hole in geom.interiors]
+                if _holes:
+                    eachmulticoords.extend(_holes)
+                coords.append(eachmulticoords)
+            #set dict items
+            geojson["type"] = self.geom_type
+            geojson["coordinates"] = coords
+            self._geojson = geojson
+        return _CopyGeoJSON(self._geojson)
     @property
     def area(self):
         """
         Returns the area of the geometry.
         """
-        sumarea = 0
-        for geom in self.geoms:
-            sumarea += geom.area
-        return sumarea
+        if self._area is None:
+            sumarea = 0
+            for geom in self.geoms:
+                sumarea += geom.area
+            self._area = sumarea
+        return self._area
     @property
     def length(self):
         """
         Returns the length of the outline of the geometry.
         """
-        length = 0
-        for geom in self.geoms:
-            length += geom.length
-        return length
+        if self._length is None:
+            length = 0
+            for geom in self.geoms:
+                length += geom.length
+            self._length = length
+        return self._length
     @property
     def bounds(self):
         """
         Returns the bounding box of the geometry, given as a four-list [xmin,ymin,xmax,ymax]
         """
-        xmin,ymin,xmax,ymax = self.geoms[0].exterior.bounds
-        for geom in self.geoms:
-            _xmin,_ymin,_xmax,_ymax = geom.exterior.bounds
-            if _xmin < xmin: xmin = _xmin
-            if _ymin < ymin: ymin = _ymin
-            if _xmax > xmax: xmax = _xmax
-            if _ymax > ymax: ymax = _ymax
-        return [xmin,ymin,xmax,ymax]
+        if self._bounds is None:
+            xmin,ymin,xmax,ymax = self.geoms[0].exterior.bounds
+            for geom in self.geoms:
+                _xmin,_ymin,_xmax,_ymax = geom.exterior.bounds
+                if _xmin < xmin: xmin = _xmin
+                if _ymin < ymin: ymin = _ymin
+                if _xmax > xmax: xmax = _xmax
+                if _ymax > ymax: ymax = _ymax
+            self._bounds = (xmin,ymin,xmax,ymax)
+        return list(self._bounds)
     ### Constructive methods
+    def clip_by_rect(self, xmin, ymin, xmax, ymax):
+        """
+        Crops each polygon to a rectangle as with Polygon.clip_by_rect, and
+        returns a Polygon, a MultiPolygon, or None if all are outside it.
+        """
+        if _BoxWithin(self.bounds, xmin, ymin, xmax, ymax): return self
+        polys = [geom.clip_by_rect(xmin, ymin, xmax, ymax) for geom in self.geoms]
+        return _Parts2Geom([part for poly in polys if poly is not None for part in _Parts(poly)])
     def buffer(self, buffersize, jointype="miter", resolution=0.75, dissolve=True):
         """
         Buffers or offsets the geometry by the given buffersize, returning a new geometry.
@@ -1126,26 +1908,32 @@ class MultiPolygon:
         | *resolution | the degree of detail when using the "round" jointype, with 0 meaning very coarse and 1.0 meaning very detailed. Default is 0.75. 
         | *dissolve | a boolean for whether to dissolve/merge any overlapping shapes resulting from the buffer operation. Default is True. 
         """
-        if len(self.geoms) > 1:
-            newgeoms = (geom.buffer(buffersize, jointype=jointype, resolution=resolution) for geom in self.geoms)
-            multipolycoords = [(eachmulti.exterior.coords,[hole.coords for hole in eachmulti.interiors]) for eachmulti in newgeoms]
-            result = MultiPolygon(multipolycoords)
-        else: result = self.geoms[0].buffer(buffersize, jointype=jointype, resolution=resolution)
         if dissolve:
-            result = result.union(result)
-        return result
+            #all parts are offset together, and overlaps are resolved in the same union
+            return _BufferPolygons(self.geoms, self.bounds, buffersize, jointype, resolution)
+        polys = []
+        for geom in self.geoms:
+            result = geom.buffer(buffersize, jointype=jointype, resolution=resolution)
+            if result: polys.extend(_Parts(result))
+        return _Parts2Geom(polys)
     ### Set theory methods
-    def intersect(self, other):
+    def intersect(self, other, tolerance=None, processes=None):
         """
         Highlights those areas where geometries overlap eachother.
 
         Note: Currently only works for Polygons and MultiPolygons.
+
+        | __options__ | __description__ 
+        | --- | --- 
+        | other | the Polygon or MultiPolygon to compare with.
+        | *tolerance | the smallest coordinate difference that the result must keep apart, which decides the integer scale coordinates are clipped at. Default is None, for the finest scale that the envelope of both geometries allows.
+        | *processes | the number of worker processes to clip with, for very large geometries. Both are cut into tiles that are clipped in parallel and then stitched back together, see parallel_overlay(). Default is None, for clipping in one go.
         """
         subjpolys = self
         clippolys = other
-        result = _Clip(subjpolys, clippolys, "intersect")
+        result = _Clip(subjpolys, clippolys, "intersect", tolerance, processes=processes)
         return result
-    def union(self, other):
+    def union(self, other, tolerance=None, processes=None):
         """
         Combines all geometries into one big one. All shapes must be of the
         same general type and cannot be crossed with eachother, so only Point
@@ -1153,27 +1941,84 @@ class MultiPolygon:
         MultiPolygon. 
         
         Note: Currently only works for Polygons and MultiPolygons.
+
+        | __options__ | __description__ 
+        | --- | --- 
+        | other | the Polygon or MultiPolygon to compare with.
+        | *tolerance | the smallest coordinate difference that the result must keep apart, which decides the integer scale coordinates are clipped at. Default is None, for the finest scale that the envelope of both geometries allows.
+        | *processes | the number of worker processes to clip with, for very large geometries. Both are cut into tiles that are clipped in parallel and then stitched back together, see parallel_overlay(). Default is None, for clipping in one go.
         """
         subjpolys = self
         clippolys = other
-        result = _Clip(subjpolys, clippolys, "union")
+        result = _Clip(subjpolys, clippolys, "union", tolerance, processes=processes)
         return result
-    def difference(self, other):
+    def difference(self, other, tolerance=None, processes=None):
         """
         Shows how the calling geometry is different from another one.
+
+        | __options__ | __description__ 
+        | --- | --- 
+        | other | the Polygon or MultiPolygon to compare with.
+        | *tolerance | the smallest coordinate difference that the result must keep apart, which decides the integer scale coordinates are clipped at. Default is None, for the finest scale that the envelope of both geometries allows.
+        | *processes | the number of worker processes to clip with, for very large geometries. Both are cut into tiles that are clipped in parallel and then stitched back together, see parallel_overlay(). Default is None, for clipping in one go.
         """
         subjpolys = self
         clippolys = other
-        result = _Clip(subjpolys, clippolys, "difference")
+        result = _Clip(subjpolys, clippolys, "difference", tolerance, processes=processes)
         return result
-    def symmetric_difference(self, other):
+    def symmetric_difference(self, other, tolerance=None, processes=None):
         """
         Returns parts of two geometries that are unique to any of them. 
+
+        | __options__ | __description__ 
+        | --- | --- 
+        | other | the Polygon or MultiPolygon to compare with.
+        | *tolerance | the smallest coordinate difference that the result must keep apart, which decides the integer scale coordinates are clipped at. Default is None, for the finest scale that the envelope of both geometries allows.
+        | *processes | the number of worker processes to clip with, for very large geometries. Both are cut into tiles that are clipped in parallel and then stitched back together, see parallel_overlay(). Default is None, for clipping in one go.
         """
         subjpolys = self
         clippolys = other
-        result = _Clip(subjpolys, clippolys, "exclusive_or")
+        result = _Clip(subjpolys, clippolys, "exclusive_or", tolerance, processes=processes)
         return result
+    def overlay(self, other, operations=("intersect","difference","reverse_difference"), tolerance=None):
+        """
+        Runs several set operations between the calling geometry and another
+        one, returning a dictionary with the resulting geometry (or None) of
+        each operation, identical to calling each method on its own. This
+        batches the operations rather than running them in a single sweep:
+        each one is still clipped separately, but operations that need the
+        same parts, such as union and exclusive_or, share their preparation.
+
+        | __options__ | __description__ 
+        | --- | --- 
+        | other | the Polygon or MultiPolygon to compare with.
+        | *operations | a sequence of the operations to run, any of "intersect", "union", "difference", "reverse_difference" (the other geometry minus the calling one), and "exclusive_or". Default is intersect, difference, and reverse_difference.
+        | *tolerance | the smallest coordinate difference that the result must keep apart, which decides the integer scale coordinates are clipped at. Default is None, for the finest scale that the envelope of both geometries allows.
+        """
+        return _Overlay(self, other, operations, tolerance)
+    def difference_all(self, others, tolerance=None):
+        """
+        Removes many geometries from the calling geometry at once, which is
+        much faster than calling difference() with each of them in turn,
+        since the clipper only sweeps the calling geometry once.
+
+        | __options__ | __description__ 
+        | --- | --- 
+        | others | a sequence of Polygons and MultiPolygons to remove.
+        | *tolerance | the smallest coordinate difference that the result must keep apart, which decides the integer scale coordinates are clipped at. Default is None, for the finest scale that the envelope of all the geometries allows.
+        """
+        return _ClipMany(self, others, "difference", tolerance)
+    def intersect_any(self, others, tolerance=None):
+        """
+        Returns the areas of the calling geometry that overlap any of many
+        other geometries, in a single sweep of the clipper.
+
+        | __options__ | __description__ 
+        | --- | --- 
+        | others | a sequence of Polygons and MultiPolygons to compare with.
+        | *tolerance | the smallest coordinate difference that the result must keep apart, which decides the integer scale coordinates are clipped at. Default is None, for the finest scale that the envelope of all the geometries allows.
+        """
+        return _ClipMany(self, others, "intersect", tolerance)
     ### Other
     def view(self, imagesize=None, crs=None, tickunit="default", fillcolor=(111,111,111), outlinecolor=(0,0,0)):
         """
@@ -1212,9 +2057,9 @@ class MultiPolygon:
         img.drawgeojson(self, fillcolor=fillcolor, outlinecolor=outlinecolor)
         img.view()
     ### Internal use only
-    def _addtoclipper(self, clipperobj, addtype):
+    def _addtoclipper(self, clipperobj, addtype, scale):
         for eachmulti in self.geoms:
-            eachmulti._addtoclipper(clipperobj, addtype)
+            eachmulti._addtoclipper(clipperobj, addtype, scale)
 
 if __name__ == "__main__":
     import shapy
@@ -0,0 +1,257 @@
+#Tiled overlays of large polygons, clipped in parallel worker processes
+
+#import stuff
+import math, bisect, multiprocessing
+from geometry import Point, Polygon, CoordinateSequence, unary_union
+from geometry import _Clip, _UnionTree, _Parts, _Parts2Geom, _ScaleFor, _CombinedBounds
+from geometry import _CutRings, _Rings2Polygons
+
+#helper functions
+def _Pack(polys):
+    """
+    Packs polygons as plain (exterior, holes) tuples of flat coordinate
+    arrays, which are much cheaper to send to and from the workers.
+    """
+    return [(poly.exterior._array, [hole._array for hole in poly.interiors]) for poly in polys]
+def _Unpack(packed):
+    return [Polygon(CoordinateSequence(exterior), [CoordinateSequence(hole) for hole in holes])
+            for exterior,holes in packed]
+def _Map(func, tasks, processes):
+    """
+    Runs func on each task in a pool of worker processes, or in this process
+    if there is only one process or task, and returns the list of results.
+    """
+    if processes is None: processes = multiprocessing.cpu_count()
+    if processes <= 1 or len(tasks) <= 1:
+        return map(func, tasks)
+    pool = multiprocessing.Pool(min(processes, len(tasks)))
+    try:
+        return pool.map(func, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+def _UnionCircles(task):
+    """
+    The worker for buffering a cluster of nearby points: buffers each point
+    and dissolves the circles, returning the packed result polygons.
+    """
+    flatcoords,buffersize,tolerance = task
+    circles = [Point(x,y).buffer(buffersize, tolerance=tolerance) for x,y in zip(flatcoords[0::2], flatcoords[1::2])]
+    return _Pack(_Parts(unary_union(circles)))
+def _TileGrid(parts, bounds, tiles, scale):
+    """
+    Splits the bounds into a grid of about the given number of tiles, as
+    close to square as possible. Returns the x and y positions of the tile
+    borders. The inner borders are snapped onto the clipping grid, and moved
+    along it until no vertex of the parts lies exactly on them.
+    """
+    xmin,ymin,xmax,ymax = bounds
+    width,height = xmax-xmin,ymax-ymin
+    if width <= 0 or height <= 0: cols = rows = 1
+    else:
+        cols = max(1, int(round(math.sqrt(tiles * width / height))))
+        rows = max(1, int(round(tiles / float(cols))))
+    rings = [ring._array for part in parts for ring in [part.exterior] + list(part.interiors)]
+    vertexxs = set(x for flatcoords in rings for x in flatcoords[0::2])
+    vertexys = set(y for flatcoords in rings for y in flatcoords[1::2])
+    def snap(value, taken):
+        step = int(round(value*scale))
+        while step / float(scale) in taken:
+            step += 1
+        return step / float(scale)
+    xs = [xmin] + [snap(xmin + width*col/float(cols), vertexxs) for col in xrange(1, cols)] + [xmax]
+    ys = [ymin] + [snap(ymin + height*row/float(rows), vertexys) for row in xrange(1, rows)] + [ymax]
+    return xs,ys
+def _TileRange(positions, low, high):
+    #the first and last tile between the borders that low to high overlaps
+    first = min(max(bisect.bisect_right(positions, low) - 1, 0), len(positions)-2)
+    last = min(bisect.bisect_left(positions, high), len(positions)-1) - 1
+    return first,max(first,last)
+def _CutToTile(part, sides):
+    """
+    Cuts a polygon along the given inner tile borders, each as an
+    (axis,bound,sign) tuple, and returns the list of polygons left inside.
+    """
+    rings = [list(part.exterior.coords)] + [list(hole.coords) for hole in part.interiors]
+    for axis,bound,sign in sides:
+        rings = _CutRings(rings, axis, bound, sign)
+        if rings is None:
+            #fall back on cropping, which intersects with the tile instead
+            xmin,ymin,xmax,ymax = part.bounds
+            for axis,bound,sign in sides:
+                if axis == 0 and sign > 0: xmin = bound
+                elif axis == 0: xmax = bound
+                elif sign > 0: ymin = bound
+                else: ymax = bound
+            cropped = part.clip_by_rect(xmin, ymin, xmax, ymax)
+            return [cropped] if cropped else []
+    return _Rings2Polygons(rings)
+def _ClipTile(task):
+    """
+    The worker: cuts the subject and clip polygons to one tile, overlays
+    what is left of them, and returns the packed result polygons.
+    """
+    cliptype,sides,scale,subjpacked,clippacked = task
+    subjparts = [piece for part in _Unpack(subjpacked) for piece in _CutToTile(part, sides)]
+    clipparts = [piece for part in _Unpack(clippacked) for piece in _CutToTile(part, sides)]
+    if not subjparts or not clipparts:
+        #nothing to overlay, so the tile keeps whatever the operation lets
+        #through, with any overlapping parts of the same input dissolved
+        if cliptype == "intersect": return []
+        elif cliptype == "difference": parts = subjparts
+        else: parts = subjparts + clipparts
+        if not parts: return []
+        return _Pack(_UnionTree(parts, 0, len(parts), scale)[0])
+    result = _Clip(_Parts2Geom(subjparts), _Parts2Geom(clipparts), cliptype, scale=scale)
+    if result is None: return []
+    return _Pack(_Parts(result))
+def _SplitSeamEdges(seamedges):
+    """
+    Splits the edges lying on one tile border wherever another edge on the
+    same border starts or ends, so that edges from either side of the border
+    line up one to one.
+    """
+    breaks = set()
+    for start,end,ringid in seamedges:
+        breaks.add(start)
+        breaks.add(end)
+    breaks = sorted(breaks)
+    splitedges = []
+    for start,end,ringid in seamedges:
+        low,high = min(start,end),max(start,end)
+        inbetween = breaks[bisect.bisect_right(breaks, low):bisect.bisect_left(breaks, high)]
+        if start > end: inbetween.reverse()
+        points = [start] + inbetween + [end]
+        splitedges.extend((points[i],points[i+1],ringid) for i in xrange(len(points)-1))
+    return splitedges
+def _StitchSeams(polys, xseams, yseams, scale):
+    """
+    Merges the tile results back together along the inner tile borders.
+    Every piece of a border that was cut through has one result edge running
+    along it from each side, in opposite directions, so these edge pairs are
+    cancelled and the remaining edges are traced into the merged rings.
+    Pieces that don't touch any of the borders are kept as they are.
+    """
+    xseams,yseams = set(xseams),set(yseams)
+    kept,cut = [],[]
+    for poly in polys:
+        xmin,ymin,xmax,ymax = poly.bounds
+        if xmin in xseams or xmax in xseams or ymin in yseams or ymax in yseams:
+            cut.append(poly)
+        else:
+            kept.append(poly)
+    if not cut: return kept
+    #collect the edges of all rings, grouping those that lie on a border
+    edges = []
+    seamedges = dict()
+    cutrings = [ring for poly in cut for ring in [poly.exterior] + list(poly.interiors)]
+    for ringid,ring in enumerate(cutrings):
+        points = list(ring.coords)
+        for start,end in zip(points[:-1], points[1:]):
+            if start[0] == end[0] and start[0] in xseams: seam = (0,start[0])
+            elif start[1] == end[1] and start[1] in yseams: seam = (1,start[1])
+            else: seam = None
+            if seam is None: edges.append((start,end,ringid))
+            else: seamedges.setdefault(seam, []).append((start,end,ringid))
+    #cancel out the border edges that run along each other in opposite directions
+    counts = dict()
+    for seam in seamedges:
+        for start,end,ringid in _SplitSeamEdges(seamedges[seam]):
+            if counts.get((end,start)):
+                counts[(end,start)].pop()
+            else:
+                counts.setdefault((start,end), []).append(ringid)
+    for (start,end),ringids in counts.iteritems():
+        edges.extend((start,end,ringid) for ringid in ringids)
+    #then trace the remaining edges into closed rings, staying on the same
+    #input ring where several edges leave from the same point
+    outgoing = dict()
+    for start,end,ringid in edges:
+        outgoing.setdefault(start, []).append((end,ringid))
+    rings = []
+    for start in list(outgoing.keys()):
+        while outgoing.get(start):
+            end,ringid = outgoing[start].pop()
+            ring = [start]
+            while end != start:
+                ring.append(end)
+                choices = outgoing.get(end)
+                #a dead end can only come from border points that didn't line up
+                if not choices: break
+                choice = len(choices) - 1
+                for index,(_,otherid) in enumerate(choices):
+                    if otherid == ringid: choice = index
+                end,ringid = choices.pop(choice)
+            if end != start or len(ring) < 3: continue
+            ring = _DropSeamPoints(ring, xseams, yseams, scale)
+            if len(ring) < 3: continue
+            ring.append(ring[0])
+            rings.append(ring)
+    return kept + _Rings2Polygons(rings)
+def _DropSeamPoints(ring, xseams, yseams, scale):
+    """
+    Drops the points that the tile borders added to a traced ring, which lie
+    on a border in the middle of a straight edge, so that the stitched rings
+    have the same vertices as an overlay in one piece.
+    """
+    kept = []
+    count = len(ring)
+    for i,point in enumerate(ring):
+        if point[0] in xseams or point[1] in yseams:
+            #the crossing was rounded to the clipping grid, so it may be up
+            #to one grid step off the edge it was cut from
+            (x1,y1),(x2,y2) = kept[-1] if kept else ring[i-1],ring[(i+1) % count]
+            cross = (point[0]-x1) * (y2-y1) - (point[1]-y1) * (x2-x1)
+            if abs(cross) <= math.hypot(x2-x1, y2-y1) / scale:
+                continue
+        kept.append(point)
+    return kept
+
+def parallel_overlay(geom, other, cliptype, processes=None, tiles=None, tolerance=None):
+    """
+    Overlays two large Polygon or MultiPolygon geometries by cutting both
+    into a grid of tiles, clipping each tile in its own worker process, and
+    stitching the tile results back together along the tile borders. All
+    tiles are clipped at the same integer scale, so the pieces on either
+    side of a border meet exactly. The result covers the same area as the
+    overlay in one piece, but where result parts only touch at a vertex,
+    each tile decides by itself whether they come out as one part or two.
+
+    Returns a Polygon, a MultiPolygon, or None if the result is empty.
+
+    | __options__ | __description__
+    | --- | ---
+    | geom | the Polygon or MultiPolygon to overlay.
+    | other | the Polygon or MultiPolygon to overlay it with.
+    | cliptype | either "intersect", "union", "difference", or "exclusive_or".
+    | *processes | the number of worker processes to use, where 1 clips all tiles in this process. Default is None, for one per cpu core.
+    | *tiles | the number of tiles to cut the geometries into. Default is None, for four per process.
+    | *tolerance | the smallest coordinate difference that the result must keep apart. Default is None, for the finest scale that the envelope allows.
+    """
+    if processes is None: processes = multiprocessing.cpu_count()
+    if tiles is None: tiles = processes * 4
+    subjparts,clipparts = _Parts(geom),_Parts(other)
+    bounds = _CombinedBounds(subjparts + clipparts)
+    scale = _ScaleFor(bounds, tolerance)
+    xs,ys = _TileGrid(subjparts + clipparts, bounds, tiles, scale)
+    #send each tile only the parts whose boxes overlap it
+    tasks = dict()
+    for role,parts in ((0,subjparts),(1,clipparts)):
+        for part,packed in zip(parts, _Pack(parts)):
+            xmin,ymin,xmax,ymax = part.bounds
+            firstcol,lastcol = _TileRange(xs, xmin, xmax)
+            firstrow,lastrow = _TileRange(ys, ymin, ymax)
+            for col in xrange(firstcol, lastcol+1):
+                for row in xrange(firstrow, lastrow+1):
+                    if (col,row) not in tasks:
+                        #only the inner borders cut, as nothing lies beyond the outer ones
+                        sides = []
+                        if col > 0: sides.append((0,xs[col],1))
+                        if col < len(xs)-2: sides.append((0,xs[col+1],-1))
+                        if row > 0: sides.append((1,ys[row],1))
+                        if row < len(ys)-2: sides.append((1,ys[row+1],-1))
+                        tasks[(col,row)] = (cliptype, sides, scale, [], [])
+                    tasks[(col,row)][3+role].append(packed)
+    results = _Map(_ClipTile, tasks.values(), processes)
+    polys = [poly for packed in results for poly in _Unpack(packed)]
+    return _Parts2Geom(_StitchSeams(polys, xs[1:-1], ys[1:-1], scale))
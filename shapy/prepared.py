@@ -0,0 +1,158 @@
+#Prepared polygons for fast repeated point-in-polygon tests
+
+#import stuff
+from array import array
+
+#the default band count keeps about this many bucket entries per edge
+BANDLOAD = 4
+
+class PreparedPolygon(object):
+    """
+    A read-only Polygon or MultiPolygon prepared for answering many
+    contains() queries. The edges of all rings are bucketed into horizontal
+    bands, so that each query only needs to run the crossing test on the few
+    edges that span the query point's y coordinate, instead of on every edge.
+    Within a band the edges are grouped by ring, and the rings whose bbox
+    doesn't contain the point are skipped.
+    """
+    def __init__(self, geom, bands=None):
+        """
+
+        | __options__ | __description__
+        | --- | ---
+        | geom | the Polygon or MultiPolygon to prepare.
+        | *bands | the number of horizontal bands to bucket the edges into. Default is as many as keeps the buckets to a few entries per edge, at most one band per edge.
+        """
+        if geom.geom_type == "Polygon": polys = [geom]
+        elif geom.geom_type == "MultiPolygon": polys = geom.geoms
+        else: raise TypeError("Only Polygon and MultiPolygon geometries can be prepared")
+        self.geom = geom
+        self.bounds = geom.bounds
+        #the flat edge arrays are x1,y1,x2,y2 per edge, plus the ring each edge belongs to
+        self._edges = array("d")
+        self._edgering = array("l")
+        #for each ring, the ring number of its exterior or -1 if itself an exterior
+        self._ringexterior = array("l")
+        #and its xmin,ymin,xmax,ymax
+        self._ringboxes = array("d")
+        for poly in polys:
+            exteriorid = len(self._ringexterior)
+            for ring in [poly.exterior] + list(poly.interiors):
+                ringid = len(self._ringexterior)
+                self._ringexterior.append(-1 if ringid == exteriorid else exteriorid)
+                self._ringboxes.extend(ring.bounds)
+                self._AddRing(ringid, ring._array)
+        if bands is None: bands = self._BandCount()
+        self._Build(max(1, bands))
+    ### Querying
+    def contains(self, point):
+        """
+        Returns True if the point lies inside the polygon and outside any of
+        its holes, using the same crossing rule as clipper.PointInPoly.
+
+        | __options__ | __description__
+        | --- | ---
+        | point | either a Point geometry or an xy tuple.
+        """
+        if hasattr(point, "geom_type"): point = point.coords[0]
+        pointx,pointy = point
+        xmin,ymin,xmax,ymax = self.bounds
+        if not (xmin <= pointx <= xmax and ymin <= pointy <= ymax):
+            return False
+        band = int((pointy - ymin) / self._bandheight)
+        if band >= self._bandcount: band = self._bandcount - 1
+        edges,bandedges,bandruns,ringboxes = self._edges,self._bandedges,self._bandruns,self._ringboxes
+        #find the rings that the ray towards the right crosses an odd number of times
+        inrings = set()
+        for run in xrange(self._bandstart[band], self._bandstart[band+1]):
+            ringid,start,end = bandruns[run*3:run*3+3]
+            #a point outside the ring's box can't be inside the ring
+            j = ringid*4
+            if not (ringboxes[j] <= pointx <= ringboxes[j+2] and ringboxes[j+1] <= pointy <= ringboxes[j+3]):
+                continue
+            crossings = 0
+            for edge in bandedges[start:end]:
+                i = edge*4
+                polypointx,polypointy,lastpolypointx,lastpolypointy = edges[i],edges[i+1],edges[i+2],edges[i+3]
+                if ((((polypointy <= pointy) and (pointy < lastpolypointy)) or \
+                    ((lastpolypointy <= pointy) and (pointy < polypointy))) and \
+                    (pointx < (lastpolypointx - polypointx) * (pointy - polypointy) / \
+                    (lastpolypointy - polypointy) + polypointx)):
+                    crossings += 1
+            if crossings % 2: inrings.add(ringid)
+        #inside an exterior ring unless also inside one of its holes
+        ringexterior = self._ringexterior
+        insideexteriors = set(ringid for ringid in inrings if ringexterior[ringid] < 0)
+        for ringid in inrings:
+            if ringexterior[ringid] >= 0:
+                insideexteriors.discard(ringexterior[ringid])
+        return bool(insideexteriors)
+    def contains_points(self, points):
+        """
+        Same as contains(), but tests a sequence of points and returns a list
+        of True or False for each.
+        """
+        contains = self.contains
+        return [contains(point) for point in points]
+    ### Internal use only
+    def _AddRing(self, ringid, flatcoords):
+        edges,edgering = self._edges,self._edgering
+        for i in xrange(0, len(flatcoords)-2, 2):
+            lastx,lasty,x,y = flatcoords[i:i+4]
+            #horizontal edges can never be crossed by the horizontal ray
+            if lasty == y: continue
+            edges.extend((x,y,lastx,lasty))
+            edgering.append(ringid)
+    def _BandCount(self):
+        """
+        Returns the number of bands that keeps the bucketed edges to about
+        BANDLOAD entries per edge: each edge goes into every band its y range
+        touches, so tall edges would otherwise fill up one band each.
+        """
+        edges,edgecount = self._edges,len(self._edgering)
+        if not edgecount: return 1
+        height = self.bounds[3] - self.bounds[1]
+        spanned = sum(abs(edges[i+3] - edges[i+1]) for i in xrange(0, len(edges), 4))
+        if not spanned: return 1
+        return max(1, min(edgecount, int(BANDLOAD * edgecount * height / spanned)))
+    def _Build(self, bandcount):
+        xmin,ymin,xmax,ymax = self.bounds
+        self._bandcount = bandcount
+        self._bandheight = (ymax - ymin) / float(bandcount) or 1.0
+        #bucket each edge into every band that its y range touches
+        buckets = [[] for _ in xrange(bandcount)]
+        edges = self._edges
+        for edge in xrange(len(self._edgering)):
+            y1,y2 = edges[edge*4+1],edges[edge*4+3]
+            firstband = int((min(y1,y2) - ymin) / self._bandheight)
+            lastband = min(int((max(y1,y2) - ymin) / self._bandheight), bandcount-1)
+            for band in xrange(firstband, lastband+1):
+                buckets[band].append(edge)
+        #then flatten the buckets so that each band is a slice of one array,
+        #with a run of ringid,start,end for each ring's edges in the band.
+        #edges are numbered ring by ring, so each bucket is already grouped
+        self._bandstart = array("l", [0])
+        self._bandedges = array("l")
+        self._bandruns = array("l")
+        edgering = self._edgering
+        for bucket in buckets:
+            start = len(self._bandedges)
+            self._bandedges.extend(bucket)
+            for i in xrange(start, len(self._bandedges)):
+                if i == start or edgering[self._bandedges[i]] != edgering[self._bandedges[i-1]]:
+                    if i > start: self._bandruns.append(i)
+                    self._bandruns.extend((edgering[self._bandedges[i]], i))
+            if bucket: self._bandruns.append(len(self._bandedges))
+            self._bandstart.append(len(self._bandruns) // 3)
+
+def prepare(geom, bands=None):
+    """
+    Prepares a Polygon or MultiPolygon for fast repeated point-in-polygon
+    tests, returning a PreparedPolygon with a contains(point) method.
+
+    | __options__ | __description__
+    | --- | ---
+    | geom | the Polygon or MultiPolygon to prepare.
+    | *bands | the number of horizontal bands to bucket the edges into. Default is as many as keeps the buckets to a few entries per edge.
+    """
+    return PreparedPolygon(geom, bands=bands)
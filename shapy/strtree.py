@@ -0,0 +1,196 @@
+#A packed Sort-Tile-Recursive (STR) R-tree for shapy geometries
+
+#import stuff
+import math, heapq
+from array import array
+
+#helper functions
+def _BoxOf(obj):
+    """
+    Returns the [xmin,ymin,xmax,ymax] box of either a geometry (anything
+    with a .bounds attribute) or an already given bbox sequence.
+    """
+    if hasattr(obj, "bounds"):
+        return obj.bounds
+    return obj
+def _BoxDist(box1, box2):
+    """
+    The minimum distance between two boxes, which is 0 if they overlap.
+    Since no geometry can be closer than its box, this is a lower bound
+    for the real distance between two geometries.
+    """
+    xmin1,ymin1,xmax1,ymax1 = box1
+    xmin2,ymin2,xmax2,ymax2 = box2
+    xdiff = max(xmin1-xmax2, xmin2-xmax1, 0)
+    ydiff = max(ymin1-ymax2, ymin2-ymax1, 0)
+    return math.hypot(xdiff, ydiff)
+def _STRPack(boxes, entries, nodecapacity):
+    """
+    Sorts the entries (indexes into the flat boxes array) into tiles of
+    vertical slices, then into runs of nodecapacity entries within each slice
+    sorted by y. Returns the sorted entries, each run being one node.
+    """
+    centerx = lambda i: boxes[i*4] + boxes[i*4+2]
+    centery = lambda i: boxes[i*4+1] + boxes[i*4+3]
+    nodecount = int(math.ceil(len(entries) / float(nodecapacity)))
+    slicecount = int(math.ceil(math.sqrt(nodecount)))
+    slicesize = slicecount * nodecapacity
+    entries = sorted(entries, key=centerx)
+    packed = []
+    for slicestart in xrange(0, len(entries), slicesize):
+        eachslice = entries[slicestart:slicestart+slicesize]
+        packed.extend(sorted(eachslice, key=centery))
+    return packed
+
+class STRtree(object):
+    """
+    A static spatial index built in bulk from the bounding boxes of any
+    shapy geometries, using the Sort-Tile-Recursive packing algorithm.
+    The tree is read-only once built. All nodes are kept in flat arrays,
+    with each node's children stored as a contiguous range of the level
+    below it.
+    """
+    def __init__(self, geoms, nodecapacity=10):
+        """
+
+        | __options__ | __description__
+        | --- | ---
+        | geoms | a sequence of shapy geometries (or anything with a .bounds attribute) to index.
+        | *nodecapacity | the maximum number of children for each node. Default is 10.
+        """
+        self.geoms = list(geoms)
+        self.nodecapacity = max(2, nodecapacity)
+        #item boxes
+        itemboxes = array("d")
+        for geom in self.geoms:
+            itemboxes.extend(geom.bounds)
+        self._itemboxes = itemboxes
+        #flat node arrays, filled level by level from the leaves up
+        self._order = array("l")
+        self._nodeboxes = array("d")
+        self._nodestart = array("l")
+        self._nodeend = array("l")
+        self._leafcount = 0
+        self._root = -1
+        if self.geoms:
+            self._Build()
+    def __len__(self):
+        return len(self.geoms)
+    ### Querying
+    def query(self, target):
+        """
+        Returns a list of all indexed geometries whose bounding box
+        intersects the bounding box of the target.
+
+        | __options__ | __description__
+        | --- | ---
+        | target | either a [xmin,ymin,xmax,ymax] bbox sequence or a geometry.
+        """
+        return [self.geoms[i] for i in self.query_indexes(target)]
+    def query_indexes(self, target):
+        """
+        Same as query(), but returns the positions of the matching
+        geometries in the original input sequence.
+        """
+        if self._root < 0: return []
+        xmin,ymin,xmax,ymax = _BoxOf(target)
+        nodeboxes,itemboxes = self._nodeboxes,self._itemboxes
+        nodestart,nodeend = self._nodestart,self._nodeend
+        order,leafcount = self._order,self._leafcount
+        results = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node < leafcount:
+                for i in order[nodestart[node]:nodeend[node]]:
+                    if itemboxes[i*4] <= xmax and itemboxes[i*4+2] >= xmin \
+                       and itemboxes[i*4+1] <= ymax and itemboxes[i*4+3] >= ymin:
+                        results.append(i)
+            else:
+                for child in xrange(nodestart[node], nodeend[node]):
+                    if nodeboxes[child*4] <= xmax and nodeboxes[child*4+2] >= xmin \
+                       and nodeboxes[child*4+1] <= ymax and nodeboxes[child*4+3] >= ymin:
+                        stack.append(child)
+        return results
+    def nearest(self, target, k=1):
+        """
+        Returns a list of the k indexed geometries nearest to the target,
+        closest first, by searching the tree best-first. Distances are exact
+        when the target is a geometry that has a distance method (currently
+        Point and MultiPoint), otherwise they are measured between bounding boxes.
+
+        | __options__ | __description__
+        | --- | ---
+        | target | either a [xmin,ymin,xmax,ymax] bbox sequence or a geometry.
+        | *k | how many of the nearest geometries to return. Default is 1.
+        """
+        return [self.geoms[i] for i,dist in self.nearest_indexes(target, k)]
+    def nearest_indexes(self, target, k=1):
+        """
+        Same as nearest(), but returns a list of (index,distance) tuples, where
+        index is the position of each geometry in the original input sequence.
+        """
+        if self._root < 0 or k < 1: return []
+        targetbox = _BoxOf(target)
+        exact = target.geom_type in ("Point","MultiPoint") if hasattr(target, "geom_type") else False
+        def itemdist(i):
+            if exact: return target.distance(self.geoms[i])["mindist"]
+            else: return _BoxDist(targetbox, self._itemboxes[i*4:i*4+4])
+        nodestart,nodeend = self._nodestart,self._nodeend
+        order,leafcount = self._order,self._leafcount
+        #the heap holds (distance, kind, index), where kind is 0 for an item with
+        #its exact distance, 1 for an item with only its box distance, and 2 for
+        #a node, so that ties are resolved in favour of finished items
+        heap = [(_BoxDist(targetbox, self._nodeboxes[self._root*4:self._root*4+4]), 2, self._root)]
+        results = []
+        while heap and len(results) < k:
+            dist,kind,index = heapq.heappop(heap)
+            if kind == 0:
+                results.append((index,dist))
+            elif kind == 1:
+                heapq.heappush(heap, (itemdist(index), 0, index))
+            elif index < leafcount:
+                for i in order[nodestart[index]:nodeend[index]]:
+                    heapq.heappush(heap, (_BoxDist(targetbox, self._itemboxes[i*4:i*4+4]), 1, i))
+            else:
+                for child in xrange(nodestart[index], nodeend[index]):
+                    heapq.heappush(heap, (_BoxDist(targetbox, self._nodeboxes[child*4:child*4+4]), 2, child))
+        return results
+    ### Internal use only
+    def _Build(self):
+        capacity = self.nodecapacity
+        #pack the leaf level from the items
+        self._order = array("l", _STRPack(self._itemboxes, range(len(self.geoms)), capacity))
+        for start in xrange(0, len(self._order), capacity):
+            end = min(start+capacity, len(self._order))
+            self._AddNode(self._itemboxes, self._order[start:end], start, end)
+        self._leafcount = len(self._nodestart)
+        #then keep packing the nodes of each level until only the root is left
+        levelstart,levelend = 0,self._leafcount
+        while levelend - levelstart > 1:
+            packed = _STRPack(self._nodeboxes, range(levelstart, levelend), capacity)
+            #reorder the level so each parent's children are contiguous
+            self._ReorderLevel(levelstart, packed)
+            for start in xrange(levelstart, levelend, capacity):
+                end = min(start+capacity, levelend)
+                self._AddNode(self._nodeboxes, range(start, end), start, end)
+            levelstart,levelend = levelend,len(self._nodestart)
+        self._root = len(self._nodestart) - 1
+    def _AddNode(self, boxes, children, start, end):
+        xmin = min(boxes[i*4] for i in children)
+        ymin = min(boxes[i*4+1] for i in children)
+        xmax = max(boxes[i*4+2] for i in children)
+        ymax = max(boxes[i*4+3] for i in children)
+        self._nodeboxes.extend((xmin,ymin,xmax,ymax))
+        self._nodestart.append(start)
+        self._nodeend.append(end)
+    def _ReorderLevel(self, levelstart, packed):
+        nodeboxes = [self._nodeboxes[i*4:i*4+4] for i in packed]
+        nodestart = [self._nodestart[i] for i in packed]
+        nodeend = [self._nodeend[i] for i in packed]
+        for offset in xrange(len(packed)):
+            node = levelstart + offset
+            self._nodeboxes[node*4:node*4+4] = nodeboxes[offset]
+            self._nodestart[node] = nodestart[offset]
+            self._nodeend[node] = nodeend[offset]
+
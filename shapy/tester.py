@@ -1,5 +1,6 @@
 
 #Testing
+import math
 import geometry
 from geometry import *
 
@@ -158,6 +159,22 @@ def buffertesting(VIEWGEOMS=False):
     if VIEWGEOMS:
         result.view()
 
+    #repeated vertices and every end type give a corridor of the right size
+    line = LineString([(0,0),(0,0),(10,0),(10,0)])
+    for endtype,area in (("flat",20.0),("project",24.0)):
+        result = line.buffer(2, endtype=endtype)
+        print("%s end buffer area %s"%(endtype,result.area))
+        assert abs(result.area - area) < 1e-6
+    result = line.buffer(2, jointype="round", endtype="round")
+    print("round end buffer area %s"%result.area)
+    assert 20.0 < result.area < 20.0 + math.pi
+
+    #round ends under miter joins are as round for thin lines as for wide ones
+    for width in (0.002, 2, 2000):
+        result = LineString([(0,0),(10*width,0)]).buffer(width, jointype="miter", endtype="round")
+        print("width %s round end buffer area %s"%(width,result.area))
+        assert abs(result.area / width**2 - (10 + math.pi/4)) < 0.01
+
     #multiline buffer test
     multiline = MultiLineString([[(1,33),(53,33),(35,99),(99,79),(1,33)],[(33,12),(85,64),(92,11)]])
     if VIEWGEOMS:
@@ -252,6 +269,806 @@ def uniontesting(VIEWGEOMS=False):
             break
     img.view()
 
+def coordstesting(VIEWGEOMS=False):
+    #-------------------
+    #   COORDINATES TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   COORDINATES TESTING")
+    print("#-------------------")
+
+    #the coords read like a list of xy tuples from the flat array
+    line = LineString([(0,0),(3,4),(6,0.5)])
+    coords = line.coords
+    print("LineString coords %s"%coords)
+    assert len(coords) == 3
+    assert coords[1] == (3.0,4.0) and coords[-1] == (6.0,0.5)
+    assert coords[1:] == [(3.0,4.0),(6.0,0.5)]
+    assert list(reversed(coords)) == [(6.0,0.5),(3.0,4.0),(0.0,0.0)]
+    assert coords == [(0,0),(3,4),(6,0.5)]
+    try:
+        coords[3]
+    except IndexError:
+        pass
+    else:
+        raise Exception("Indexing past the last coordinate should raise IndexError")
+    #rings are closed, and geoms made from other coords share their array
+    ring = Polygon([(0,0),(4,0),(4,4),(0,4)]).exterior
+    assert ring.coords[0] == ring.coords[-1] and len(ring.coords) == 5
+    copy = LineString(line.coords)
+    assert copy.coords == line.coords
+    print("")
+
+def scaledtesting(VIEWGEOMS=False):
+    #-------------------
+    #   SCALED COORDINATES TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   SCALED COORDINATES TESTING")
+    print("#-------------------")
+
+    #the integer clipper points are only made once a clip needs them
+    square = Polygon([(0,0),(4,0),(4,4),(0,4)])
+    corner = Polygon([(2.5,2.5),(6,2.5),(6,6),(2.5,6)])
+    assert square.exterior._scaled is None
+    square.intersect(corner)
+    scale,points = square.exterior._scaled
+    print("scaled at %s %s"%(scale,points[:2]))
+    assert [(point.x,point.y) for point in points] == [(int(round(x*scale)),int(round(y*scale))) for x,y in square.exterior.coords]
+    #and are kept for further clips at the same scale
+    square.difference(corner)
+    assert square.exterior._scaled[1] is points
+    print("")
+
+def cachetesting(VIEWGEOMS=False):
+    #-------------------
+    #   CACHE TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   CACHE TESTING")
+    print("#-------------------")
+
+    geoms = [Point(1,2),
+             LineString([(0,0),(3,4),(6,0)]),
+             Polygon([(0,0),(4,0),(4,4),(0,4)], interiors=[[(1,1),(1,2),(2,2),(2,1)]]),
+             MultiPolygon([([(0,0),(1,0),(1,1),(0,1)],[]), ([(5,5),(6,5),(6,6),(5,6)],[])])]
+    for geom in geoms:
+        bounds = list(geom.bounds)
+        geojson = geom.__geo_interface__
+        coords = repr(geojson["coordinates"])
+        #the cached values are computed once, but changing what is returned
+        #must not change the geometry
+        geom.bounds[0] = -999
+        geojson["type"] = "Changed"
+        if isinstance(geojson["coordinates"], list):
+            geojson["coordinates"].append(None)
+        print("%s bounds %s"%(geom.geom_type, geom.bounds))
+        assert geom.bounds == bounds
+        assert geom.__geo_interface__["type"] == geom.geom_type
+        assert repr(geom.__geo_interface__["coordinates"]) == coords
+    print("")
+
+def strtreetesting(VIEWGEOMS=False):
+    #-------------------
+    #   STRTREE TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   STRTREE TESTING")
+    print("#-------------------")
+
+    from strtree import STRtree
+    squares = [Polygon([(x,y),(x+1,y),(x+1,y+1),(x,y+1)]) for x in xrange(0,40,2) for y in xrange(0,40,2)]
+    tree = STRtree(squares)
+    #same candidates as checking every box
+    for box in ([3.5,3.5,6.5,4.5], [-5,-5,-1,-1], [10,10,10,10], [0,0,40,40]):
+        expected = [i for i,square in enumerate(squares)
+                    if square.bounds[0] <= box[2] and box[0] <= square.bounds[2]
+                    and square.bounds[1] <= box[3] and box[1] <= square.bounds[3]]
+        found = sorted(tree.query_indexes(box))
+        print("query %s found %s"%(box,len(found)))
+        assert found == expected
+    assert tree.query(squares[5]) == [squares[5]]
+    #the nearest ones are the closest by exact distance, closest first
+    target = Point(10.2,30.7)
+    nearest = tree.nearest_indexes(target, k=4)
+    print("nearest %s"%nearest)
+    distances = sorted(target.distance(square)["mindist"] for square in squares)
+    assert [dist for index,dist in nearest] == distances[:4]
+    print("")
+
+def nearesttesting(VIEWGEOMS=False):
+    #-------------------
+    #   NEAREST TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   NEAREST TESTING")
+    print("#-------------------")
+
+    #the best-first search finds the same ones as measuring every candidate
+    candidates = [LineString([(x,y),(x+2,y+1)]) for x in xrange(0,30,3) for y in xrange(0,30,4)]
+    candidates.extend(Point(x+0.5,y+0.5) for x in xrange(0,30,5) for y in xrange(0,30,5))
+    for target in (Point(12.3,7.1), Point(-5,40), MultiPoint([(1,1),(28,28)])):
+        found = nearest(target, candidates, k=5)
+        distances = sorted(target.distance(candidate)["mindist"] for candidate in candidates)
+        print("nearest to %s %s"%(target.geom_type,[round(result["mindist"],3) for candidate,result in found]))
+        assert [result["mindist"] for candidate,result in found] == distances[:5]
+        for candidate,result in found:
+            assert "closestpoint_self" in result and "closestpoint_other" in result
+    #nothing farther than the max distance is returned
+    found = nearest(Point(12.3,7.1), candidates, k=50, max_distance=2.0)
+    print("within max distance %s"%len(found))
+    assert found and all(result["mindist"] <= 2.0 for candidate,result in found)
+    assert nearest(Point(100,100), candidates, max_distance=1.0) == []
+    print("")
+
+def preparedtesting(VIEWGEOMS=False):
+    #-------------------
+    #   PREPARED TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   PREPARED TESTING")
+    print("#-------------------")
+
+    from prepared import prepare
+    import clipper
+    polygonslist = [( [(1,1),(1,10),(10,10),(10,1),(1,1)], [[(4,4),(4,9),(9,9),(9,4),(4,4)]] ),
+                    ( [(21,21),(30,25),(21,30),(21,21)], [] )]
+    multipolygon = MultiPolygon(polygonslist)
+    prepared = prepare(multipolygon)
+    #same answers as testing each ring of the polygon with the clipper
+    def unprepared(point):
+        for poly in multipolygon.geoms:
+            if clipper._PointInRing(point, list(poly.exterior.coords)) \
+               and not any(clipper._PointInRing(point, list(hole.coords)) for hole in poly.interiors):
+                return True
+        return False
+    points = [(x/2.0, y/2.0) for x in xrange(0, 64) for y in xrange(0, 64)]
+    results = prepared.contains_points(points)
+    print("prepared contains %s of %s points"%(sum(results),len(points)))
+    assert results == [unprepared(point) for point in points]
+    assert prepared.contains(Point(2,2)) and not prepared.contains(Point(5,5))
+    #tall edges don't each get a band of their own
+    zigzag = [(0,0)] + [(i, 1000 if i%2 else 0) for i in xrange(1,400)] + [(400,-1)]
+    prepared = prepare(Polygon(zigzag))
+    print("zigzag bands %s bucketed edges %s"%(prepared._bandcount,len(prepared._bandedges)))
+    assert len(prepared._bandedges) <= 5 * len(zigzag)
+    print("")
+
+def scanbeamtesting(VIEWGEOMS=False):
+    #-------------------
+    #   SCANBEAM TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   SCANBEAM TESTING")
+    print("#-------------------")
+
+    #scanbeams come out topmost first, and each y value only once
+    import clipper
+    main = clipper.Clipper()
+    for y in (5,1,9,5,3,9,-2):
+        main._InsertScanbeam(y)
+    popped = [main._PopScanbeam() for _ in xrange(5)]
+    print("scanbeams %s"%popped)
+    assert popped == [9,5,3,1,-2] and not main._Scanbeam
+
+    #jagged polygons with a scanbeam at almost every vertex still add up
+    jagged1 = Polygon([(0,0),(30,0)] + [(x, 5 + (x*7 % 11)/3.0) for x in xrange(30,-1,-1)])
+    jagged2 = Polygon([(0,0),(0,30)] + [(5 + (y*5 % 13)/3.0, y) for y in xrange(30,-1,-1)])
+    intersection = jagged1.intersect(jagged2)
+    union = jagged1.union(jagged2)
+    difference = jagged1.difference(jagged2)
+    print("jagged intersection %s union %s difference %s"%(intersection.area,union.area,difference.area))
+    assert abs(union.area - (jagged1.area + jagged2.area - intersection.area)) < 1e-6
+    assert abs(difference.area - (jagged1.area - intersection.area)) < 1e-6
+    if VIEWGEOMS:
+        union.view()
+    print("")
+
+def intersectlisttesting(VIEWGEOMS=False):
+    #-------------------
+    #   INTERSECT LIST TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   INTERSECT LIST TESTING")
+    print("#-------------------")
+
+    #the merge sort finds exactly the pairs of edges that swap order
+    import clipper
+    class Edge(object):
+        def __init__(self, xCurr):
+            self.xCurr = xCurr
+    edges = [Edge((i*37) % 23) for i in xrange(40)]
+    inversions = []
+    ordered = clipper._SortByXCurr(edges, inversions)
+    expected = set((edges[i],edges[j]) for i in xrange(len(edges)) for j in xrange(i+1,len(edges)) if edges[i].xCurr > edges[j].xCurr)
+    print("inversions %s"%len(inversions))
+    assert [edge.xCurr for edge in ordered] == sorted(edge.xCurr for edge in edges)
+    assert len(inversions) == len(expected) and set(inversions) == expected
+
+    #two combs laid across each other cross many edges in every scanbeam
+    comb1 = Polygon([(0,0),(40,0)] + [(x, 20 + 5*(x % 2)) for x in xrange(40,-1,-1)])
+    comb2 = Polygon([(45.5,50),(-4.5,50)] + [(x+0.5, 18 + 9*(x % 2)) for x in xrange(-5,46)])
+    intersection = comb1.intersect(comb2)
+    union = comb1.union(comb2)
+    xor = comb1.symmetric_difference(comb2)
+    print("comb intersection %s union %s xor %s"%(intersection.area,union.area,xor.area))
+    assert abs(union.area - (comb1.area + comb2.area - intersection.area)) < 1e-6
+    assert abs(xor.area - (union.area - intersection.area)) < 1e-6
+    if VIEWGEOMS:
+        xor.view()
+    print("")
+
+def unaryuniontesting(VIEWGEOMS=False):
+    #-------------------
+    #   UNARY UNION TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   UNARY UNION TESTING")
+    print("#-------------------")
+
+    #the balanced tree dissolves to the same as folding the unions together
+    squares = [Polygon([(x,y),(x+1.5,y),(x+1.5,y+1.5),(x,y+1.5)]) for x in xrange(10) for y in xrange(10)]
+    squares.extend(Polygon([(x,y),(x+1,y),(x+1,y+1),(x,y+1)]) for x in (20,22) for y in (20,22))
+    squares.append(MultiPolygon([( [(30,0),(32,0),(32,2),(30,2)], [] ),
+                                 ( [(31,1),(33,1),(33,3),(31,3)], [] )]))
+    folded = squares[0]
+    for square in squares[1:]:
+        folded = folded.union(square)
+    result = unary_union(squares)
+    print("unary union area %s parts %s"%(result.area,len(result.geoms)))
+    assert abs(result.area - folded.area) < 1e-9
+    assert len(result.geoms) == len(folded.geoms) == 6
+    assert cascaded_union(squares).area == result.area
+    if VIEWGEOMS:
+        result.view()
+    assert unary_union([]) is None
+    try:
+        unary_union([Point(1,1)])
+    except TypeError:
+        print("non polygons raise TypeError")
+    else:
+        raise Exception("Unioning non polygons should raise TypeError")
+    print("")
+
+def enginetesting(VIEWGEOMS=False):
+    #-------------------
+    #   ENGINE REUSE TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   ENGINE REUSE TESTING")
+    print("#-------------------")
+
+    #each thread keeps one engine, whose edges and points are pooled between clips
+    main = geometry._GetClipper()
+    assert geometry._GetClipper() is main
+    square = Polygon([(0,0),(4,0),(4,4),(0,4)], interiors=[[(1,1),(1,2),(2,2),(2,1)]])
+    corner = Polygon([(2.5,2.5),(6,2.5),(6,6),(2.5,6)])
+    first = square.symmetric_difference(corner).__geo_interface__
+    print("pooled edges %s output points %s"%(len(main._EdgePool),len(main._OutPtPool)))
+    assert main._EdgePool and main._OutPtPool
+    #the pooled objects carry nothing over into later clips
+    square.union(Polygon([(3,3),(8,3),(3,8)]))
+    for _ in xrange(3):
+        assert square.symmetric_difference(corner).__geo_interface__ == first
+    assert not main._ActiveEdges and not main._PolyOutList
+    print("")
+
+def differencetesting(VIEWGEOMS=False):
+    #-------------------
+    #   DIFFERENCE TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   DIFFERENCE TESTING")
+    print("#-------------------")
+
+    #the clipped away area must be removed from the subject, not kept
+    square = Polygon([(0,0),(4,0),(4,4),(0,4)])
+    corner = Polygon([(2,2),(6,2),(6,6),(2,6)])
+    result = square.difference(corner)
+    print("difference %s area %s"%(result,result.area))
+    assert result.area == 12.0
+    if VIEWGEOMS:
+        result.view()
+    result = corner.difference(square)
+    print("reverse difference %s area %s"%(result,result.area))
+    assert result.area == 12.0
+    #nothing is left when the subject is covered
+    inner = Polygon([(1,1),(3,1),(3,3),(1,3)])
+    result = inner.difference(square)
+    print("covered difference %s"%result)
+    assert result is None
+    print("")
+
+def partfiltertesting(VIEWGEOMS=False):
+    #-------------------
+    #   PART FILTER TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   PART FILTER TESTING")
+    print("#-------------------")
+
+    #parts far from the other geom skip the clipper, but overlapping parts
+    #of the same geom must still be dissolved
+    overlapping = MultiPolygon([( [(0,0),(2,0),(2,2),(0,2)], [] ),
+                                ( [(1,1),(3,1),(3,3),(1,3)], [] )])
+    far = Polygon([(10,10),(11,10),(11,11),(10,11)])
+    expected = {"intersect":(0,0), "union":(8.0,2), "difference":(7.0,1), "symmetric_difference":(8.0,2)}
+    for name in ("intersect","union","difference","symmetric_difference"):
+        result = getattr(overlapping, name)(far)
+        area = result.area if result else 0
+        parts = len(result.geoms) if result and result.geom_type == "MultiPolygon" else int(bool(result))
+        print("%s area %s parts %s"%(name,area,parts))
+        assert (area,parts) == expected[name]
+        if VIEWGEOMS and result:
+            result.view()
+
+    #parts that are apart from everything are passed through untouched
+    apart = MultiPolygon([( [(0,0),(2,0),(2,2),(0,2)], [] ),
+                          ( [(4,4),(6,4),(6,6),(4,6)], [] )])
+    result = apart.union(far)
+    print("apart union %s"%result)
+    assert len(result.geoms) == 3 and result.area == 9.0
+    print("")
+
+def cliprecttesting(VIEWGEOMS=False):
+    #-------------------
+    #   CLIP BY RECT TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   CLIP BY RECT TESTING")
+    print("#-------------------")
+
+    #cropped polygons cover the same area as intersecting with the rectangle
+    polygon = Polygon([(0,0),(10,0),(10,10),(5,4),(0,10)], interiors=[[(2,1),(2,3),(4,3),(4,1)]])
+    for rect in ((1,1,9,9), (3,2,12,12), (-1,-1,11,11), (2.5,1.5,3.5,2.5), (20,20,30,30)):
+        xmin,ymin,xmax,ymax = rect
+        cropped = polygon.clip_by_rect(*rect)
+        expected = polygon.intersect(Polygon([(xmin,ymin),(xmax,ymin),(xmax,ymax),(xmin,ymax)]))
+        print("rect %s area %s"%(rect,cropped.area if cropped else None))
+        if expected is None:
+            assert cropped is None
+        else:
+            assert abs(cropped.area - expected.area) < 1e-9
+        if VIEWGEOMS and cropped:
+            cropped.view()
+    assert polygon.clip_by_rect(-1,-1,11,11) is polygon
+
+    #a concave polygon leaving and re-entering the rectangle is split into parts
+    ushape = Polygon([(0,0),(10,0),(10,10),(7,10),(7,3),(3,3),(3,10),(0,10)])
+    cropped = ushape.clip_by_rect(-1,5,11,8)
+    expected = ushape.intersect(Polygon([(-1,5),(11,5),(11,8),(-1,8)]))
+    print("ushape %s area %s"%(cropped.geom_type,cropped.area))
+    assert cropped.geom_type == "MultiPolygon" and len(cropped.geoms) == 2
+    assert abs(cropped.area - expected.area) < 1e-9
+    assert sorted(part.bounds for part in cropped.geoms) == [[0,5,3,8],[7,5,10,8]]
+    #and holes cut by the rectangle become part of the exterior
+    cropped = polygon.clip_by_rect(3,0,12,12)
+    assert cropped.geom_type == "Polygon" and not cropped.interiors
+
+    #lines are cut where they cross the rectangle, and points are kept if inside
+    line = LineString([(0,0),(10,0),(10,10),(0,10)])
+    cropped = line.clip_by_rect(5,-5,15,5)
+    print("line %s"%cropped.coords)
+    assert cropped.geom_type == "LineString" and cropped.length == 10.0
+    cropped = line.clip_by_rect(2,-1,8,11)
+    assert cropped.geom_type == "MultiLineString" and cropped.length == 12.0
+    points = MultiPoint([(0,0),(5,5),(6,6),(20,20)])
+    assert len(points.clip_by_rect(4,4,10,10).geoms) == 2
+    assert Point(1,1).clip_by_rect(2,2,3,3) is None
+    print("")
+
+def scaletesting(VIEWGEOMS=False):
+    #-------------------
+    #   SCALE TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   SCALE TESTING")
+    print("#-------------------")
+
+    #the scale keeps the envelope below MAXINT, but is never finer than PRECISION
+    for bounds in ([0,0,1,1], [-180,-90,180,90], [500000,4000000,600000,4100000], [0,0,0,0]):
+        scale = geometry._ScaleFor(bounds)
+        print("bounds %s scale %s"%(bounds,scale))
+        assert scale <= geometry.PRECISION
+        assert max(abs(xory) for xory in bounds) * scale < geometry.MAXINT
+    assert geometry._ScaleFor([0,0,1,1], tolerance=0.001) == 1000
+    #so clipping keeps its detail far from the origin too
+    x,y = 500000.25,4000000.5
+    square = Polygon([(x,y),(x+4,y),(x+4,y+4),(x,y+4)])
+    corner = Polygon([(x+2.5,y+2.5),(x+6,y+2.5),(x+6,y+6),(x+2.5,y+6)])
+    result = square.intersect(corner)
+    print("projected intersection area %s"%result.area)
+    assert abs(result.area - 2.25) < 1e-6
+    assert list(result.bounds) == [x+2.5,y+2.5,x+4,y+4]
+    print("")
+
+def paralleltesting(VIEWGEOMS=False):
+    #-------------------
+    #   PARALLEL TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   PARALLEL TESTING")
+    print("#-------------------")
+
+    from parallel import parallel_overlay
+    subject = MultiPolygon([( [(0,0),(6,0),(6,6),(0,6)], [[(1,1),(1,2),(2,2),(2,1)]] ),
+                            ( [(5,5),(9,5),(9,9),(5,9)], [] ),
+                            ( [(20,20),(22,20),(22,22),(20,22)], [] )])
+    clip = MultiPolygon([( [(3,-1),(8,2),(4,10)], [] ),
+                         ( [(19,21),(21,19),(23,21),(21,23)], [] )])
+    names = {"intersect":"intersect", "union":"union", "difference":"difference", "exclusive_or":"symmetric_difference"}
+    for cliptype,name in names.items():
+        serial = getattr(subject, name)(clip)
+        #one process clips the tiles in this process, without a pool
+        tiled = parallel_overlay(subject, clip, cliptype, processes=1, tiles=9)
+        print("%s serial area %s tiled area %s"%(cliptype,serial.area,tiled.area))
+        assert abs(serial.area - tiled.area) < 1e-6
+        if VIEWGEOMS:
+            tiled.view()
+
+    #tiles where only one geom is left must still dissolve its overlapping parts
+    overlapping = MultiPolygon([( [(0,0),(2,0),(2,2),(0,2)], [] ),
+                                ( [(1,1),(3,1),(3,3),(1,3)], [] )])
+    far = Polygon([(10,10),(11,10),(11,11),(10,11)])
+    for cliptype,area in (("union",8.0),("difference",7.0),("exclusive_or",8.0)):
+        tiled = parallel_overlay(overlapping, far, cliptype, processes=1, tiles=4)
+        print("%s of overlapping parts area %s"%(cliptype,tiled.area))
+        assert abs(tiled.area - area) < 1e-6
+
+    #tile borders are only moved off vertices with the same coordinate on their own axis
+    from parallel import _TileGrid
+    square = Polygon([(0,0),(10,0),(10,10),(0,10),(0,5)])
+    xs,ys = _TileGrid([square], square.bounds, 4, 1000)
+    print("tile borders %s %s"%(xs,ys))
+    assert xs == [0,5.0,10] and ys[0] == 0 and 5.0 < ys[1] < 5.01 and ys[2] == 10
+    print("")
+
+def arctesting(VIEWGEOMS=False):
+    #-------------------
+    #   ARC TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   ARC TESTING")
+    print("#-------------------")
+
+    #the unit circles are made once for each number of chords
+    import clipper
+    assert clipper._CircleTemplate(16) is clipper._CircleTemplate(16)
+    #no chord strays further than the tolerance from the circle
+    for radius,tolerance in ((1,0.01), (100,0.5), (100,0.05)):
+        circle = Point(3,4).buffer(radius, tolerance=tolerance)
+        coords = list(circle.exterior.coords)
+        worst = max(radius - math.hypot((x1+x2)/2.0-3, (y1+y2)/2.0-4) for (x1,y1),(x2,y2) in zip(coords, coords[1:]))
+        print("radius %s tolerance %s chords %s worst %s"%(radius,tolerance,len(coords)-1,worst))
+        assert worst <= tolerance
+        assert circle.bounds == [3-radius,4-radius,3+radius,4+radius]
+    #and the resolution gives circles the same detail whatever the map units
+    assert len(Point(0,0).buffer(0.001).exterior.coords) == len(Point(0,0).buffer(1000).exterior.coords)
+    #and round joins come as close to the true rounded square
+    square = Polygon([(0,0),(10,0),(10,10),(0,10)])
+    result = square.buffer(2, jointype="round", resolution=1.0)
+    print("round square buffer area %s"%result.area)
+    assert abs(result.area - (100 + 4*10*2 + math.pi*2**2)) < 0.01
+    if VIEWGEOMS:
+        result.view()
+    print("")
+
+def multipointbuffertesting(VIEWGEOMS=False):
+    #-------------------
+    #   MULTIPOINT BUFFER TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   MULTIPOINT BUFFER TESTING")
+    print("#-------------------")
+
+    #the grid clusters are the same as joining up every pair within the distance
+    points = [((i*7919) % 97 / 3.0, (i*104729) % 89 / 3.0) for i in xrange(150)]
+    distance = 2.0
+    groups = [set([i]) for i in xrange(len(points))]
+    for i,(x1,y1) in enumerate(points):
+        for j,(x2,y2) in enumerate(points[:i]):
+            if (x1-x2)**2 + (y1-y2)**2 <= distance**2:
+                first = [group for group in groups if i in group][0]
+                second = [group for group in groups if j in group][0]
+                if first is not second:
+                    first.update(second)
+                    groups.remove(second)
+    clusters = geometry._PointClusters(points, distance)
+    print("clusters %s"%len(clusters))
+    assert sorted(sorted(cluster) for cluster in clusters) == sorted(sorted(group) for group in groups)
+    #and dissolving each cluster gives the same as dissolving all the circles
+    multipoint = MultiPoint(points)
+    result = multipoint.buffer(distance/2.0)
+    expected = unary_union([Point(x,y).buffer(distance/2.0) for x,y in points])
+    print("dissolved buffer area %s parts %s"%(result.area,len(result.geoms)))
+    assert abs(result.area - expected.area) < 1e-6
+    assert len(result.geoms) == len(expected.geoms)
+    if VIEWGEOMS:
+        result.view()
+    print("")
+
+def multipolygonbuffertesting(VIEWGEOMS=False):
+    #-------------------
+    #   MULTIPOLYGON BUFFER TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   MULTIPOLYGON BUFFER TESTING")
+    print("#-------------------")
+
+    #one sweep over all the parts gives the same as dissolving each part's buffer
+    multipolygon = MultiPolygon([( [(0,0),(10,0),(10,10),(0,10)], [[(3,3),(3,7),(7,7),(7,3)]] ),
+                                 ( [(12,0),(20,0),(20,8),(12,8)], [] ),
+                                 ( [(40,40),(45,40),(45,45),(40,45)], [] )])
+    for buffersize in (1.5, -1):
+        result = multipolygon.buffer(buffersize)
+        separate = [part.buffer(buffersize) for part in multipolygon.geoms]
+        expected = unary_union([part for part in separate if part])
+        print("buffer %s area %s parts %s"%(buffersize,result.area,len(result.geoms)))
+        assert abs(result.area - expected.area) < 1e-6
+        assert len(result.geoms) == len(expected.geoms)
+        if VIEWGEOMS:
+            result.view()
+    #the overlapping buffers are only kept apart when not dissolving
+    result = multipolygon.buffer(1.5, dissolve=False)
+    assert len(result.geoms) == 3
+    assert abs(result.area - sum(part.buffer(1.5).area for part in multipolygon.geoms)) < 1e-6
+    print("")
+
+def resulttreetesting(VIEWGEOMS=False):
+    #-------------------
+    #   RESULT TREE TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   RESULT TREE TESTING")
+    print("#-------------------")
+
+    #rings built from the result nodes are the same as rings built from their coords
+    outer = Polygon([(0,0),(20,0),(20,20),(0,20)], interiors=[[(2,2),(2,18),(18,18),(18,2)]])
+    island = Polygon([(5,5),(15,5),(15,15),(5,15)], interiors=[[(8,8),(8,12),(12,12),(12,8)]])
+    result = outer.union(island)
+    print("nested result parts %s area %s"%(len(result.geoms),result.area))
+    assert len(result.geoms) == 2 and result.area == 400 - 256 + 100 - 16
+    for poly in result.geoms:
+        rings = [(poly.exterior, LinearRing(poly.exterior.coords))]
+        rings.extend((hole, LinearRing(hole.coords, counterclockwise=True)) for hole in poly.interiors)
+        for ring,rebuilt in rings:
+            assert ring.coords == rebuilt.coords
+            assert abs(ring.area - rebuilt.area) < 1e-9
+            assert ring.bounds == rebuilt.bounds
+    #and their scaled coords are kept for the next clip at the same scale
+    part = result.geoms[0]
+    assert part.exterior._scaled is not None
+    assert part.intersect(island).area == island.intersect(part).area
+    if VIEWGEOMS:
+        result.view()
+    print("")
+
+def simplepolygontesting(VIEWGEOMS=False):
+    #-------------------
+    #   SIMPLE POLYGON TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   SIMPLE POLYGON TESTING")
+    print("#-------------------")
+
+    #rings that touch themselves are split into rings that don't
+    import clipper
+    from clipper import Point as IntPoint
+    keyhole = [IntPoint(0,0),IntPoint(20,0),IntPoint(20,20),IntPoint(0,20),IntPoint(0,10),
+               IntPoint(10,15),IntPoint(15,10),IntPoint(10,5),IntPoint(0,10)]
+    checkers = [[IntPoint(x,y),IntPoint(x+10,y),IntPoint(x+10,y+10),IntPoint(x,y+10)]
+                for x in xrange(0,100,10) for y in xrange(0,100,10) if (x+y) % 20 == 0]
+    for name,polys,area in (("keyhole",[keyhole],325.0), ("checkers",checkers,5000.0)):
+        result = clipper.SimplifyPolygons(polys, clipper.PolyFillType.NonZero)
+        print("%s rings %s"%(name,len(result)))
+        for ring in result:
+            assert len(set(ring)) == len(ring)
+        assert sum(clipper.Area(ring) for ring in result) == area
+    assert sorted(clipper.Area(ring) for ring in clipper.SimplifyPolygon(keyhole, clipper.PolyFillType.NonZero)) == [-75.0, 400.0]
+    print("")
+
+def jointesting(VIEWGEOMS=False):
+    #-------------------
+    #   JOIN TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   JOIN TESTING")
+    print("#-------------------")
+
+    #output edges that the polygons share are joined into one ring
+    bars = MultiPolygon([( [(0,0),(1,0),(1,5),(0,5)], [] ),
+                         ( [(1,0),(4,0),(4,1),(1,1)], [] ),
+                         ( [(1,4),(4,4),(4,5),(1,5)], [] ),
+                         ( [(4,0),(5,0),(5,5),(4,5)], [] )])
+    result = bars.union(bars)
+    print("joined frame %s area %s"%(result.geom_type,result.area))
+    assert result.geom_type == "Polygon" and result.area == 16.0
+    pair = MultiPolygon([( [(0,0),(1,0),(1,1),(0,1)], [] ),
+                         ( [(1,0),(2,0),(2,1),(1,1)], [] )])
+    result = pair.union(pair)
+    assert result.geom_type == "Polygon" and len(result.exterior.coords) == 5
+    #and however the rings are joined, the parts add up and never overlap
+    row = MultiPolygon([( [(x,y),(x+1,y),(x+1,y+1+x%2),(x,y+1+x%2)], [] ) for x in xrange(10) for y in (0,3)])
+    result = row.union(row)
+    parts = list(result.geoms)
+    print("joined row parts %s area %s"%(len(parts),result.area))
+    assert result.area == row.area
+    for i,part in enumerate(parts):
+        for other in parts[i+1:]:
+            overlap = part.intersect(other)
+            assert overlap is None or overlap.area == 0
+    if VIEWGEOMS:
+        result.view()
+    print("")
+
+def overlaytesting(VIEWGEOMS=False):
+    #-------------------
+    #   OVERLAY TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   OVERLAY TESTING")
+    print("#-------------------")
+
+    #one sweep gives the same results as running each operation on its own
+    subject = MultiPolygon([( [(0,0),(6,0),(6,6),(0,6)], [[(2,2),(2,4),(4,4),(4,2)]] ),
+                            ( [(20,20),(22,20),(22,22),(20,22)], [] ),
+                            ( [(21,21),(23,21),(23,23),(21,23)], [] )])
+    clip = MultiPolygon([( [(3,3),(9,3),(9,9),(3,9)], [] ),
+                         ( [(30,30),(31,30),(31,31),(30,31)], [] )])
+    operations = ("intersect","union","difference","reverse_difference","exclusive_or")
+    results = subject.overlay(clip, operations)
+    expected = {"intersect":subject.intersect(clip),
+                "union":subject.union(clip),
+                "difference":subject.difference(clip),
+                "reverse_difference":clip.difference(subject),
+                "exclusive_or":subject.symmetric_difference(clip)}
+    for operation in operations:
+        result = results[operation]
+        print("%s area %s"%(operation,result.area))
+        assert abs(result.area - expected[operation].area) < 1e-9
+        assert len(geometry._Parts(result)) == len(geometry._Parts(expected[operation]))
+        if VIEWGEOMS:
+            result.view()
+
+    #and exactly the same coordinates, for random jagged polygons that overlap
+    #their own parts as well as eachother's
+    import random
+    def jagged(rand):
+        x,y = rand.uniform(0,10),rand.uniform(0,10)
+        count = rand.randint(3,9)
+        angles = [2*math.pi*i/count + rand.uniform(0,0.3) for i in xrange(count)]
+        radii = [rand.uniform(1,5) for i in xrange(count)]
+        return [(x+radius*math.cos(angle), y+radius*math.sin(angle)) for angle,radius in zip(angles,radii)]
+    for seed in xrange(100):
+        rand = random.Random(seed)
+        subject = MultiPolygon([(jagged(rand),[]) for _ in xrange(rand.randint(1,4))])
+        clip = MultiPolygon([(jagged(rand),[]) for _ in xrange(rand.randint(1,4))])
+        results = subject.overlay(clip, operations)
+        expected = {"intersect":subject.intersect(clip),
+                    "union":subject.union(clip),
+                    "difference":subject.difference(clip),
+                    "reverse_difference":clip.difference(subject),
+                    "exclusive_or":subject.symmetric_difference(clip)}
+        for operation in operations:
+            result = results[operation]
+            if expected[operation] is None:
+                assert result is None
+            else:
+                assert result.__geo_interface__ == expected[operation].__geo_interface__
+    print("random overlays match")
+    try:
+        subject.overlay(clip, ["nonsense"])
+    except ValueError:
+        print("unknown operation raises ValueError")
+    else:
+        raise Exception("Unknown overlay operations should raise ValueError")
+    print("")
+
+def overlaylayerstesting(VIEWGEOMS=False):
+    #-------------------
+    #   OVERLAY LAYERS TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   OVERLAY LAYERS TESTING")
+    print("#-------------------")
+
+    #a 3x3 grid of unit squares overlaid with a 2x2 grid of shifted squares
+    layer1 = [Polygon([(x,y),(x+1,y),(x+1,y+1),(x,y+1)]) for x in xrange(3) for y in xrange(3)]
+    layer2 = [Polygon([(x,y),(x+1.5,y),(x+1.5,y+1.5),(x,y+1.5)]) for x in (0.5,2.0) for y in (0.5,2.0)]
+    faces = overlay_layers(layer1, layer2, how="union")
+    print("union faces %s"%len(faces))
+    #the faces of each feature add up to the feature
+    for i,feature in enumerate(layer1):
+        area = sum(face.area for face,index1,index2 in faces if index1 == i)
+        assert abs(area - feature.area) < 1e-9
+    for j,feature in enumerate(layer2):
+        area = sum(face.area for face,index1,index2 in faces if index2 == j)
+        assert abs(area - feature.area) < 1e-9
+    #and each face covered by both is the intersection of its two features
+    for face,index1,index2 in faces:
+        if index1 is not None and index2 is not None:
+            assert abs(face.area - layer1[index1].intersect(layer2[index2]).area) < 1e-9
+    intersection = overlay_layers(layer1, layer2, how="intersection")
+    identity = overlay_layers(layer1, layer2, how="identity")
+    print("intersection faces %s identity faces %s"%(len(intersection),len(identity)))
+    assert all(index1 is not None and index2 is not None for face,index1,index2 in intersection)
+    assert all(index1 is not None for face,index1,index2 in identity)
+    assert abs(sum(face.area for face,index1,index2 in identity) - 9.0) < 1e-9
+    if VIEWGEOMS:
+        MultiPolygon([(list(face.exterior.coords),[]) for face,index1,index2 in faces]).view()
+
+    print("")
+
+def masktesting(VIEWGEOMS=False):
+    #-------------------
+    #   CLIP MASK TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   CLIP MASK TESTING")
+    print("#-------------------")
+
+    from clipmask import prepare_mask
+    #a mask with many edges far from most of the subjects
+    mask = Polygon([(20*math.cos(angle*math.pi/90),20*math.sin(angle*math.pi/90)) for angle in xrange(180)],
+                   interiors=[[(-4,-4),(-4,4),(4,4),(4,-4)]])
+    prepared = prepare_mask(mask)
+    subjects = [Polygon([(x,y),(x+3,y),(x+3,y+3),(x,y+3)]) for x in xrange(-24,24,5) for y in xrange(-24,24,5)]
+    #including overlapping parts beyond the mask, which still need dissolving
+    subjects.append(MultiPolygon([( [(30,30),(32,30),(32,32),(30,32)], [] ),
+                                  ( [(31,31),(33,31),(33,33),(31,33)], [] )]))
+    #the prepared clips give the very same coordinates as the full clips
+    for cliptype in ("intersect","difference"):
+        results = prepared.clip_many(subjects, cliptype)
+        for subject,result in zip(subjects, results):
+            expected = getattr(subject, cliptype)(mask)
+            if expected is None:
+                assert result is None
+            else:
+                assert result.__geo_interface__ == expected.__geo_interface__
+        print("%s results %s"%(cliptype,len([result for result in results if result])))
+        if VIEWGEOMS:
+            MultiPolygon([(list(part.exterior.coords),[]) for result in results if result for part in geometry._Parts(result)]).view()
+    print("")
+
+def clipmanytesting(VIEWGEOMS=False):
+    #-------------------
+    #   CLIP MANY TESTING
+    #-------------------
+    print("#-------------------")
+    print("#   CLIP MANY TESTING")
+    print("#-------------------")
+
+    #one sweep against many geoms gives the same as clipping them one by one
+    subject = MultiPolygon([( [(0,0),(6,0),(6,6),(0,6)], [[(2,2),(2,4),(4,4),(4,2)]] ),
+                            ( [(5,5),(9,5),(9,9),(5,9)], [] )])
+    others = [Polygon([(x,y),(x+1.5,y),(x+1.5,y+1.5),(x,y+1.5)]) for x in xrange(-1,10,3) for y in xrange(-1,10,3)]
+    others.append(Polygon([(20,20),(21,20),(21,21),(20,21)]))
+    folded = subject
+    for other in others:
+        folded = folded.difference(other)
+    result = subject.difference_all(others)
+    print("difference_all area %s, one by one %s"%(result.area,folded.area))
+    assert abs(result.area - folded.area) < 1e-9
+    if VIEWGEOMS:
+        result.view()
+    combined = others[0]
+    for other in others[1:]:
+        combined = combined.union(other)
+    result = subject.intersect_any(others)
+    expected = subject.intersect(combined)
+    print("intersect_any area %s, with union %s"%(result.area,expected.area))
+    assert abs(result.area - expected.area) < 1e-9
+
+    #overlapping parts of the subject are dissolved even if nothing is near
+    overlapping = MultiPolygon([( [(0,0),(2,0),(2,2),(0,2)], [] ),
+                                ( [(1,1),(3,1),(3,3),(1,3)], [] )])
+    far = [Polygon([(10,10),(11,10),(11,11),(10,11)])]
+    result = overlapping.difference_all(far)
+    print("far difference_all %s area %s"%(result,result.area))
+    assert result.geom_type == "Polygon" and result.area == 7.0
+    assert overlapping.intersect_any(far) is None
+    print("")
+
 def RunTestSuite(viewgeoms=True):
 
     ##################################################
@@ -259,6 +1076,31 @@ def RunTestSuite(viewgeoms=True):
     typetesting(VIEWGEOMS=viewgeoms)
     distancetesting(VIEWGEOMS=viewgeoms)
     buffertesting(VIEWGEOMS=viewgeoms)
+    coordstesting(VIEWGEOMS=viewgeoms)
+    scaledtesting(VIEWGEOMS=viewgeoms)
+    cachetesting(VIEWGEOMS=viewgeoms)
+    strtreetesting(VIEWGEOMS=viewgeoms)
+    nearesttesting(VIEWGEOMS=viewgeoms)
+    preparedtesting(VIEWGEOMS=viewgeoms)
+    scanbeamtesting(VIEWGEOMS=viewgeoms)
+    intersectlisttesting(VIEWGEOMS=viewgeoms)
+    unaryuniontesting(VIEWGEOMS=viewgeoms)
+    enginetesting(VIEWGEOMS=viewgeoms)
+    differencetesting(VIEWGEOMS=viewgeoms)
+    partfiltertesting(VIEWGEOMS=viewgeoms)
+    cliprecttesting(VIEWGEOMS=viewgeoms)
+    scaletesting(VIEWGEOMS=viewgeoms)
+    paralleltesting(VIEWGEOMS=viewgeoms)
+    arctesting(VIEWGEOMS=viewgeoms)
+    multipointbuffertesting(VIEWGEOMS=viewgeoms)
+    multipolygonbuffertesting(VIEWGEOMS=viewgeoms)
+    resulttreetesting(VIEWGEOMS=viewgeoms)
+    simplepolygontesting(VIEWGEOMS=viewgeoms)
+    jointesting(VIEWGEOMS=viewgeoms)
+    overlaytesting(VIEWGEOMS=viewgeoms)
+    overlaylayerstesting(VIEWGEOMS=viewgeoms)
+    masktesting(VIEWGEOMS=viewgeoms)
+    clipmanytesting(VIEWGEOMS=viewgeoms)
     uniontesting(VIEWGEOMS=viewgeoms)
     print("----------------------------")
     print("TESTS SUCCESSFULLY COMPLETED")